@@ -0,0 +1,764 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import functools
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import CompileClient
+import JackCorpus
+from BuildCache import SubroutineCache, TokenCache, compiler_fingerprint
+from CompilationEngine import CompilationEngine
+from CompileOptions import CompileOptions
+from DeadCodeEliminator import DeadCodeEliminator
+from HackCPU import HackCPU
+from HackTranslator import HackTranslator
+from Inliner import Inliner
+from IRBuilder import IRBuilder
+from IRLowering import IRLowering
+from JackCompiler import compile_file, compile_many, compile_source
+from JackTokenizer import JackTokenizer
+from VMEmulator import VMEmulator
+from VMWriter import VMWriter
+
+SAMPLE_PROGRAMS = ["Average", "ComplexArrays", "ConvertToBin", "Seven",
+                   "Square", "Pong"]
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# times the commands of a sample are emitted per VMWriter benchmark run
+REPLAYS = 20
+# the scripted input every sample runs with on the VMEmulator
+SAMPLE_INPUTS = {
+    "Average": {"typed": "3\n10\n20\n31\n"},
+    "ConvertToBin": {"memory": {8000: 1234}},
+    # moves the square right, up and shrinks it, then quits with 'q'
+    "Square": {"keys": [0] * 50 + [132] * 200 + [0] * 3 + [131] * 100 +
+                       [0] * 3 + [90] * 3 + [0] * 3 + [81]},
+    # moves the bat left until the ball is missed
+    "Pong": {"keys": [0] * 100 + [130] * 300},
+}
+# the deterministic columns a baseline is checked against, by benchmark
+CHECKED_COLUMNS = {"vm-instructions": ("instructions", "-O instructions",
+                                       "-O --ir instructions"),
+                   "hack": ("ROM", "cycles")}
+# the baselines --check compares with by default, by benchmark
+BASELINE_PATHS = {
+    "vm-instructions": os.path.join(ROOT, "VMInstructions.json"),
+    "hack": os.path.join(ROOT, "HackCycles.json")}
+# the synthetic classes take seconds to compile, and the CLI has to start
+# Python, so they are timed fewer times
+MAX_THROUGHPUT_REPEAT = 3
+# the array lengths of the loops benchmark
+LOOP_LENGTHS = [16, 256, 2048]
+# the depths of the recursion of the tail-calls benchmark; the Hack stack,
+# RAM[256..2047], holds only a few hundred frames of a two argument function
+TAIL_CALL_DEPTHS = [10, 100, 1000, 4000]
+
+# the methods of the wide classes edited between two incremental builds
+INCREMENTAL_SUBROUTINES = [100, 1000, 4000]
+# seconds to wait for the compile server of the compile-server benchmark
+SERVER_START_TIMEOUT = 10.0
+
+
+def read_sources(program: str) -> list:
+    """
+    Returns:
+        list: the (path, source) pairs of all .jack files of a sample program.
+    """
+    directory = os.path.join(ROOT, program)
+    sources = []
+    for filename in sorted(os.listdir(directory)):
+        if os.path.splitext(filename)[1].lower() == ".jack":
+            path = os.path.join(directory, filename)
+            with open(path, 'r') as source_file:
+                sources.append((path, source_file.read()))
+    return sources
+
+
+def best_time(function, repeat: int) -> float:
+    """Runs function repeat times and returns the fastest run in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def median_time(function, repeat: int) -> float:
+    """Runs function repeat times and returns the median run in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def count_tokens(sources: list) -> int:
+    """Tokenizes all the sources, classifying every token once."""
+    count = 0
+    for _, source in sources:
+        tokenizer = JackTokenizer(io.StringIO(source))
+        tokenizer.token_type()
+        count += 1
+        while tokenizer.has_more_tokens():
+            tokenizer.advance()
+            tokenizer.token_type()
+            count += 1
+    return count
+
+
+def benchmark_tokenizer(repeat: int) -> dict:
+    """Measures the tokens per second of JackTokenizer on every sample."""
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        sources = read_sources(program)
+        tokens = count_tokens(sources)
+        seconds = best_time(lambda: count_tokens(sources), repeat)
+        results[program] = {"tokens": tokens,
+                            "tokens_per_sec": round(tokens / seconds)}
+    return results
+
+
+def compile_sources(sources: list) -> str:
+    """
+    Returns:
+        str: the VM code of all the sources, compiled in memory.
+    """
+    output = io.StringIO()
+    for _, source in sources:
+        compile_file(io.StringIO(source), output)
+    return output.getvalue()
+
+
+def writer_calls(vm_code: str) -> list:
+    """
+    Returns:
+        list: the (VMWriter method name, arguments) pairs that emit vm_code.
+    """
+    calls = []
+    for line in vm_code.splitlines():
+        command = line.split()
+        if command[0] in {"push", "pop"}:
+            calls.append(("write_" + command[0],
+                          (command[1], int(command[2]))))
+        elif command[0] in {"call", "function"}:
+            calls.append(("write_" + command[0],
+                          (command[1], int(command[2]))))
+        elif command[0] == "label":
+            calls.append(("write_label", (command[1],)))
+        elif command[0] == "goto":
+            calls.append(("write_goto", (command[1],)))
+        elif command[0] == "if-goto":
+            calls.append(("write_if", (command[1],)))
+        elif command[0] == "return":
+            calls.append(("write_return", ()))
+        else:
+            calls.append(("write_arithmetic", (command[0],)))
+    return calls
+
+
+def replay_calls(calls: list, times: int) -> None:
+    """Emits the given VMWriter calls times times into a fresh writer."""
+    writer = VMWriter(io.StringIO())
+    methods = {name: getattr(writer, name) for name, _ in calls}
+    for _ in range(times):
+        for name, arguments in calls:
+            methods[name](*arguments)
+    writer.flush()
+
+
+def benchmark_vmwriter(repeat: int) -> dict:
+    """Measures the commands per second VMWriter emits, replaying the
+    commands of every compiled sample REPLAYS times per run.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        calls = writer_calls(compile_sources(read_sources(program)))
+        seconds = best_time(lambda: replay_calls(calls, REPLAYS), repeat)
+        results[program] = {
+            "commands": len(calls),
+            "commands_per_sec": round(len(calls) * REPLAYS / seconds)}
+    return results
+
+
+def retained_bytes(function) -> int:
+    """
+    Returns:
+        int: the number of bytes still allocated by function's result.
+    """
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def benchmark_ir_memory(repeat: int) -> dict:
+    """Measures the memory the intermediate representation of every sample
+    keeps alive, against the tokenizers the CompilationEngine keeps alive
+    while compiling and against their bare token arrays. The IR is smaller
+    than the tokenizers, but larger than the token arrays alone, as a node
+    costs several times the few bytes of a token.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        sources = read_sources(program)
+        token_bytes = retained_bytes(lambda: [
+            JackTokenizer(io.StringIO(source)) for _, source in sources])
+        token_array_bytes = retained_bytes(lambda: [
+            (tokenizer.all_tokens, tokenizer.kinds) for tokenizer in [
+                JackTokenizer(io.StringIO(source))
+                for _, source in sources]])
+        ir_bytes = retained_bytes(lambda: [
+            IRBuilder(JackTokenizer(io.StringIO(source))).build_class()
+            for _, source in sources])
+        results[program] = {
+            "tokenizer_bytes": token_bytes,
+            "token_array_bytes": token_array_bytes,
+            "ir_bytes": ir_bytes,
+            "ir_vs_tokenizers": "{:+.0%}".format(ir_bytes / token_bytes - 1),
+            "ir_vs_token_arrays": "{:+.0%}".format(
+                ir_bytes / token_array_bytes - 1)}
+    return results
+
+
+def compile_program(sources: list,
+                    options: CompileOptions = None) -> dict:
+    """
+    Returns:
+        dict: the lines of the .vm file of every source, compiled in memory,
+        by file name.
+    """
+    files = {}
+    for path, source in sources:
+        output = io.StringIO()
+        compile_file(io.StringIO(source), output, options)
+        files[os.path.basename(path)] = output.getvalue().splitlines(True)
+    return files
+
+
+def emulate(program: str, options: CompileOptions = None,
+            inline: bool = False) -> VMEmulator:
+    """Compiles a sample and runs it to the end of its scripted input.
+
+    Args:
+        inline (bool): inline the trivial subroutines of the whole program
+        and remove those no longer called.
+    """
+    files = compile_program(read_sources(program), options)
+    if inline:
+        files = DeadCodeEliminator().eliminate(Inliner().inline(files))
+    emulator = VMEmulator(files, **SAMPLE_INPUTS.get(program, {}))
+    if not emulator.run():
+        raise RuntimeError(program + " did not halt")
+    return emulator
+
+
+def benchmark_vm_instructions(repeat: int) -> dict:
+    """Counts the VM commands and calls every sample executes on the
+    VMEmulator, without -O, with -O, and with -O through the IR, which also
+    optimizes loops and array accesses. The counts do not depend on the
+    machine, so they can be checked against a baseline.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        plain = emulate(program)
+        optimized = emulate(program, CompileOptions(optimize=True))
+        through_ir = emulate(program, CompileOptions(optimize=True, ir=True))
+        results[program] = {
+            "instructions": plain.executed,
+            "calls": sum(plain.calls),
+            "-O instructions": optimized.executed,
+            "-O calls": sum(optimized.calls),
+            "-O --ir instructions": through_ir.executed,
+            # ConvertToBin outputs its result to RAM[8001..8016]
+            "same_output": all(
+                plain.os.output_text() == emulator.os.output_text() and
+                plain.ram[8001:8017] == emulator.ram[8001:8017]
+                for emulator in (optimized, through_ir))}
+    return results
+
+
+def time_phase(phase, setup, repeat: int) -> float:
+    """Runs phase on a fresh result of setup repeat times, and returns the
+    fastest run in seconds, leaving out the setup.
+    """
+    best = None
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        phase(argument)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def measure_corpus(shape: str, scale: float, repeat: int) -> dict:
+    """Times every phase of the compiler on a synthetic class. Run in a
+    process of its own, so the peak RSS is that of this class alone.
+    """
+    source = JackCorpus.generate(shape, scale)
+    tokenizer = JackTokenizer(io.StringIO(source))
+    tokens = len(tokenizer.all_tokens)
+    output = io.StringIO()
+    CompilationEngine(tokenizer, output).compile_class()
+    phases = {
+        "tokenize": time_phase(
+            lambda _: JackTokenizer(io.StringIO(source)), lambda: None,
+            repeat),
+        "compile": time_phase(
+            lambda tokens_of_class: CompilationEngine(
+                tokens_of_class, io.StringIO()).compile_class(),
+            lambda: JackTokenizer(io.StringIO(source)), repeat),
+        "compile_O": time_phase(
+            lambda tokens_of_class: CompilationEngine(
+                tokens_of_class, io.StringIO(),
+                CompileOptions(optimize=True)).compile_class(),
+            lambda: JackTokenizer(io.StringIO(source)), repeat),
+        "ir_build": time_phase(
+            lambda tokens_of_class: IRBuilder(tokens_of_class).build_class(),
+            lambda: JackTokenizer(io.StringIO(source)), repeat),
+        "ir_lower": time_phase(
+            lambda class_node: IRLowering(io.StringIO()).lower_class(
+                class_node),
+            lambda: IRBuilder(
+                JackTokenizer(io.StringIO(source))).build_class(), repeat),
+    }
+    lines = source.count("\n")
+    seconds = phases["tokenize"] + phases["compile"]
+    result = {"lines": lines, "tokens": tokens,
+              "vm_lines": output.getvalue().count("\n")}
+    result.update(("{}_ms".format(phase), round(phase_seconds * 1000, 1))
+                  for phase, phase_seconds in phases.items())
+    result.update({
+        "lines_per_sec": round(lines / seconds),
+        "tokens_per_sec": round(tokens / seconds),
+        "peak_rss_kb":
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    return result
+
+
+def benchmark_throughput(repeat: int, scale: float = 1.0) -> dict:
+    """Measures every phase of the compiler on the synthetic classes of
+    JackCorpus. The rates are those of tokenizing and compiling without -O.
+    """
+    results = {}
+    for shape in sorted(JackCorpus.CORPORA):
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            results[shape] = executor.submit(
+                measure_corpus, shape, scale,
+                min(repeat, MAX_THROUGHPUT_REPEAT)).result()
+    return results
+
+
+def benchmark_in_memory(repeat: int) -> dict:
+    """Measures the milliseconds per file of compiling every sample with
+    compile_many, against running the JackCompiler CLI on a copy of it.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        sources = read_sources(program)
+        api_seconds = best_time(lambda: list(compile_many(sources)), repeat)
+        with tempfile.TemporaryDirectory() as directory:
+            copy = shutil.copytree(os.path.join(ROOT, program),
+                                   os.path.join(directory, program))
+            cli_seconds = best_time(lambda: subprocess.run(
+                [sys.executable, os.path.join(ROOT, "JackCompiler.py"),
+                 "--force", copy], check=True),
+                min(repeat, MAX_THROUGHPUT_REPEAT))
+        results[program] = {
+            "files": len(sources),
+            "api_ms_per_file": round(api_seconds * 1000 / len(sources), 3),
+            "cli_ms_per_file": round(cli_seconds * 1000 / len(sources), 3),
+            "speedup": round(cli_seconds / api_seconds)}
+    return results
+
+
+def benchmark_inlining(repeat: int) -> dict:
+    """Counts the VM commands and calls every sample executes on the
+    VMEmulator when compiled with -O, before and after inlining its trivial
+    subroutines.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        plain = emulate(program, CompileOptions(optimize=True))
+        inlined = emulate(program, CompileOptions(optimize=True), True)
+        results[program] = {
+            "instructions": plain.executed,
+            "calls": sum(plain.calls),
+            "inlined instructions": inlined.executed,
+            "inlined calls": sum(inlined.calls),
+            "same_output":
+                plain.os.output_text() == inlined.os.output_text() and
+                plain.ram[8001:8017] == inlined.ram[8001:8017]}
+    return results
+
+
+def benchmark_tail_calls(repeat: int) -> dict:
+    """Counts the VM commands and calls a tail recursive function executes
+    on the VMEmulator at growing depths, with and without -O, which turns
+    its calls to itself into jumps. Every call left keeps a frame on the
+    stack until the recursion returns.
+    """
+    results = {}
+    for depth in TAIL_CALL_DEPTHS:
+        sources = [("Main.jack", JackCorpus.tail_recursion(depth))]
+        plain = VMEmulator(compile_program(sources))
+        plain.run()
+        optimized = VMEmulator(compile_program(
+            sources, CompileOptions(optimize=True)))
+        optimized.run()
+        expected = str(sum(n & 7 for n in range(1, depth + 1)))
+        results["depth {}".format(depth)] = {
+            "instructions": plain.executed,
+            "calls": sum(plain.calls),
+            "-O instructions": optimized.executed,
+            "-O calls": sum(optimized.calls),
+            "same_output": plain.os.output_text() == expected ==
+            optimized.os.output_text()}
+    return results
+
+
+def benchmark_loops(repeat: int) -> dict:
+    """Counts the VM commands generated loop kernels execute on the
+    VMEmulator with -O, and with -O through the IR, which hoists their
+    invariant values and reuses the addresses of their array elements.
+    """
+    results = {}
+    for length in LOOP_LENGTHS:
+        sources = [("Main.jack", JackCorpus.loop_kernels(length))]
+        optimized = VMEmulator(compile_program(
+            sources, CompileOptions(optimize=True)))
+        optimized.run()
+        through_ir = VMEmulator(compile_program(
+            sources, CompileOptions(optimize=True, ir=True)))
+        through_ir.run()
+        results["length {}".format(length)] = {
+            "-O instructions": optimized.executed,
+            "-O --ir instructions": through_ir.executed,
+            "saved": "{:.1%}".format(
+                1 - through_ir.executed / optimized.executed),
+            "same_output":
+                optimized.os.output_text() == through_ir.os.output_text()}
+    return results
+
+
+def benchmark_hack(repeat: int) -> dict:
+    """Translates every sample, compiled with -O, into Hack assembly with
+    the naive and with the optimized translation, and counts the size of
+    the ROM and the cycles it runs for on the HackCPU. The Jack OS runs
+    natively, so its cycles are not counted.
+    """
+    results = {}
+    for program in SAMPLE_PROGRAMS:
+        files = compile_program(read_sources(program),
+                                CompileOptions(optimize=True))
+        cpus = []
+        for optimize in (False, True):
+            cpu = HackCPU(HackTranslator(optimize).translate(files),
+                          **SAMPLE_INPUTS.get(program, {}))
+            if not cpu.run():
+                raise RuntimeError(program + " did not halt")
+            cpus.append(cpu)
+        naive, optimized = cpus
+        results[program] = {
+            "naive ROM": len(naive.rom),
+            "ROM": len(optimized.rom),
+            "naive cycles": naive.cycles,
+            "cycles": optimized.cycles,
+            "same_output":
+                naive.os.output_text() == optimized.os.output_text() and
+                naive.ram[8001:8017] == optimized.ram[8001:8017]}
+    return results
+
+
+def benchmark_incremental(repeat: int) -> dict:
+    """Measures the milliseconds of compiling a wide class with -O after
+    one of its methods was edited, from scratch and with the SubroutineCache
+    of the class before the edit, which the timed runs load and save.
+    """
+    results = {}
+    options = CompileOptions(optimize=True, incremental=True)
+    fingerprint = compiler_fingerprint(options.fingerprint())
+    for subroutines in INCREMENTAL_SUBROUTINES:
+        source = JackCorpus.wide_class(subroutines)
+        edited = source.replace("let y = f0 + x;", "let y = f0 + x + 1;", 1)
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, "Wide.json")
+
+            def compile_cached(text: str, save_path: str) -> tuple:
+                cache = SubroutineCache(cache_path, fingerprint)
+                output = io.StringIO()
+                compile_file(io.StringIO(text), output, options, cache)
+                cache.path = save_path
+                cache.save()
+                return output.getvalue(), cache.hits
+
+            compile_cached(source, cache_path)
+            scratch_path = os.path.join(directory, "Edited.json")
+            full_seconds = best_time(lambda: compile_file(
+                io.StringIO(edited), io.StringIO(),
+                CompileOptions(optimize=True)), repeat)
+            incremental_seconds = best_time(
+                lambda: compile_cached(edited, scratch_path), repeat)
+            vm_code, reused = compile_cached(edited, scratch_path)
+        full = io.StringIO()
+        compile_file(io.StringIO(edited), full, CompileOptions(optimize=True))
+        results["{} methods".format(subroutines)] = {
+            "full ms": round(full_seconds * 1000, 3),
+            "incremental ms": round(incremental_seconds * 1000, 3),
+            "reused": reused,
+            "speedup": round(full_seconds / incremental_seconds, 1),
+            "same_output": vm_code == full.getvalue()}
+    return results
+
+
+def benchmark_source_maps(repeat: int) -> dict:
+    """Measures the milliseconds of compiling the JackCorpus classes with -O
+    with and without a source map, and the size of the map against that of
+    the VM code, at a tenth of the throughput scale.
+    """
+    results = {}
+    for shape in sorted(JackCorpus.CORPORA):
+        source = JackCorpus.generate(shape, 0.1)
+        repeat_shape = min(repeat, MAX_THROUGHPUT_REPEAT)
+        plain_seconds = best_time(lambda: compile_file(
+            io.StringIO(source), io.StringIO(),
+            CompileOptions(optimize=True)), repeat_shape)
+        mapped_seconds = best_time(lambda: compile_file(
+            io.StringIO(source), io.StringIO(),
+            CompileOptions(optimize=True, source_map=True),
+            map_file=io.StringIO()), repeat_shape)
+        vm_code = io.StringIO()
+        map_file = io.StringIO()
+        compile_file(io.StringIO(source), vm_code,
+                     CompileOptions(optimize=True, source_map=True),
+                     map_file=map_file)
+        results[shape] = {
+            "vm bytes": len(vm_code.getvalue()),
+            "map bytes": len(map_file.getvalue()),
+            "ms": round(plain_seconds * 1000, 1),
+            "mapped ms": round(mapped_seconds * 1000, 1),
+            "same_output": vm_code.getvalue() == compile_source(
+                source, CompileOptions(optimize=True))}
+    return results
+
+
+def benchmark_token_cache(repeat: int) -> dict:
+    """Measures the milliseconds of tokenizing the JackCorpus classes, at a
+    tenth of the throughput scale, from scratch and from a warm TokenCache,
+    and the size of their cache entries against that of their sources.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        token_cache = TokenCache(directory)
+        for shape in sorted(JackCorpus.CORPORA):
+            source = JackCorpus.generate(shape, 0.1)
+            tokenizer = JackTokenizer(io.StringIO(source),
+                                      token_cache=token_cache)
+            cold_seconds = best_time(
+                lambda: JackTokenizer(io.StringIO(source)), repeat)
+            warm_seconds = best_time(lambda: JackTokenizer(
+                io.StringIO(source), token_cache=token_cache), repeat)
+            cached = JackTokenizer(io.StringIO(source),
+                                   token_cache=token_cache)
+            results[shape] = {
+                "source bytes": len(source),
+                "entry bytes": os.path.getsize(token_cache.path_of(source)),
+                "tokenize ms": round(cold_seconds * 1000, 2),
+                "cached ms": round(warm_seconds * 1000, 2),
+                "speedup": round(cold_seconds / warm_seconds, 1),
+                "same_output": cached.cached and
+                    (cached.all_tokens, cached.kinds, cached.token_lines) ==
+                    (tokenizer.all_tokens, tokenizer.kinds,
+                     tokenizer.token_lines)}
+    return results
+
+
+def start_compile_server(socket_path: str) -> subprocess.Popen:
+    """Starts a CompileServer on the given socket and waits until it
+    answers.
+    """
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "CompileServer.py"),
+         "--socket", socket_path, "--workers", "2"])
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            CompileClient.request({"command": "status"}, socket_path)
+            return server
+        except OSError:
+            if server.poll() is not None or \
+                    time.perf_counter() > deadline:
+                server.kill()
+                raise RuntimeError("the compile server did not start")
+            time.sleep(0.05)
+
+
+def benchmark_compile_server(repeat: int) -> dict:
+    """Measures the median milliseconds of compiling every sample with the
+    JackCompiler wrapper, in its own process and through a CompileServer,
+    and of compiling the sample's sources in a single "sources" request.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "server.sock")
+        environment = dict(os.environ)
+        environment[CompileClient.SOCKET_VARIABLE] = socket_path
+
+        def run_wrapper(copy: str) -> None:
+            subprocess.run(["sh", os.path.join(ROOT, "JackCompiler"),
+                            "--force", "-O", copy], cwd=ROOT,
+                           env=environment, stdout=subprocess.DEVNULL,
+                           check=True)
+
+        def read_outputs(copy: str) -> dict:
+            outputs = {}
+            for name in os.listdir(copy):
+                if name.endswith(".vm"):
+                    with open(os.path.join(copy, name), 'r') as vm_file:
+                        outputs[name] = vm_file.read()
+            return outputs
+
+        copies = {program: shutil.copytree(
+            os.path.join(ROOT, program), os.path.join(directory, program))
+            for program in SAMPLE_PROGRAMS}
+        local_seconds = {}
+        local_outputs = {}
+        for program, copy in copies.items():
+            local_seconds[program] = median_time(
+                lambda: run_wrapper(copy), repeat)
+            local_outputs[program] = read_outputs(copy)
+        server = start_compile_server(socket_path)
+        try:
+            for program, copy in copies.items():
+                server_seconds = median_time(
+                    lambda: run_wrapper(copy), repeat)
+                sources = read_sources(program)
+                inline_seconds = median_time(lambda: CompileClient.request(
+                    {"command": "sources", "sources": sources,
+                     "options": {"optimize": True}}, socket_path), repeat)
+                results[program] = {
+                    "in-process ms": round(
+                        local_seconds[program] * 1000, 1),
+                    "server ms": round(server_seconds * 1000, 1),
+                    "sources ms": round(inline_seconds * 1000, 1),
+                    "speedup": round(
+                        local_seconds[program] / server_seconds, 1),
+                    "same_output":
+                        read_outputs(copy) == local_outputs[program]}
+        finally:
+            CompileClient.request({"command": "stop"}, socket_path)
+            server.wait()
+    return results
+
+
+BENCHMARKS = {"tokenizer": benchmark_tokenizer,
+              "vmwriter": benchmark_vmwriter,
+              "ir-memory": benchmark_ir_memory,
+              "vm-instructions": benchmark_vm_instructions,
+              "throughput": benchmark_throughput,
+              "in-memory": benchmark_in_memory,
+              "inlining": benchmark_inlining,
+              "tail-calls": benchmark_tail_calls,
+              "loops": benchmark_loops,
+              "hack": benchmark_hack,
+              "incremental": benchmark_incremental,
+              "source-maps": benchmark_source_maps,
+              "compile-server": benchmark_compile_server,
+              "token-cache": benchmark_token_cache}
+
+
+def check_baseline(benchmark: str, results: dict, baseline_path: str) -> bool:
+    """Compares the checked columns of the results with a baseline saved
+    from an earlier --json run, printing every difference.
+
+    Returns:
+        bool: True if every checked value is in the baseline and did not
+        grow, and every output is still the same, False otherwise.
+    """
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    passed = True
+    for name, row in results.items():
+        if row.get("same_output") is False:
+            print("{}: -O changed the output".format(name))
+            passed = False
+        for column in CHECKED_COLUMNS.get(benchmark, ()):
+            old = baseline.get(name, {}).get(column)
+            if old is None:
+                print("{}: no {} in the baseline".format(name, column))
+                passed = False
+                continue
+            if old == row[column]:
+                continue
+            print("{}: {} {} -> {} ({})".format(
+                name, column, old, row[column],
+                "regressed" if row[column] > old else "improved"))
+            passed = passed and row[column] < old
+    return passed
+
+
+def print_results(results: dict) -> None:
+    """Prints the results of a benchmark as a table, one row per program."""
+    columns = list(next(iter(results.values())).keys())
+    widths = [max(20, len(column) + 2) for column in columns]
+    print("{:<16}".format("program") +
+          "".join(column.rjust(width)
+                  for column, width in zip(columns, widths)))
+    for name, row in results.items():
+        print("{:<16}".format(name) +
+              "".join(str(row[column]).rjust(width)
+                      for column, width in zip(columns, widths)))
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(prog="Benchmark")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    parser.add_argument("--check", nargs="?", const="",
+                        metavar="BASELINE",
+                        help="fail if a deterministic count grew since the "
+                             "--json results saved in BASELINE (by "
+                             "default, VMInstructions.json for "
+                             "vm-instructions and HackCycles.json for hack)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="the size of the throughput classes, relative "
+                             "to about 20k lines")
+    args = parser.parse_args()
+    if args.check == "":
+        if args.benchmark not in BASELINE_PATHS:
+            parser.error("the {} benchmark has no default baseline".format(
+                args.benchmark))
+        args.check = BASELINE_PATHS[args.benchmark]
+    benchmark_function = BENCHMARKS[args.benchmark]
+    if args.benchmark == "throughput":
+        benchmark_function = functools.partial(benchmark_function,
+                                               scale=args.scale)
+    benchmark_results = benchmark_function(args.repeat)
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        print_results(benchmark_results)
+    if args.check is not None and not check_baseline(
+            args.benchmark, benchmark_results, args.check):
+        sys.exit(1)
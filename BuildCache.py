@@ -0,0 +1,425 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import functools
+import hashlib
+import itertools
+import json
+import marshal
+import os
+import tempfile
+import time
+import typing
+
+MANIFEST_NAME = ".jackbuild.json"
+# the directory, next to the sources, of the subroutine caches of classes
+SUBROUTINE_CACHE_DIR = ".jacksubroutines"
+COMPILER_DIR = os.path.dirname(os.path.abspath(__file__))
+# the environment variable naming the directory of the shared token cache
+TOKEN_CACHE_VARIABLE = "JACK_TOKEN_CACHE"
+TOKEN_CACHE_SUFFIX = ".tokens"
+# the size in bytes the token cache is trimmed down to after a build
+TOKEN_CACHE_SIZE = 64 << 20
+# the format of the token cache entries, bumped whenever it changes
+TOKEN_CACHE_VERSION = 1
+# seconds after which a temporary file of the token cache is abandoned
+STALE_TEMP_AGE = 3600
+
+
+def hash_file(path: str) -> str:
+    """
+    Returns:
+        str: the hex SHA-256 digest of the file's contents.
+    """
+    with open(path, 'rb') as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_fingerprint(options: tuple = ()) -> str:
+    """Fingerprints the compiler itself, so that outputs of an older or
+    differently configured compiler are never reused.
+
+    Args:
+        options (tuple): the options that affect the generated code.
+
+    Returns:
+        str: a hex digest of the compiler's sources and the given options.
+    """
+    digest = hashlib.sha256(repr(options).encode())
+    for filename in sorted(os.listdir(COMPILER_DIR)):
+        if filename.endswith(".py"):
+            digest.update(filename.encode())
+            digest.update(hash_file(
+                os.path.join(COMPILER_DIR, filename)).encode())
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """A persistent build manifest, kept next to the output, that remembers
+    the content hash of every source compiled there, so sources which did not
+    change since the last build can be skipped.
+    """
+
+    def __init__(self, directory: str, fingerprint: str,
+                 force: bool = False) -> None:
+        """Loads the manifest of the given directory, if there is a valid one.
+
+        Args:
+            directory (str): the directory holding the sources and outputs.
+            fingerprint (str): the fingerprint of the current compiler.
+            force (bool): if True, treats every source as changed.
+        """
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.fingerprint = fingerprint
+        self.force = force
+        self.hashes = self.load()
+        self.new_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> dict:
+        """
+        Returns:
+            dict: the source hashes of the manifest, or an empty dict if it
+            is missing, unreadable or was written by another compiler.
+        """
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or \
+                manifest.get("fingerprint") != self.fingerprint:
+            return {}
+        return manifest.get("files", {})
+
+    def reset(self, fingerprint: str) -> None:
+        """Switches to a new compiler fingerprint, forgetting every output."""
+        self.fingerprint = fingerprint
+        self.hashes = {}
+
+    def is_fresh(self, input_path: str, output_path: str) -> bool:
+        """Checks whether a source may be skipped, and counts the result as
+        a cache hit or miss.
+
+        Args:
+            input_path (str): the path of the source.
+            output_path (str): the path of the output compiled from it.
+
+        Returns:
+            bool: True if the source is unchanged since it was compiled into
+            the existing output, False otherwise.
+        """
+        name = os.path.basename(input_path)
+        self.new_hashes[name] = hash_file(input_path)
+        fresh = not self.force and os.path.exists(output_path) and \
+            self.hashes.get(name) == self.new_hashes[name]
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def record(self, input_path: str) -> None:
+        """Records that a source was compiled successfully."""
+        name = os.path.basename(input_path)
+        self.hashes[name] = self.new_hashes[name]
+
+    def forget(self, input_path: str) -> None:
+        """Records that a source has no valid output."""
+        self.hashes.pop(os.path.basename(input_path), None)
+
+    def save(self) -> None:
+        """Writes the manifest atomically, so an interrupted build never
+        leaves a manifest behind that claims outputs it did not write.
+        """
+        temp_path = "{}.{}.tmp".format(self.manifest_path, os.getpid())
+        with open(temp_path, 'w') as manifest_file:
+            json.dump({"fingerprint": self.fingerprint,
+                       "files": self.hashes}, manifest_file,
+                      indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+
+def subroutine_cache_path(input_path: str) -> str:
+    """
+    Returns:
+        str: the path of the subroutine cache of the given .jack file.
+    """
+    directory, filename = os.path.split(input_path)
+    return os.path.join(directory, SUBROUTINE_CACHE_DIR,
+                        os.path.splitext(filename)[0] + ".json")
+
+
+class SubroutineCache:
+    """The VM code of every subroutine of a class as last compiled, by a
+    hash of the subroutine's tokens and of the class state it depends on, so
+    that only the subroutines which changed are compiled again. Only the
+    entries the last compilation used are saved, so the code of edited
+    subroutines does not pile up.
+    """
+
+    def __init__(self, path: str, fingerprint: str,
+                 force: bool = False) -> None:
+        """Loads the cache saved at the given path, if there is a valid one.
+
+        Args:
+            path (str): the path of the cache file.
+            fingerprint (str): the fingerprint of the current compiler.
+            force (bool): if True, reuses nothing, but still saves the
+            subroutines compiled.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = {} if force else self.load()
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> dict:
+        """
+        Returns:
+            dict: the entries of the cache file, or an empty dict if it is
+            missing, unreadable or was written by another compiler.
+        """
+        try:
+            with open(self.path, 'r') as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or \
+                cache.get("fingerprint") != self.fingerprint:
+            return {}
+        return cache.get("subroutines", {})
+
+    @staticmethod
+    def key(layout: typing.Sequence[str], tokens: typing.List[str]) -> str:
+        """
+        Args:
+            layout (typing.Sequence[str]): the state of the class the code
+            of the subroutine depends on, as strings.
+            tokens (typing.List[str]): the tokens of the subroutine.
+
+        Returns:
+            str: the hex digest identifying the subroutine's code.
+        """
+        # neither the layout nor the tokens, not even string constants,
+        # contain line breaks
+        digest = hashlib.sha256("\n".join(layout).encode())
+        digest.update(b"\0")
+        digest.update("\n".join(tokens).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> typing.Optional[dict]:
+        """Looks a subroutine up, and counts the result as a hit or miss.
+
+        Returns:
+            typing.Optional[dict]: the entry put under the key by an earlier
+            compilation, or None if there is none.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.used[key] = entry
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """Records the entry of a subroutine that was just compiled."""
+        self.used[key] = entry
+
+    def save(self) -> None:
+        """Writes the entries used since the cache was loaded atomically."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, 'w') as cache_file:
+            json.dump({"fingerprint": self.fingerprint,
+                       "subroutines": self.used}, cache_file)
+        os.replace(temp_path, self.path)
+
+
+def token_cache_directory() -> str:
+    """
+    Returns:
+        str: the directory of the token cache shared by every build of the
+        user, $JACK_TOKEN_CACHE if it is set.
+    """
+    return os.environ.get(TOKEN_CACHE_VARIABLE) or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or
+        os.path.join(os.path.expanduser("~"), ".cache"), "jack-tokens")
+
+
+@functools.lru_cache(maxsize=None)
+def tokenizer_fingerprint() -> str:
+    """
+    Returns:
+        str: a hex digest of the tokenizer's source and the entry format,
+        so that tokens of an older tokenizer are never reused.
+    """
+    return hashlib.sha256("{}\0{}".format(
+        TOKEN_CACHE_VERSION,
+        hash_file(os.path.join(COMPILER_DIR, "JackTokenizer.py"))).encode()
+    ).hexdigest()
+
+
+def typecode_of(values: typing.Sequence[int]) -> str:
+    """
+    Returns:
+        str: the type code of the narrowest array that holds the given non
+        negative values.
+    """
+    return 'H' if not values or max(values) < 1 << 16 else 'I'
+
+
+def unpack_array(typecode: str, data: bytes) -> array.array:
+    """
+    Returns:
+        array.array: the array of the given type code held in data.
+    """
+    values = array.array(typecode)
+    values.frombytes(data)
+    return values
+
+
+class TokenCache:
+    """The tokens of every source tokenized before, shared by the compiler
+    and the analyzer of every directory. The tokens of a source are kept in
+    a file of their own, named by a hash of the source and the tokenizer,
+    as a marshaled table of the distinct tokens, the index of every token in
+    the table, the array of their kinds, and their lines as runs of tokens
+    on the same line. Entries are written
+    to a temporary file and renamed into place, so that concurrent builds
+    never read a partial entry, and the least recently used entries are
+    removed once the cache grows past its size. The cache is only a cache:
+    an entry that cannot be read or written is tokenized again.
+    """
+
+    def __init__(self, directory: str, max_size: int = TOKEN_CACHE_SIZE
+                 ) -> None:
+        """
+        Args:
+            directory (str): the directory of the cache.
+            max_size (int): the size in bytes trim cuts the cache down to.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def path_of(self, source: str) -> str:
+        """
+        Returns:
+            str: the path of the entry of the given source.
+        """
+        digest = hashlib.sha256(tokenizer_fingerprint().encode())
+        digest.update(source.encode())
+        return os.path.join(self.directory,
+                            digest.hexdigest() + TOKEN_CACHE_SUFFIX)
+
+    def get(self, source: str) -> typing.Optional[tuple]:
+        """Looks the tokens of a source up, and counts the result as a hit
+        or miss.
+
+        Returns:
+            typing.Optional[tuple]: the tokens, the array of their kinds and
+            the array of their lines, as put, or None if they are not cached.
+        """
+        path = self.path_of(source)
+        try:
+            with open(path, 'rb') as entry_file:
+                version, table, index_code, indices, kinds, line_code, \
+                    line_numbers, line_tokens = marshal.load(entry_file)
+            if version != TOKEN_CACHE_VERSION:
+                raise ValueError("token cache version " + str(version))
+            tokens = list(map(table.__getitem__,
+                              unpack_array(index_code, indices)))
+            lines = array.array('I', itertools.chain.from_iterable(map(
+                itertools.repeat, unpack_array(line_code, line_numbers),
+                unpack_array(line_code, line_tokens))))
+            if len(lines) != len(tokens) or len(kinds) != len(tokens):
+                raise ValueError("truncated token cache entry")
+            entry = (tokens, unpack_array('B', kinds), lines)
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)  # the entry was used, so it is evicted last
+        except OSError:
+            pass
+        return entry
+
+    def put(self, source: str, tokens: typing.List[str],
+            kinds: array.array, lines: array.array) -> None:
+        """Caches the tokens of a source, with their kinds and lines."""
+        table = {}
+        indices = [table.setdefault(token, len(table)) for token in tokens]
+        # the lines as runs: every line holding tokens, and how many
+        line_numbers = []
+        line_tokens = []
+        for line, run in itertools.groupby(lines):
+            line_numbers.append(line)
+            line_tokens.append(sum(1 for _ in run))
+        index_code = typecode_of(indices)
+        line_code = typecode_of(line_numbers + line_tokens)
+        entry = (TOKEN_CACHE_VERSION, list(table), index_code,
+                 array.array(index_code, indices).tobytes(), kinds.tobytes(),
+                 line_code, array.array(line_code, line_numbers).tobytes(),
+                 array.array(line_code, line_tokens).tobytes())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(
+                TOKEN_CACHE_SUFFIX + ".tmp", dir=self.directory)
+            try:
+                with os.fdopen(descriptor, 'wb') as entry_file:
+                    marshal.dump(entry, entry_file)
+                os.replace(temp_path, self.path_of(source))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError:
+            pass
+
+    def trim(self) -> None:
+        """Removes the least recently used entries until the cache fits in
+        its size, and the temporary files of writers that died.
+        """
+        entries = []
+        size = 0
+        now = time.time()
+        try:
+            directory_entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in directory_entries:
+            try:
+                stat = entry.stat()
+            except OSError:  # removed by another build
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > STALE_TEMP_AGE:
+                    self.remove(entry.path)
+            elif entry.name.endswith(TOKEN_CACHE_SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                size += stat.st_size
+        if size <= self.max_size:
+            return
+        for _, entry_size, path in sorted(entries):
+            self.remove(path)
+            size -= entry_size
+            if size <= self.max_size:
+                break
+
+    @staticmethod
+    def remove(path: str) -> None:
+        """Removes a file of the cache, unless another build already did."""
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -4,7 +4,17 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import collections
 import typing
+from CompileOptions import CompileOptions
+from CompileStats import CountingSymbolTable, StatsWriter
+from ExpressionOptimizer import ExpressionOptimizer
+from JackTokenizer import STR_CONST as STRING_KIND
+from LocalSlotPacker import LocalSlotPacker
+from PeepholeOptimizer import PeepholeOptimizer
+from SignatureIndex import SIGNATURE_KIND, SIGNATURE_PARAMS, \
+    SignatureError
+from SourceMap import MappingWriter
 from SymbolTable import *
 from VMWriter import *
 
@@ -32,6 +42,24 @@ IDENTIFIER = "identifier"
 CLASS_VAR = "classVarDec"
 WHILE_START_LABEL = "WHILE_EXP"
 WHILE_END_LABEL = "WHILE_END"
+STRING_POOL_LABEL = "STRING_POOL"
+# not a valid Jack identifier, so it cannot clash with a user subroutine
+STRING_POOL_FUNCTION = "$strings"
+
+
+def repeated_strings(strings: typing.Iterable[str]) -> typing.Set[str]:
+    """
+    Args:
+        strings (typing.Iterable[str]): every string literal of a class, as
+        often as it occurs.
+
+    Returns:
+        typing.Set[str]: the literals that occur more than once. Building
+        the pool costs more than building a literal used once in place,
+        unless that literal is in a loop.
+    """
+    return {string for string, count in collections.Counter(strings).items()
+            if count > 1}
 
 
 class CompilationEngine:
@@ -39,18 +67,49 @@ class CompilationEngine:
      an output stream.
     """
 
-    def __init__(self, jack_tokenizer, output_stream) -> None:
+    def __init__(self, jack_tokenizer, output_stream, options=None,
+                 subroutine_cache=None) -> None:
         """
         Creates a new compilation engine with the given input and output. The
         next routine called must be compileClass()
         :param input_stream: The input stream.
         :param output_stream: The output stream.
+        :param options: The CompileOptions to compile with.
+        :param subroutine_cache: A SubroutineCache to reuse the code of
+        unchanged subroutines from, or None. Needs a tokenizer that is not
+        lazy.
         """
-        self.writer = VMWriter(output_stream)
+        self.options = options or CompileOptions()
+        self.optimizers = []
+        if self.options.optimize:
+            self.optimizers = [ExpressionOptimizer(), PeepholeOptimizer(),
+                               LocalSlotPacker()]
+        if self.options.stats:
+            self.writer = StatsWriter(output_stream, self.optimizers)
+            self.symbol_table = CountingSymbolTable()
+        elif self.options.source_map:
+            self.writer = MappingWriter(output_stream, self.optimizers)
+            self.symbol_table = SymbolTable()
+        else:
+            self.writer = VMWriter(output_stream, self.optimizers)
+            self.symbol_table = SymbolTable()
         self.tokenizer = jack_tokenizer
-        self.symbol_table = SymbolTable()
         self.class_name = ""
+        self.subroutine_kind = None
+        self.function_name = ""
+        # labels are numbered from 0 in every subroutine, so the code of a
+        # subroutine never depends on the subroutines before it
         self.label_counter = 0
+        self.subroutine_cache = subroutine_cache
+        self.class_layout = None
+        # the number of self tail calls turned into jumps, with -O
+        self.tail_calls = 0
+        # maps every pooled string literal to its pool slot
+        self.string_pool = {}
+        # the literals of the class that are pooled wherever they are, with
+        # -O; the others are only pooled in loops
+        self.repeated_strings = set()
+        self.loop_depth = 0
 
     def get_cur_token(self, advance=False):
         cur_token = self.tokenizer.cur_token
@@ -58,16 +117,38 @@ class CompilationEngine:
             self.tokenizer.advance()
         return cur_token
 
+    def mark_position(self, line: typing.Optional[int] = None) -> None:
+        """Marks the source line of the commands written next, the line of
+        the current token by default, when writing a source map.
+        """
+        if self.options.source_map:
+            self.writer.mark(self.tokenizer.line_number() if line is None
+                             else line)
+
     def compile_class(self) -> None:
         """Compiles a complete class."""
+        self.mark_position()
+        if self.options.pool_strings and not self.tokenizer.lazy:
+            # a lazy tokenizer cannot look ahead, so it pools nothing
+            self.repeated_strings = repeated_strings(
+                token for token, kind in zip(self.tokenizer.all_tokens,
+                                             self.tokenizer.kinds)
+                if kind == STRING_KIND)
         self.tokenizer.advance()  # "class" # skip
         self.class_name = self.get_cur_token(True)
         self.tokenizer.advance()  # { # skip
         while self.get_cur_token() in {FIELD, STATIC}:
             self.compile_class_var_dec()
         while self.get_cur_token() in {CONSTRUCTOR, METHOD, FUNCTION}:
-            self.compile_subroutine()
+            if self.subroutine_cache is None:
+                self.compile_subroutine()
+            else:
+                self.compile_cached_subroutine()
+        if self.string_pool:
+            self.mark_position()  # the pool is built for the whole class
+            self.compile_string_pool()
         self.tokenizer.advance()  # } # skip
+        self.writer.flush()
 
     def compile_class_var_dec(self) -> None:
         """Compiles a static declaration or a field declaration."""
@@ -81,10 +162,64 @@ class CompilationEngine:
             self.symbol_table.define(field_name, field_type, field_kind)
         self.tokenizer.advance()  # ;
 
+    def compile_cached_subroutine(self) -> None:
+        """Compiles a complete method, function, or constructor, unless the
+        subroutine cache holds its code. The code depends on the tokens of
+        the subroutine, the fields and statics of the class, the string
+        literals the class pools and those pooled before it, and no other
+        subroutine.
+        """
+        if self.class_layout is None:  # the class variables are all known
+            self.class_layout = repr((
+                self.class_name, self.symbol_table.class_table,
+                self.symbol_table.count_static,
+                sorted(self.repeated_strings)))
+        start = self.tokenizer.cur_ind
+        end = self.subroutine_end()
+        key = self.subroutine_cache.key(
+            (self.class_layout,) + tuple(self.string_pool),
+            self.tokenizer.all_tokens[start:end])
+        entry = self.subroutine_cache.get(key)
+        if entry is not None:
+            for string in entry["strings"]:
+                self.string_pool[string] = len(self.string_pool)
+            self.tail_calls += entry["tail_calls"]
+            self.writer.write_lines(entry["lines"])
+            self.tokenizer.seek(end)
+            return
+        pooled = len(self.string_pool)
+        tail_calls = self.tail_calls
+        self.compile_subroutine()
+        self.subroutine_cache.put(key, {
+            "lines": self.writer.end_function(),
+            "strings": list(self.string_pool)[pooled:],
+            "tail_calls": self.tail_calls - tail_calls})
+
+    def subroutine_end(self) -> int:
+        """
+        Returns:
+            int: the index of the token right after the closing "}" of the
+            subroutine starting at the current token.
+        """
+        tokens = self.tokenizer.all_tokens
+        index = tokens.index("{", self.tokenizer.cur_ind)
+        depth = 0
+        while True:
+            if tokens[index] == "{":
+                depth += 1
+            elif tokens[index] == "}":
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+
     def compile_subroutine(self) -> None:
         """Compiles a complete method, function, or constructor."""
         self.symbol_table.start_subroutine()
+        self.label_counter = 0
+        self.mark_position()
         function_type = self.get_cur_token(True)
+        self.subroutine_kind = function_type
         if function_type == METHOD:
             self.symbol_table.define("this", self.class_name, ARG)
         self.tokenizer.advance()  # void
@@ -100,6 +235,7 @@ class CompilationEngine:
         while self.get_cur_token() == "var":
             self.compile_var_dec()  # get number of locals
         n_locals = self.symbol_table.count_var
+        self.function_name = function_name
         self.writer.write_function(function_name, n_locals)
         if function_type == CONSTRUCTOR:
             self.alloc_constructor()  # num of fields extra space for "this"
@@ -120,8 +256,9 @@ class CompilationEngine:
             func_name = self.get_cur_token(True)
         if self.get_cur_token() == OPEN_BRACKET:
             func_name = self.class_name + "." + func_name
-            self.writer.write_push(POINTER, 0)  # push this as first arg
-            method_args += 1
+            if self.calls_method(func_name):
+                self.writer.write_push(POINTER, 0)  # push this as first arg
+                method_args += 1
         elif self.get_cur_token() == ".":
             if self.symbol_table.does_exist(
                     func_name):  # object method (b.foo())
@@ -134,10 +271,50 @@ class CompilationEngine:
             func_name += self.get_cur_token(True)  # subroutineName
         self.tokenizer.advance()  # skip (
         n_args = self.compile_expression_list() + method_args
-        n_args = self.compile_expression_list() + method_args
         self.tokenizer.advance()  # skip )
+        self.check_call(func_name, n_args, method_args)
         self.writer.write_call(func_name, n_args)
 
+    def calls_method(self, func_name: str) -> bool:
+        """Tells whether a call without a class or an object, like foo(),
+        calls a method on this. Without a signature it is assumed to.
+        """
+        if self.options.signatures is None:
+            return True
+        signature = self.options.signatures.get(func_name)
+        if signature is None:
+            return True
+        if signature[SIGNATURE_KIND] != METHOD:
+            return False
+        if self.subroutine_kind == FUNCTION:
+            raise SignatureError(
+                "method {} called from a function".format(func_name))
+        return True
+
+    def check_call(self, func_name: str, n_args: int,
+                   method_args: int) -> None:
+        """Checks a call against the signature it calls, if there is one.
+
+        Args:
+            func_name (str): the full name of the called subroutine.
+            n_args (int): the number of arguments pushed, with the object.
+            method_args (int): 1 if an object was pushed, 0 otherwise.
+        """
+        if self.options.signatures is None:
+            return
+        signature = self.options.signatures.get(func_name)
+        if signature is None:
+            return
+        if (signature[SIGNATURE_KIND] == METHOD) != bool(method_args):
+            raise SignatureError("{} {} called {}".format(
+                signature[SIGNATURE_KIND], func_name,
+                "on an object" if method_args else "without an object"))
+        if n_args - method_args != signature[SIGNATURE_PARAMS]:
+            raise SignatureError(
+                "{} takes {} arguments, but {} were given".format(
+                    func_name, signature[SIGNATURE_PARAMS],
+                    n_args - method_args))
+
     def compile_var_dec(self) -> None:
         """Compiles a var declaration."""
         self.tokenizer.advance()  # always var
@@ -155,6 +332,7 @@ class CompilationEngine:
         "{}".
         """
         while self.get_cur_token() in STATEMENTS:
+            self.mark_position()
             if self.get_cur_token() == "let":
                 self.compile_let()
             elif self.get_cur_token() == "if":
@@ -217,6 +395,8 @@ class CompilationEngine:
         label_break = WHILE_END_LABEL + str(self.label_counter)
         self.label_counter += 1
         self.writer.write_label(label_loop)
+        line = self.options.source_map and self.tokenizer.line_number()
+        self.loop_depth += 1
         self.tokenizer.advance()  # "while"
         self.tokenizer.advance()  # (
         self.compile_expression()
@@ -225,6 +405,8 @@ class CompilationEngine:
         self.writer.write_if(label_break)
         self.tokenizer.advance()  # {
         self.compile_statements()
+        self.loop_depth -= 1
+        self.mark_position(line)
         self.writer.write_goto(label_loop)
         self.writer.write_label(label_break)
         self.tokenizer.advance()  # }
@@ -236,12 +418,30 @@ class CompilationEngine:
             self.compile_expression()
         else:
             self.writer.write_push("constant", 0)
-        self.writer.write_return()
+        self.write_return()
         self.tokenizer.advance()  # ;
 
+    def write_return(self) -> None:
+        """Writes a return. With -O, when the returned value is a call of
+        the subroutine to itself, the call and the return are replaced by a
+        jump back to the start of the subroutine, which then runs in
+        constant stack space. Constructors are left alone, as every call
+        allocates a new object.
+        """
+        tail_call = "call {} {}\n".format(self.function_name,
+                                          self.symbol_table.count_arg)
+        if self.options.optimize and self.subroutine_kind != CONSTRUCTOR \
+                and self.writer.lines[-1:] == [tail_call]:
+            self.writer.write_tail_call(self.symbol_table.count_arg,
+                                        self.symbol_table.count_var)
+            self.tail_calls += 1
+        else:
+            self.writer.write_return()
+
     def compile_if(self) -> None:
         """Compiles a if statement, possibly with a trailing else clause."""
         self.label_counter += 1
+        line = self.options.source_map and self.tokenizer.line_number()
         self.tokenizer.advance()  # if
         self.tokenizer.advance()  # (
         self.compile_expression()
@@ -253,6 +453,7 @@ class CompilationEngine:
         self.writer.write_if(false_label)  # go to else block
         self.compile_statements()
         self.tokenizer.advance()  # }
+        self.mark_position(line)
         self.writer.write_goto(end_label)  # end true block
         self.writer.write_label(false_label)
         if self.get_cur_token() == "else":
@@ -280,15 +481,19 @@ class CompilationEngine:
         to distinguish between the three possibilities. Any other token is not
         part of this term and should not be advanced over.
         """
-        if self.tokenizer.token_type() == "INT_CONST":
+        token_type = self.tokenizer.token_type()
+        if token_type == "INT_CONST":
             self.writer.write_push("constant",
                                    self.get_cur_token(True))  # intConstant
-        elif self.tokenizer.token_type() == "STR_CONST":
-            self.writer.write_string(
-                self.get_cur_token(True))  # string constant
-        elif self.tokenizer.token_type() == "KEYWORD":
+        elif token_type == "STR_CONST":
+            if self.pools_string(self.get_cur_token()):
+                self.compile_pooled_string(self.get_cur_token(True))
+            else:
+                self.writer.write_string(
+                    self.get_cur_token(True))  # string constant
+        elif token_type == "KEYWORD":
             self.writer.write_constant(self.get_cur_token(True))
-        elif self.tokenizer.token_type() == "IDENTIFIER":
+        elif token_type == "IDENTIFIER":
             temp = self.get_cur_token(True)
             if self.get_cur_token() in {".", "("}:  # call subroutine
                 self.compile_subroutine_call(temp)
@@ -325,9 +530,46 @@ class CompilationEngine:
                 exp_counter += 1
         return exp_counter
 
+    def pools_string(self, string: str) -> bool:
+        """
+        Returns:
+            bool: True if the string literal, with its quotes, is built in
+            the string pool where it occurs now, False if it is built in
+            place.
+        """
+        return self.options.pool_strings and (
+            string in self.repeated_strings or self.loop_depth > 0)
+
+    def compile_pooled_string(self, string):
+        """
+        Pushes a string literal kept in a static slot of the class. All the
+        pooled literals of the class are built on the first use of any of
+        them, by calling the generated string pool function.
+        """
+        slot = self.string_pool.setdefault(string, len(self.string_pool))
+        index = self.symbol_table.count_static + slot
+        ready_label = STRING_POOL_LABEL + str(self.label_counter)
+        self.label_counter += 1
+        self.writer.write_push(STATIC, index)
+        self.writer.write_if(ready_label)  # already built
+        self.writer.write_call(
+            self.class_name + "." + STRING_POOL_FUNCTION, 0)
+        self.writer.write_pop("temp", 0)
+        self.writer.write_label(ready_label)
+        self.writer.write_push(STATIC, index)
+
+    def compile_string_pool(self):
+        """Compiles the function building all the pooled string literals."""
+        self.writer.write_function(
+            self.class_name + "." + STRING_POOL_FUNCTION, 0)
+        for string, slot in self.string_pool.items():
+            self.writer.write_string(string)
+            self.writer.write_pop(STATIC, self.symbol_table.count_static + slot)
+        self.writer.write_push("constant", 0)
+        self.writer.write_return()
+
     def alloc_constructor(self):
-        fields_num = self.symbol_table.count_field + \
-                     self.symbol_table.count_static
+        fields_num = self.symbol_table.count_field
         self.writer.write_push("constant", fields_num)
         self.writer.write_call("Memory.alloc", 1)
         self.writer.write_pop("pointer", 0)  # update "this"
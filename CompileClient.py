@@ -0,0 +1,100 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+The client of the CompileServer, which the JackCompiler wrapper runs. It
+hands the command line to the compile server listening on the socket, and
+compiles in its own process when there is none. Only what talking to the
+server takes is imported up front, so a compile through the server does not
+pay for importing the compiler.
+"""
+import json
+import os
+import socket
+import sys
+import typing
+
+# the environment variable that overrides the path of the server's socket
+SOCKET_VARIABLE = "JACK_COMPILER_SOCKET"
+# seconds to wait for the server to accept a connection
+CONNECT_TIMEOUT = 1.0
+# the directory of the compiler, which the server must be running from
+COMPILER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def socket_path() -> str:
+    """
+    Returns:
+        str: the path of the compile server's socket, private to the user.
+    """
+    return os.environ.get(SOCKET_VARIABLE) or os.path.join(
+        os.environ.get("TMPDIR", "/tmp"),
+        "jackcompiler-{}.sock".format(os.getuid()))
+
+
+def request(message: dict, path: typing.Optional[str] = None) -> dict:
+    """Sends a request to the compile server and waits for its response.
+    Raises OSError if no server is listening.
+
+    Args:
+        message (dict): the request.
+        path (str): the path of the socket, socket_path() by default.
+
+    Returns:
+        dict: the response.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(CONNECT_TIMEOUT)
+        connection.connect(path or socket_path())
+        connection.settimeout(None)
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        with connection.makefile('rb') as response_file:
+            response = response_file.readline()
+    finally:
+        connection.close()
+    if not response:
+        raise ConnectionError("the compile server closed the connection")
+    return json.loads(response)
+
+
+def compile_remotely(argv: list, path: typing.Optional[str] = None) -> int:
+    """Runs a JackCompiler command line on the compile server, printing what
+    it printed. Raises OSError if no server is listening, or if the server
+    cannot run the command.
+
+    Returns:
+        int: the exit status of the command.
+    """
+    response = request({"command": "compile", "argv": argv,
+                        "cwd": os.getcwd(), "compiler": COMPILER_DIRECTORY},
+                       path)
+    if "error" in response:
+        raise ConnectionError(response["error"])
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+def main(argv: typing.Optional[list] = None) -> int:
+    """Runs a JackCompiler command line, on the compile server if one is
+    listening, and in this process otherwise. Watching never goes to the
+    server, as it does not end.
+
+    Returns:
+        int: the exit status of the command.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if "--watch" not in argv:
+        try:
+            return compile_remotely(argv)
+        except OSError:
+            pass
+    import JackCompiler
+    return JackCompiler.main(argv)
+
+
+if "__main__" == __name__:
+    sys.exit(main())
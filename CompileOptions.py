@@ -0,0 +1,65 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+
+class CompileOptions:
+    """The options that control how a single class is compiled."""
+
+    def __init__(self, lazy: bool = False, optimize: bool = False,
+                 string_pool: bool = True, ir: bool = False,
+                 stats: bool = False, signatures=None,
+                 inline: bool = False, incremental: bool = False,
+                 source_map: bool = False) -> None:
+        """Creates a new set of options.
+
+        Args:
+            lazy (bool): tokenize the input on demand instead of up front.
+            optimize (bool): optimize the generated VM code.
+            string_pool (bool): when optimizing, build every string literal
+            used more than once in a class, or used in a loop, only once and
+            reuse it. Programs that mutate or dispose their literals must
+            turn this off.
+            ir (bool): build the intermediate representation of the class
+            and lower it, instead of emitting VM code while parsing.
+            stats (bool): time the phases of the compilation and count the
+            tokens, commands and symbol lookups.
+            signatures (SignatureIndex): the signatures of the subroutines
+            the class may call, to resolve and check its calls with, or None
+            to compile the calls as written.
+            inline (bool): in whole program builds, inline the calls to
+            trivial subroutines.
+            incremental (bool): when compiling files, reuse the code of the
+            subroutines that did not change since the last compilation,
+            kept in a SubroutineCache next to the file, and the tokens of
+            sources tokenized before, kept in the shared TokenCache. The
+            subroutines are not reused when tokenizing lazily, compiling
+            through the IR, collecting stats or writing a source map, and
+            the tokens are not reused when tokenizing lazily or collecting
+            stats.
+            source_map (bool): keep the Jack source line of every VM
+            command, for a source map. Ignored when compiling through the
+            IR.
+        """
+        self.lazy = lazy
+        self.optimize = optimize
+        self.pool_strings = optimize and string_pool
+        self.ir = ir
+        self.stats = stats
+        self.signatures = signatures
+        self.inline = inline
+        self.incremental = incremental
+        self.source_map = source_map
+
+    def fingerprint(self) -> tuple:
+        """
+        Returns:
+            tuple: the values of the options that affect the generated code.
+        """
+        return ("optimize", self.optimize), \
+            ("pool_strings", self.pool_strings), ("ir", self.ir), \
+            ("signatures", self.signatures and self.signatures.digest()), \
+            ("inline", self.inline), ("source_map", self.source_map)
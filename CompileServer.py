@@ -0,0 +1,222 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+A compile server, which keeps the compiler loaded in a pool of worker
+processes and compiles for the clients that connect to its Unix socket, so
+that they pay neither for starting Python nor for importing the compiler.
+A request is a line of JSON, answered by a line of JSON:
+
+- {"command": "compile", "argv": [...], "cwd": "..."} runs a JackCompiler
+  command line in the given directory, and is answered with its "status",
+  "stdout" and "stderr".
+- {"command": "sources", "sources": [[name, source], ...], "options": {}}
+  compiles classes in memory, with the optimize, string_pool and ir
+  options, and is answered with a [name, error or null, VM code] triplet
+  per class, as "results".
+- {"command": "status"} is answered with the "pid", "workers" and the
+  number of requests "served".
+- {"command": "stop"} stops the server.
+
+A request the server cannot run is answered with an "error". The workers
+run the compiler as it was when the server started, so the server must be
+restarted after the compiler changes.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+import traceback
+import typing
+import JackCompiler
+from CompileClient import COMPILER_DIRECTORY, request, socket_path
+from CompileOptions import CompileOptions
+
+# the longest request line, as inline sources may be large
+MAX_REQUEST_SIZE = 1 << 26
+# the options a "sources" request may set
+SOURCE_OPTIONS = ("optimize", "string_pool", "ir")
+
+
+def run_command(argv: list, cwd: str) -> dict:
+    """Runs a JackCompiler command line in a worker, as the client would
+    have run it.
+
+    Returns:
+        dict: the exit status of the command and what it printed.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), \
+            contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            status = JackCompiler.main(argv)
+        except SystemExit as exit_request:  # argparse errors and --help
+            status = exit_request.code
+            if not isinstance(status, int):
+                if status is not None:
+                    print(status, file=sys.stderr)
+                status = int(status is not None)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return {"status": status, "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue()}
+
+
+def run_sources(sources: list, options: dict) -> dict:
+    """Compiles classes in memory in a worker.
+
+    Returns:
+        dict: the (name, error message or None, VM code) triplets of the
+        classes, in order.
+    """
+    compile_options = CompileOptions(**options)
+    return {"results": [list(result) for result in JackCompiler.compile_many(
+        (tuple(named_source) for named_source in sources),
+        options=compile_options)]}
+
+
+class CompileServer:
+    """Serves compile requests on a Unix socket, running at most as many
+    at once as there are workers. The other requests wait their turn.
+    """
+
+    def __init__(self, path: str, workers: int) -> None:
+        """
+        Args:
+            path (str): the path of the socket.
+            workers (int): the number of worker processes.
+        """
+        self.path = path
+        self.workers = workers
+        self.executor = None
+        self.stopping = None
+        self.served = 0
+
+    def start_workers(self) -> None:
+        """Starts the worker processes and waits until they are up, so the
+        first requests find the compiler loaded.
+        """
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        for future in [self.executor.submit(os.getpid)
+                       for _ in range(self.workers)]:
+            future.result()
+
+    async def serve(self) -> None:
+        """Serves requests until a stop request or a signal."""
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, self.stopping.set)
+        server = await asyncio.start_unix_server(
+            self.handle, self.path, limit=MAX_REQUEST_SIZE)
+        os.chmod(self.path, 0o600)  # the requests write the user's files
+        try:
+            async with server:
+                await self.stopping.wait()
+        finally:
+            os.unlink(self.path)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Answers the request of a single connection."""
+        try:
+            try:
+                response = await self.respond(
+                    json.loads(await reader.readline()))
+            except (ValueError, TypeError, KeyError) as error:
+                response = {"error": "bad request: {}".format(error)}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:  # the client is gone
+            pass
+
+    async def respond(self, message: dict) -> dict:
+        """
+        Returns:
+            dict: the response to a request.
+        """
+        command = message["command"]
+        if command == "status":
+            return {"pid": os.getpid(), "workers": self.workers,
+                    "served": self.served}
+        if command == "stop":
+            self.stopping.set()
+            return {}
+        if command == "compile":
+            if message.get("compiler", COMPILER_DIRECTORY) != \
+                    COMPILER_DIRECTORY:
+                return {"error": "the server runs the compiler in " +
+                                 COMPILER_DIRECTORY}
+            job = (run_command, list(map(str, message["argv"])),
+                   message["cwd"])
+        elif command == "sources":
+            options = message.get("options", {})
+            unknown = set(options) - set(SOURCE_OPTIONS)
+            if unknown:
+                return {"error": "unknown options: " +
+                                 ", ".join(sorted(unknown))}
+            job = (run_sources, message["sources"], options)
+        else:
+            return {"error": "unknown command: {}".format(command)}
+        self.served += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, *job)
+        except concurrent.futures.process.BrokenProcessPool:
+            # a worker died, taking the pool with it
+            self.executor.shutdown(wait=False)
+            self.start_workers()
+            return {"error": "a compile worker died"}
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(prog="CompileServer")
+    parser.add_argument("--socket", default=socket_path(),
+                        help="the path of the socket (by default, from "
+                             "$JACK_COMPILER_SOCKET or in the temporary "
+                             "directory)")
+    parser.add_argument("-j", "--workers", type=int,
+                        default=os.cpu_count(),
+                        help="number of requests compiled in parallel")
+    parser.add_argument("--status", action="store_true",
+                        help="report on the running server")
+    parser.add_argument("--stop", action="store_true",
+                        help="stop the running server")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be positive")
+    if args.status or args.stop:
+        try:
+            print(json.dumps(request(
+                {"command": "stop" if args.stop else "status"},
+                args.socket)))
+        except OSError as error:
+            print("CompileServer: no server at {}: {}".format(
+                args.socket, error), file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    if os.path.exists(args.socket):
+        try:
+            request({"command": "status"}, args.socket)
+        except OSError:  # left behind by a server that did not stop
+            os.unlink(args.socket)
+        else:
+            parser.error("a server is already running at " + args.socket)
+    compile_server = CompileServer(args.socket, args.workers)
+    # the workers are forked before the event loop starts
+    compile_server.start_workers()
+    try:
+        asyncio.run(compile_server.serve())
+    finally:
+        compile_server.executor.shutdown()
@@ -0,0 +1,157 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+The --stats instrumentation. The compiler only uses these classes when
+statistics are requested, so a normal build does not pay for the counting.
+"""
+import collections
+import time
+import typing
+from JackTokenizer import JackTokenizer
+from SymbolTable import SymbolTable
+from VMWriter import VMWriter
+
+
+class CountingSymbolTable(SymbolTable):
+    """A SymbolTable that counts the lookups of identifiers."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lookups = 0
+
+    def kind_of(self, name: str) -> str:
+        self.lookups += 1
+        return super().kind_of(name)
+
+    def type_of(self, name: str) -> str:
+        self.lookups += 1
+        return super().type_of(name)
+
+    def index_of(self, name: str) -> int:
+        self.lookups += 1
+        return super().index_of(name)
+
+    def does_exist(self, name):
+        self.lookups += 1
+        return super().does_exist(name)
+
+
+class TimingTokenizer(JackTokenizer):
+    """A JackTokenizer that times the stripping of comments apart from the
+    splitting of the stripped lines into tokens. Never uses the token cache.
+    """
+
+    def __init__(self, phase_times: dict, input_stream: typing.TextIO,
+                 lazy: bool = False) -> None:
+        """
+        Args:
+            phase_times (dict): the seconds of the phases, to which the
+            "strip_comments" and "lex" phases are added.
+            input_stream (typing.TextIO): input stream.
+            lazy (bool): whether to tokenize lazily.
+        """
+        self.phase_times = phase_times
+        phase_times["strip_comments"] = phase_times["lex"] = 0.0
+        super().__init__(input_stream, lazy)
+
+    def ignore_comments(self, line, in_comment):
+        start = time.perf_counter()
+        stripped = super().ignore_comments(line, in_comment)
+        self.phase_times["strip_comments"] += time.perf_counter() - start
+        return stripped
+
+    def tokenize_line(self, line):
+        start = time.perf_counter()
+        tokens = super().tokenize_line(line)
+        self.phase_times["lex"] += time.perf_counter() - start
+        return tokens
+
+
+class StatsWriter(VMWriter):
+    """A VMWriter that counts the commands it writes by opcode, and times
+    its optimizers and its writes to the output stream.
+    """
+
+    def __init__(self, output_stream: typing.TextIO,
+                 optimizers: typing.Sequence = ()) -> None:
+        super().__init__(output_stream, optimizers)
+        self.opcodes = collections.Counter()
+        self.optimize_time = 0.0
+        self.write_time = 0.0
+
+    def end_function(self) -> typing.List[str]:
+        start = time.perf_counter()
+        lines = super().end_function()
+        self.optimize_time += time.perf_counter() - start
+        return lines
+
+    def flush(self) -> None:
+        self.end_function()
+        # every entry holds a single command
+        self.opcodes.update(command.split(" ", 1)[0] for command in
+                            "".join(self.lines).splitlines())
+        start = time.perf_counter()
+        super().flush()
+        self.write_time += time.perf_counter() - start
+
+
+def file_stats(phase_times: dict, tokens: typing.Optional[int],
+               compiler) -> dict:
+    """Collects the statistics of a compiled file.
+
+    Args:
+        phase_times (dict): the seconds every phase of compile_file took,
+        with the optimizing and writing done by the writer, and the comment
+        stripping and lexing timed by the TimingTokenizer, still included.
+        tokens (typing.Optional[int]): the number of tokens of the file, or
+        None if it was tokenized lazily, while compiling.
+        compiler: the CompilationEngine or IRLowering that emitted the file.
+
+    Returns:
+        dict: the statistics of the file.
+    """
+    writer = compiler.writer
+    if tokens is not None:
+        lexing_phase = "tokenize"
+    else:  # the lazy tokenizer runs while parsing or compiling
+        lexing_phase = "parse" if "parse" in phase_times else "compile"
+    phase_times[lexing_phase] -= \
+        phase_times["strip_comments"] + phase_times["lex"]
+    emitting_phase = "lower" if "lower" in phase_times else "compile"
+    phase_times[emitting_phase] -= writer.optimize_time + writer.write_time
+    phase_times["optimize"] = writer.optimize_time
+    phase_times["write"] = writer.write_time
+    return {
+        "phases_ms": {phase: round(seconds * 1000, 3)
+                      for phase, seconds in phase_times.items()},
+        "tokens": tokens,
+        "vm_commands": sum(writer.opcodes.values()),
+        "opcodes": dict(sorted(writer.opcodes.items())),
+        "labels": writer.opcodes["label"],
+        "symbol_lookups": compiler.symbol_table.lookups}
+
+
+def total_stats(files: dict) -> dict:
+    """
+    Args:
+        files (dict): the statistics of every compiled file, by path.
+
+    Returns:
+        dict: the sums of the statistics of all the files.
+    """
+    phases = collections.Counter()
+    opcodes = collections.Counter()
+    totals = {"files": len(files), "tokens": 0, "vm_commands": 0,
+              "labels": 0, "symbol_lookups": 0}
+    for stats in files.values():
+        phases.update(stats["phases_ms"])
+        opcodes.update(stats["opcodes"])
+        for name in ("tokens", "vm_commands", "labels", "symbol_lookups"):
+            totals[name] += stats[name] or 0
+    totals["phases_ms"] = {phase: round(milliseconds, 3)
+                           for phase, milliseconds in phases.items()}
+    totals["opcodes"] = dict(sorted(opcodes.items()))
+    return totals
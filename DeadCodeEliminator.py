@@ -0,0 +1,133 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+FUNCTION = "function "
+CALL = "call "
+# the program starts in Sys.init, which calls Main.main
+ROOT_FUNCTIONS = ("Main.main", "Sys.init")
+# the OS classes call each other's subroutines, so a class that replaces one
+# of them is kept whole
+OS_CLASSES = frozenset({"Array", "Keyboard", "Math", "Memory", "Output",
+                        "Screen", "String", "Sys"})
+
+
+def split_functions(lines: typing.List[str]) -> typing.List[tuple]:
+    """Splits VM code into the blocks of its functions.
+
+    Args:
+        lines (typing.List[str]): the lines of a .vm file.
+
+    Returns:
+        typing.List[tuple]: a (function name, lines) pair for every
+        function, in order. Lines before the first function belong to a
+        block named None.
+    """
+    blocks = []
+    name, block = None, []
+    for line in lines:
+        if line.startswith(FUNCTION):
+            if block:
+                blocks.append((name, block))
+            name, block = line.split()[1], []
+        block.append(line)
+    if block:
+        blocks.append((name, block))
+    return blocks
+
+
+def call_targets(lines: typing.List[str]) -> typing.Set[str]:
+    """
+    Returns:
+        typing.Set[str]: the names of the functions the given lines call.
+    """
+    return {line.split()[1] for line in lines if line.startswith(CALL)}
+
+
+class DeadCodeEliminator:
+    """Removes the functions of a whole program that can never be called,
+    following the calls from the program's entry points.
+    """
+
+    def __init__(self, roots: typing.Iterable[str] = ROOT_FUNCTIONS) -> None:
+        """Creates a new eliminator.
+
+        Args:
+            roots (typing.Iterable[str]): the functions the program may
+            start in.
+        """
+        self.roots = tuple(roots)
+        self.removed = {}
+        self.lines_saved = {}
+
+    def counters(self, program_name) -> dict:
+        """
+        Returns:
+            dict: the functions removed from the given file, and the number
+            of VM lines that saved.
+        """
+        return {"removed_functions": self.removed.get(program_name, []),
+                "dead_lines": self.lines_saved.get(program_name, 0)}
+
+    def eliminate(self, programs: dict) -> dict:
+        """Removes the unreachable functions from the files of a program.
+        A program that defines none of the roots is a library and is
+        returned unchanged.
+
+        Args:
+            programs (dict): the lines of every .vm file of the program, by
+            file name.
+
+        Returns:
+            dict: the lines of every file without its unreachable functions.
+        """
+        blocks = {name: split_functions(lines)
+                  for name, lines in programs.items()}
+        callees = {}
+        roots = []
+        for file_blocks in blocks.values():
+            for function_name, block in file_blocks:
+                callees[function_name] = call_targets(block)
+                if function_name is None or function_name in self.roots or \
+                        function_name.split(".")[0] in OS_CLASSES:
+                    roots.append(function_name)
+        if not any(root in callees for root in self.roots):
+            return programs
+        reachable = self.reachable(roots, callees)
+        pruned = {}
+        for name, file_blocks in blocks.items():
+            pruned[name] = []
+            for function_name, block in file_blocks:
+                if function_name in reachable:
+                    pruned[name] += block
+                else:
+                    self.removed.setdefault(name, []).append(function_name)
+                    self.lines_saved[name] = \
+                        self.lines_saved.get(name, 0) + len(block)
+        return pruned
+
+    @staticmethod
+    def reachable(roots: typing.List[str], callees: dict) -> set:
+        """
+        Args:
+            roots (typing.List[str]): the functions to start from.
+            callees (dict): the functions called by every function.
+
+        Returns:
+            set: the defined functions that the roots may call, including
+            the roots themselves.
+        """
+        reachable = set()
+        pending = [root for root in roots if root in callees]
+        while pending:
+            function_name = pending.pop()
+            if function_name in reachable:
+                continue
+            reachable.add(function_name)
+            pending += [callee for callee in callees[function_name]
+                        if callee in callees and callee not in reachable]
+        return reachable
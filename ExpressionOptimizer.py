@@ -0,0 +1,243 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+MAX_CONSTANT = 32767
+MULTIPLY = "call Math.multiply 2\n"
+DIVIDE = "call Math.divide 2\n"
+UNARY_FUNCTIONS = {"neg\n": lambda x: -x, "not\n": lambda x: ~x}
+BINARY_FUNCTIONS = {
+    "add\n": lambda x, y: x + y,
+    "sub\n": lambda x, y: x - y,
+    "and\n": lambda x, y: x & y,
+    "or\n": lambda x, y: x | y,
+    "lt\n": lambda x, y: -(x < y),
+    "gt\n": lambda x, y: -(x > y),
+    "eq\n": lambda x, y: -(x == y),
+    MULTIPLY: lambda x, y: x * y,
+}
+# operations that leave their left operand unchanged for a right operand
+IDENTITIES = {"add\n": 0, "sub\n": 0, "or\n": 0, "and\n": -1, MULTIPLY: 1,
+              DIVIDE: 1}
+# strength reduction only pays off up to this many replacement commands
+MAX_REDUCTION_LINES = 24
+# temp registers the strength reduced multiplications work in; temp 0 is
+# kept for compile_do and compile_let
+FACTOR = "temp 1"
+PRODUCT = "temp 2"
+
+
+def wrap(value: int) -> int:
+    """
+    Returns:
+        int: the value wrapped around to a signed 16 bit integer, as the Hack
+        platform computes it.
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def divide(dividend: int, divisor: int) -> int:
+    """
+    Returns:
+        int: the quotient of Math.divide, which rounds toward zero.
+    """
+    quotient = abs(dividend) // abs(divisor)
+    return -quotient if (dividend < 0) != (divisor < 0) else quotient
+
+
+def push_constant(value: int) -> typing.List[str]:
+    """
+    Returns:
+        typing.List[str]: the shortest commands pushing the given value.
+    """
+    if value >= 0:
+        return ["push constant {}\n".format(value)]
+    if value == -MAX_CONSTANT - 1:
+        return ["push constant {}\n".format(MAX_CONSTANT), "not\n"]
+    return ["push constant {}\n".format(-value), "neg\n"]
+
+
+def constant_at(lines: typing.List[str], end: int) -> typing.Optional[tuple]:
+    """Decodes a constant pushed by the commands ending right before end.
+
+    Returns:
+        typing.Optional[tuple]: the constant's value and the number of
+        commands pushing it, or None if they do not push a constant.
+    """
+    length = 1
+    unary = None
+    if end > 1 and lines[end - 1] in UNARY_FUNCTIONS:
+        unary = UNARY_FUNCTIONS[lines[end - 1]]
+        end -= 1
+        length = 2
+    if end < 1 or not lines[end - 1].startswith("push constant "):
+        return None
+    digits = lines[end - 1][len("push constant "):-1]
+    if not digits.isdigit() or int(digits) > MAX_CONSTANT:
+        return None
+    value = int(digits)
+    if unary is not None:
+        value = wrap(unary(value))
+    return value, length
+
+
+def multiply_by(factor: int,
+                operand: typing.Optional[str]) -> typing.List[str]:
+    """Multiplies the value on top of the stack by a constant using only
+    additions, with the same 16 bit wraparound as Math.multiply.
+
+    Args:
+        factor (int): the constant factor.
+        operand (typing.Optional[str]): a push command that pushed the value
+        and may be repeated, or None if the value must be saved first.
+        It must not read the temp registers used here.
+
+    Returns:
+        typing.List[str]: the commands replacing the multiplication.
+    """
+    negative = factor < 0
+    factor = abs(factor)
+    if factor == 0:
+        return ["pop {}\n".format(FACTOR)] + push_constant(0)
+    lines = []
+    double = ["pop {}\n".format(PRODUCT), "push {}\n".format(PRODUCT),
+              "push {}\n".format(PRODUCT), "add\n"]
+    if factor & (factor - 1) == 0:  # a power of two, doubled in place
+        bits = factor.bit_length() - 1
+        if bits and operand is not None:
+            lines += [operand, "add\n"]
+            bits -= 1
+        lines += double * bits
+    else:  # the binary method, adding the value for every set bit
+        if operand is None:
+            operand = "push {}\n".format(FACTOR)
+            lines += ["pop {}\n".format(FACTOR), operand]
+        for bit in bin(factor)[3:]:
+            lines += double
+            if bit == "1":
+                lines += [operand, "add\n"]
+    if negative:
+        lines.append("neg\n")
+    return lines
+
+
+class ExpressionOptimizer:
+    """Folds the constant subexpressions in the VM code of a single function
+    and replaces multiplications by constants with cheaper additions.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new optimizer."""
+        self.folded = 0
+        self.reduced = 0
+
+    def counters(self) -> dict:
+        """
+        Returns:
+            dict: the number of folded operations and reduced multiplications.
+        """
+        return {"constants_folded": self.folded,
+                "multiplications_reduced": self.reduced}
+
+    def optimize(self, lines: typing.List[str]) -> typing.List[str]:
+        """Optimizes the expressions in the VM code of a function.
+
+        Args:
+            lines (typing.List[str]): the rendered lines of the function.
+
+        Returns:
+            typing.List[str]: the optimized lines.
+        """
+        optimized = []
+        for line in lines:
+            optimized.append(line)
+            if line in UNARY_FUNCTIONS:
+                self.fold_unary(optimized)
+            elif line in BINARY_FUNCTIONS or line == DIVIDE:
+                if not self.fold_binary(optimized) and line == MULTIPLY:
+                    self.reduce_multiply(optimized)
+        return optimized
+
+    def fold_unary(self, lines: typing.List[str]) -> None:
+        """Folds a unary operation at the end of lines over a constant."""
+        operand = constant_at(lines, len(lines) - 1)
+        if operand is None:
+            return
+        value, length = operand
+        folded = push_constant(wrap(UNARY_FUNCTIONS[lines[-1]](value)))
+        if len(folded) < length + 1:
+            lines[-length - 1:] = folded
+            self.folded += 1
+
+    def fold_binary(self, lines: typing.List[str]) -> bool:
+        """Folds a binary operation at the end of lines over two constants,
+        or removes it if its right operand is its identity.
+
+        Returns:
+            bool: True if the operation was folded or removed.
+        """
+        operation = lines[-1]
+        right = constant_at(lines, len(lines) - 1)
+        if right is None:
+            return False
+        right_value, right_length = right
+        if IDENTITIES.get(operation) == right_value:
+            del lines[-right_length - 1:]
+            self.folded += 1
+            return True
+        left = constant_at(lines, len(lines) - 1 - right_length)
+        if left is None:
+            return False
+        left_value, left_length = left
+        if operation == DIVIDE:
+            if right_value == 0 or -MAX_CONSTANT - 1 in {left_value,
+                                                        right_value}:
+                return False  # left for Math.divide to report or handle
+            value = divide(left_value, right_value)
+        else:
+            value = BINARY_FUNCTIONS[operation](left_value, right_value)
+        lines[-left_length - right_length - 1:] = push_constant(wrap(value))
+        self.folded += 1
+        return True
+
+    def reduce_multiply(self, lines: typing.List[str]) -> None:
+        """Replaces a multiplication by a constant at the end of lines with
+        additions, if that is short enough.
+        """
+        right = constant_at(lines, len(lines) - 1)
+        if right is not None:
+            factor, length = right
+            operand = None
+            if len(lines) > length + 1 and \
+                    is_repeatable_push(lines[-length - 2]):
+                operand = lines[-length - 2]
+            start = len(lines) - length - 1
+        else:  # a constant times a repeatable push
+            if len(lines) < 3 or not is_repeatable_push(lines[-2]):
+                return
+            left = constant_at(lines, len(lines) - 2)
+            if left is None:
+                return
+            factor, length = left
+            operand = lines[-2]
+            start = len(lines) - length - 2
+        reduced = multiply_by(factor, operand)
+        if right is None:  # the operand now has to be pushed first
+            reduced = [operand] + reduced
+        if len(reduced) <= MAX_REDUCTION_LINES:
+            lines[start:] = reduced
+            self.reduced += 1
+
+
+def is_repeatable_push(line: str) -> bool:
+    """
+    Returns:
+        bool: True if pushing the same command again pushes the same value.
+    """
+    return line.startswith("push ") and \
+        not line.startswith(("push constant ", "push temp 1\n",
+                             "push temp 2\n"))
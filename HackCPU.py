@@ -0,0 +1,207 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Assembles Hack assembly and runs it on a simulated Hack CPU, one instruction
+per cycle, with the Jack OS subroutines of the HackTranslator's stubs run by
+the JackOS stand-in of the VMEmulator.
+"""
+import argparse
+import sys
+import typing
+from HackTranslator import HALT_LABEL, NATIVE_PREFIX
+from VMEmulator import JackOS, VMError, VMHalt, RAM_SIZE, wrap
+
+PREDEFINED_SYMBOLS = {"SP": 0, "LCL": 1, "ARG": 2, "THIS": 3, "THAT": 4,
+                      "SCREEN": 16384, "KBD": 24576}
+PREDEFINED_SYMBOLS.update(("R{}".format(index), index)
+                          for index in range(16))
+FIRST_VARIABLE = 16
+DEFAULT_LIMIT = 500000000
+ADDRESS_MASK = 0x7fff
+# the computations of the ALU, on the A, D and M registers
+COMPUTATIONS = {
+    "0": lambda a, d, m: 0, "1": lambda a, d, m: 1,
+    "-1": lambda a, d, m: -1, "D": lambda a, d, m: d,
+    "A": lambda a, d, m: a, "M": lambda a, d, m: m,
+    "!D": lambda a, d, m: ~d, "!A": lambda a, d, m: ~a,
+    "!M": lambda a, d, m: ~m, "-D": lambda a, d, m: -d,
+    "-A": lambda a, d, m: -a, "-M": lambda a, d, m: -m,
+    "D+1": lambda a, d, m: d + 1, "A+1": lambda a, d, m: a + 1,
+    "M+1": lambda a, d, m: m + 1, "D-1": lambda a, d, m: d - 1,
+    "A-1": lambda a, d, m: a - 1, "M-1": lambda a, d, m: m - 1,
+    "D+A": lambda a, d, m: d + a, "D+M": lambda a, d, m: d + m,
+    "D-A": lambda a, d, m: d - a, "D-M": lambda a, d, m: d - m,
+    "A-D": lambda a, d, m: a - d, "M-D": lambda a, d, m: m - d,
+    "D&A": lambda a, d, m: d & a, "D&M": lambda a, d, m: d & m,
+    "D|A": lambda a, d, m: d | a, "D|M": lambda a, d, m: d | m}
+for commuted in ("A+D", "M+D", "A&D", "M&D", "A|D", "M|D"):
+    COMPUTATIONS[commuted] = COMPUTATIONS[commuted[::-1]]
+JUMPS = {"": None, "JMP": lambda value: True,
+         "JGT": lambda value: value > 0, "JEQ": lambda value: value == 0,
+         "JGE": lambda value: value >= 0, "JLT": lambda value: value < 0,
+         "JNE": lambda value: value != 0, "JLE": lambda value: value <= 0}
+
+
+class AssemblyError(Exception):
+    """Raised for assembly that cannot be assembled."""
+
+
+def assemble(lines: typing.Iterable[str]) -> typing.Tuple[list, dict]:
+    """Assembles a Hack program into decoded instructions: an A-instruction
+    is its value, and a C-instruction is a (computation, reads M, writes A,
+    writes D, writes M, jump) tuple.
+
+    Returns:
+        typing.Tuple[list, dict]: the instructions, and the address of every
+        label and variable, by symbol.
+    """
+    instructions = []
+    symbols = dict(PREDEFINED_SYMBOLS)
+    for line in lines:
+        line = line.split("//")[0].strip()
+        if line.startswith("("):
+            symbols[line[1:-1]] = len(instructions)
+        elif line:
+            instructions.append(line)
+    next_variable = FIRST_VARIABLE
+    decoded = []
+    for instruction in instructions:
+        if instruction.startswith("@"):
+            symbol = instruction[1:]
+            if symbol.isdigit():
+                decoded.append(int(symbol))
+                continue
+            if symbol not in symbols:
+                symbols[symbol] = next_variable
+                next_variable += 1
+            decoded.append(symbols[symbol])
+            continue
+        destination, _, computation = instruction.rpartition("=")
+        computation, _, jump = computation.partition(";")
+        if computation not in COMPUTATIONS or jump not in JUMPS:
+            raise AssemblyError("invalid instruction " + instruction)
+        decoded.append((COMPUTATIONS[computation], "M" in computation,
+                        "A" in destination, "D" in destination,
+                        "M" in destination, JUMPS[jump]))
+    return decoded, symbols
+
+
+class HackCPU:
+    """Runs an assembled program, counting the cycles it takes. Running
+    stops at the $HALT loop of the HackTranslator, or when the program calls
+    Sys.halt.
+    """
+
+    def __init__(self, lines: typing.Iterable[str],
+                 keys: typing.Iterable[int] = (), typed: str = "",
+                 memory: typing.Optional[dict] = None) -> None:
+        """Loads a program.
+
+        Args:
+            lines (typing.Iterable[str]): the lines of the assembly program.
+            keys (typing.Iterable[int]): the keys Keyboard.keyPressed
+            returns, one per call.
+            typed (str): the text typed into Keyboard.readChar.
+            memory (dict): initial RAM values, by address.
+        """
+        self.rom, symbols = assemble(lines)
+        self.ram = [0] * RAM_SIZE
+        for address, value in (memory or {}).items():
+            self.ram[address] = value
+        self.os = JackOS(self.ram, keys, typed)
+        natives = self.os.functions()
+        self.natives = {
+            address: natives[symbol[len(NATIVE_PREFIX):]]
+            for symbol, address in symbols.items()
+            if symbol.startswith(NATIVE_PREFIX)}
+        self.halt_address = symbols.get(HALT_LABEL)
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, limit: int = DEFAULT_LIMIT) -> bool:
+        """Runs the program until it halts, or for about limit cycles.
+
+        Returns:
+            bool: True if the program halted, False if it hit the limit.
+        """
+        ram = self.ram
+        rom = self.rom
+        natives = self.natives
+        halt_address = self.halt_address
+        a = d = pc = 0
+        cycles = 0
+        try:
+            while cycles < limit:
+                if pc in natives:
+                    self.call_native(natives[pc])
+                if pc == halt_address:
+                    self.halted = True
+                    return True
+                instruction = rom[pc]
+                cycles += 1
+                pc += 1
+                if instruction.__class__ is int:
+                    a = instruction
+                    continue
+                compute, reads_m, to_a, to_d, to_m, jump = instruction
+                value = compute(a, d, ram[a & ADDRESS_MASK] if reads_m
+                                else 0)
+                if not -32768 <= value <= 32767:
+                    value = wrap(value)
+                if to_m:
+                    ram[a & ADDRESS_MASK] = value
+                if jump is not None and jump(value):
+                    pc = a & ADDRESS_MASK
+                if to_a:
+                    a = value
+                if to_d:
+                    d = value
+            return False
+        except VMHalt:
+            self.halted = True
+            return True
+        finally:
+            self.cycles += cycles
+
+    def call_native(self, function) -> None:
+        """Runs a Jack OS subroutine natively, on the frame the call
+        sequence just built, and pushes its value for the stub's return.
+        """
+        ram = self.ram
+        arguments = ram[2]
+        n_args = ram[1] - 5 - arguments
+        value = function(*ram[arguments:arguments + n_args])
+        ram[ram[0]] = value or 0
+        ram[0] += 1
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(prog="HackCPU")
+    parser.add_argument("input_path")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help="stop after about this many cycles")
+    parser.add_argument("--keys", type=int, nargs="*", default=[],
+                        help="the keys Keyboard.keyPressed returns")
+    parser.add_argument("--input", default="",
+                        help="the text typed into the Keyboard read "
+                             "functions")
+    args = parser.parse_args()
+    try:
+        with open(args.input_path, 'r') as asm_file:
+            cpu = HackCPU(asm_file, args.keys,
+                          args.input.replace("\\n", "\n"))
+    except AssemblyError as error:
+        print("HackCPU: {}".format(error), file=sys.stderr)
+        sys.exit(1)
+    try:
+        halted = cpu.run(args.limit)
+    except VMError as error:
+        print(cpu.os.output_text())
+        print("HackCPU: {}".format(error), file=sys.stderr)
+        sys.exit(1)
+    print(cpu.os.output_text())
+    print("{} after {} cycles, {} instructions of ROM".format(
+        "halted" if halted else "stopped", cpu.cycles, len(cpu.rom)))
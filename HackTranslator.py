@@ -0,0 +1,389 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Translates the VM code of a whole program into Hack assembly, so a build
+needs no separate VM translator. The naive translation expands every
+command on its own, like the translator of the course; the optimized one
+shares a single call and a single return sequence between all functions,
+specializes the accesses to small constant indices, and fuses comparisons
+with the conditional jumps that use them.
+"""
+import argparse
+import os
+import typing
+from VMEmulator import read_vm_files
+
+# the Hack registers of the VM
+SEGMENT_POINTERS = {"local": "LCL", "argument": "ARG", "this": "THIS",
+                    "that": "THAT"}
+TEMP_BASE = 5
+STACK_BASE = 256
+# the labels of the shared sequences; Jack names cannot contain "$"
+CALL_LABEL = "$CALL"
+RETURN_LABEL = "$RETURN"
+HALT_LABEL = "$HALT"
+# the label the HackCPU stops at to run a Jack OS subroutine natively
+NATIVE_PREFIX = "$native$"
+BINARY = {"add": "M=D+M", "sub": "M=M-D", "and": "M=D&M", "or": "M=D|M"}
+UNARY = {"neg": "M=-M", "not": "M=!M"}
+# the jump taken when a comparison of x and y holds, on D = x - y
+COMPARISONS = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+NEGATED_JUMPS = {"JEQ": "JNE", "JGT": "JLE", "JLT": "JGE"}
+# the largest indices accessed by stepping the address one word at a time
+MAX_STEPPED_PUSH = 3
+MAX_STEPPED_POP = 6
+# the constants a single computation can write
+COMPUTED_CONSTANTS = {0: "0", 1: "1"}
+PUSH_D = ["@SP", "AM=M+1", "A=A-1", "M=D"]
+NAIVE_PUSH_D = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
+POP_D = ["@SP", "AM=M-1", "D=M"]
+
+
+class HackTranslator:
+    """Translates the .vm files of a program into a single Hack assembly
+    program, which starts by calling Sys.init, or Main.main if the program
+    has no Sys.init, and stops at the $HALT loop once it returns. The Jack
+    OS subroutines the program calls but does not define become stubs that
+    the HackCPU runs natively.
+    """
+
+    def __init__(self, optimize: bool = True) -> None:
+        """Creates a new translator.
+
+        Args:
+            optimize (bool): use the shared call and return sequences and
+            the specialized commands, instead of the naive expansions.
+        """
+        self.optimize = optimize
+        self.file_name = ""
+        self.function_name = ""
+        self.return_count = 0
+
+    def translate(self, files: dict) -> typing.List[str]:
+        """
+        Args:
+            files (dict): the lines of every .vm file, by file name.
+
+        Returns:
+            typing.List[str]: the lines of the assembly program.
+        """
+        commands = []  # (file name, command) pairs
+        defined = set()
+        called = set()
+        for file_name, lines in files.items():
+            for line in lines:
+                command = line.split("//")[0].split()
+                if not command:
+                    continue
+                if command[0] == "function":
+                    defined.add(command[1])
+                elif command[0] == "call":
+                    called.add(command[1])
+                commands.append((os.path.splitext(file_name)[0], command))
+        entry = "Sys.init" if "Sys.init" in defined else "Main.main"
+        self.file_name, self.function_name = "", "$bootstrap"
+        asm = ["@" + str(STACK_BASE), "D=A", "@SP", "M=D"]
+        asm += self.call(entry, 0)
+        asm += ["(" + HALT_LABEL + ")", "@" + HALT_LABEL, "0;JMP"]
+        if self.optimize:
+            asm += self.shared_call() + self.shared_return()
+        for name in sorted(called - defined):
+            asm += ["(" + name + ")", "(" + NATIVE_PREFIX + name + ")"]
+            asm += self.return_()
+        index = 0
+        while index < len(commands):
+            self.file_name, command = commands[index]
+            following = [next_command for _, next_command
+                         in commands[index + 1:index + 5]]
+            lines, used = self.translate_command(command, following)
+            asm += lines
+            index += used
+        return [line + "\n" for line in asm]
+
+    def translate_command(self, command: list,
+                          following: list) -> typing.Tuple[list, int]:
+        """Translates a command, and with the optimizations, the commands
+        following it that it can be fused with.
+
+        Args:
+            command (list): the words of the command.
+            following (list): the words of the next four commands, if
+            any.
+
+        Returns:
+            typing.Tuple[list, int]: the assembly lines, and the number of
+            commands they implement.
+        """
+        operation = command[0]
+        if operation == "push":
+            return self.push(command[1], int(command[2]), following)
+        if operation == "pop":
+            return self.pop(command[1], int(command[2])), 1
+        if operation in BINARY:
+            return POP_D + ["A=A-1", BINARY[operation]], 1
+        if operation in COMPARISONS:
+            return self.compare(operation, following)
+        if operation in UNARY:
+            if self.optimize and operation == "not" and following and \
+                    following[0][0] == "if-goto":
+                # jumps unless the value is -1, whose negation alone is 0
+                return POP_D + ["D=D+1", "@" + self.label(following[0][1]),
+                                "D;JNE"], 2
+            return ["@SP", "A=M-1", UNARY[operation]], 1
+        if operation == "label":
+            return ["(" + self.label(command[1]) + ")"], 1
+        if operation == "goto":
+            return ["@" + self.label(command[1]), "0;JMP"], 1
+        if operation == "if-goto":
+            return POP_D + ["@" + self.label(command[1]), "D;JNE"], 1
+        if operation == "function":
+            self.function_name = command[1]
+            return ["(" + command[1] + ")"] + \
+                self.allocate_locals(int(command[2])), 1
+        if operation == "call":
+            return self.call(command[1], int(command[2])), 1
+        if operation == "return":
+            return self.return_(), 1
+        raise ValueError("unknown command " + " ".join(command))
+
+    def label(self, label: str) -> str:
+        """
+        Returns:
+            str: the assembly label of a VM label of the current function.
+        """
+        return self.function_name + "$" + label
+
+    def push(self, segment: str, index: int,
+             following: list) -> typing.Tuple[list, int]:
+        """Translates a push. With the optimizations, a push followed by a
+        pop, a binary operation or a comparison branching on its result
+        hands its value over in D instead of through the stack.
+        """
+        if not self.optimize:
+            return self.load_d(segment, index) + NAIVE_PUSH_D, 1
+        operation = following[0][0] if following else None
+        if operation == "pop":
+            store = self.store_d(following[0][1], int(following[0][2]))
+            if store is not None:
+                return self.load_d(segment, index) + store, 2
+        if operation in BINARY:
+            return self.load_d(segment, index) + [
+                "@SP", "A=M-1", BINARY[operation]], 2
+        if operation in COMPARISONS:
+            branch = self.fused_branch(operation, following[1:])
+            if branch is not None:
+                jump, label, used = branch
+                return self.load_d(segment, index) + [
+                    "@SP", "AM=M-1", "D=M-D", "@" + label,
+                    "D;" + jump], 2 + used
+        if segment == "constant" and index in COMPUTED_CONSTANTS:
+            return ["@SP", "AM=M+1", "A=A-1",
+                    "M=" + COMPUTED_CONSTANTS[index]], 1
+        return self.load_d(segment, index) + PUSH_D, 1
+
+    def load_d(self, segment: str, index: int) -> list:
+        """
+        Returns:
+            list: the assembly loading the value at a segment index into D.
+        """
+        if segment == "constant":
+            if self.optimize and index in COMPUTED_CONSTANTS:
+                return ["D=" + COMPUTED_CONSTANTS[index]]
+            return ["@" + str(index), "D=A"]
+        if segment in SEGMENT_POINTERS:
+            pointer = "@" + SEGMENT_POINTERS[segment]
+            if self.optimize and index <= MAX_STEPPED_PUSH:
+                steps = ["A=M"] if index == 0 else \
+                    ["A=M+1"] + ["A=A+1"] * (index - 1)
+                return [pointer] + steps + ["D=M"]
+            return ["@" + str(index), "D=A", pointer, "A=D+M", "D=M"]
+        return ["@" + self.address(segment, index), "D=M"]
+
+    def store_d(self, segment: str, index: int) -> typing.Optional[list]:
+        """
+        Returns:
+            typing.Optional[list]: the assembly storing D at a segment index,
+            or None if the address of the index cannot be computed without
+            overwriting D.
+        """
+        if segment in SEGMENT_POINTERS:
+            if not self.optimize or index > MAX_STEPPED_POP:
+                return None
+            return ["@" + SEGMENT_POINTERS[segment], "A=M"] + \
+                ["A=A+1"] * index + ["M=D"]
+        return ["@" + self.address(segment, index), "M=D"]
+
+    def pop(self, segment: str, index: int) -> list:
+        """
+        Returns:
+            list: the assembly of a pop command.
+        """
+        store = self.store_d(segment, index)
+        if store is not None:
+            return POP_D + store
+        return ["@" + str(index), "D=A", "@" + SEGMENT_POINTERS[segment],
+                "D=D+M", "@R13", "M=D"] + POP_D + ["@R13", "A=M", "M=D"]
+
+    def address(self, segment: str, index: int) -> str:
+        """
+        Returns:
+            str: the symbol or the address of a static, temp or pointer
+            variable.
+        """
+        if segment == "static":
+            return "{}.{}".format(self.file_name, index)
+        if segment == "temp":
+            return str(TEMP_BASE + index)
+        if segment == "pointer":
+            return "THAT" if index else "THIS"
+        raise ValueError("unknown segment " + segment)
+
+    def fused_branch(self, operation: str, following: list
+                     ) -> typing.Optional[typing.Tuple[str, str, int]]:
+        """
+        Args:
+            operation (str): a comparison.
+            following (list): the words of the commands after it.
+
+        Returns:
+            typing.Optional[typing.Tuple[str, str, int]]: if the comparison
+            is followed by an if-goto, possibly through a not, the jump
+            taken on the difference of its operands, the label it jumps to,
+            and the number of commands after the comparison it replaces.
+            An if-goto over a goto, as the peephole optimizer swaps the
+            branches of ifs and whiles, jumps to the goto's label instead.
+        """
+        if len(following) > 2 and following[0][0] == "if-goto" and \
+                following[1][0] == "goto" and \
+                following[2] == ["label", following[0][1]]:
+            return NEGATED_JUMPS[COMPARISONS[operation]], \
+                self.label(following[1][1]), 2
+        negated = int(following[:1] == [["not"]])
+        if len(following) <= negated or following[negated][0] != "if-goto":
+            return None
+        jump = COMPARISONS[operation]
+        if negated:
+            jump = NEGATED_JUMPS[jump]
+        return jump, self.label(following[negated][1]), negated + 1
+
+    def compare(self, operation: str,
+                following: list) -> typing.Tuple[list, int]:
+        """Translates a comparison. With the optimizations, a comparison
+        followed by an if-goto, possibly through a not, jumps on the
+        difference of its operands directly instead of pushing a boolean.
+        """
+        branch = self.fused_branch(operation, following) \
+            if self.optimize else None
+        if branch is not None:
+            jump, label, used = branch
+            return POP_D + ["@SP", "AM=M-1", "D=M-D", "@" + label,
+                            "D;" + jump], used + 1
+        self.return_count += 1
+        end = "{}$COMPARE.{}".format(self.function_name, self.return_count)
+        return POP_D + ["A=A-1", "D=M-D", "M=-1", "@" + end,
+                        "D;" + COMPARISONS[operation], "@SP", "A=M-1", "M=0",
+                        "(" + end + ")"], 1
+
+    def allocate_locals(self, n_locals: int) -> list:
+        """
+        Returns:
+            list: the assembly pushing the zeros of a function's locals.
+        """
+        if not self.optimize:
+            return ["@SP", "A=M", "M=0", "@SP", "M=M+1"] * n_locals
+        if n_locals == 0:
+            return []
+        return ["@SP", "A=M", "M=0"] + ["A=A+1", "M=0"] * (n_locals - 1) + \
+            ["D=A+1", "@SP", "M=D"]
+
+    def call(self, function_name: str, n_args: int) -> list:
+        """
+        Returns:
+            list: the assembly of a call command.
+        """
+        self.return_count += 1
+        return_label = "{}$ret.{}".format(self.function_name,
+                                          self.return_count)
+        if self.optimize:
+            return ["@" + str(n_args), "D=A", "@R13", "M=D",
+                    "@" + function_name, "D=A", "@R14", "M=D",
+                    "@" + return_label, "D=A", "@" + CALL_LABEL, "0;JMP",
+                    "(" + return_label + ")"]
+        asm = ["@" + return_label, "D=A"] + NAIVE_PUSH_D
+        for pointer in ("LCL", "ARG", "THIS", "THAT"):
+            asm += ["@" + pointer, "D=M"] + NAIVE_PUSH_D
+        return asm + ["@SP", "D=M", "@" + str(n_args + 5), "D=D-A", "@ARG",
+                      "M=D", "@SP", "D=M", "@LCL", "M=D",
+                      "@" + function_name, "0;JMP",
+                      "(" + return_label + ")"]
+
+    def return_(self) -> list:
+        """
+        Returns:
+            list: the assembly of a return command.
+        """
+        if self.optimize:
+            return ["@" + RETURN_LABEL, "0;JMP"]
+        asm = ["@LCL", "D=M", "@R13", "M=D", "@5", "A=D-A", "D=M", "@R14",
+               "M=D"] + POP_D + ["@ARG", "A=M", "M=D", "@ARG", "D=M+1",
+                                 "@SP", "M=D"]
+        for pointer in ("THAT", "THIS", "ARG", "LCL"):
+            asm += ["@R13", "AM=M-1", "D=M", "@" + pointer, "M=D"]
+        return asm + ["@R14", "A=M", "0;JMP"]
+
+    @staticmethod
+    def shared_call() -> list:
+        """
+        Returns:
+            list: the call sequence every call jumps to, with the return
+            address in D, the number of arguments in R13 and the address of
+            the function in R14.
+        """
+        asm = ["(" + CALL_LABEL + ")", "@SP", "A=M", "M=D"]
+        for pointer in ("LCL", "ARG", "THIS", "THAT"):
+            asm += ["@" + pointer, "D=M", "@SP", "AM=M+1", "M=D"]
+        return asm + ["@SP", "MD=M+1", "@LCL", "M=D", "@5", "D=D-A", "@R13",
+                      "D=D-M", "@ARG", "M=D", "@R14", "A=M", "0;JMP"]
+
+    @staticmethod
+    def shared_return() -> list:
+        """
+        Returns:
+            list: the return sequence every return jumps to.
+        """
+        asm = ["(" + RETURN_LABEL + ")", "@5", "D=A", "@LCL", "A=M-D", "D=M",
+               "@R14", "M=D"] + POP_D + ["@ARG", "A=M", "M=D", "D=A+1",
+                                         "@SP", "M=D"]
+        for pointer in ("THAT", "THIS", "ARG"):
+            asm += ["@LCL", "AM=M-1", "D=M", "@" + pointer, "M=D"]
+        return asm + ["@LCL", "A=M-1", "D=M", "@LCL", "M=D", "@R14", "A=M",
+                      "0;JMP"]
+
+
+def asm_path_of(argument_path: str) -> str:
+    """
+    Returns:
+        str: the path of the .asm file translated from a .vm or .jack file,
+        or from a directory, which is named after it.
+    """
+    if os.path.isdir(argument_path):
+        return os.path.join(argument_path,
+                            os.path.basename(argument_path) + ".asm")
+    return os.path.splitext(argument_path)[0] + ".asm"
+
+
+if "__main__" == __name__:
+    # Translates a .vm file, or a directory of them, into a single .asm file.
+    parser = argparse.ArgumentParser(prog="HackTranslator")
+    parser.add_argument("input_path")
+    parser.add_argument("--naive", action="store_true",
+                        help="expand every command on its own")
+    args = parser.parse_args()
+    argument_path = os.path.abspath(args.input_path)
+    asm_lines = HackTranslator(not args.naive).translate(
+        read_vm_files(argument_path))
+    with open(asm_path_of(argument_path), 'w') as asm_file:
+        asm_file.write("".join(asm_lines))
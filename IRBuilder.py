@@ -0,0 +1,246 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+from CompilationEngine import CLOSE_BRACKET, CONSTRUCTOR, FIELD, FUNCTION, \
+    METHOD, OP, OPEN_BRACKET, STATEMENTS, STATIC, UNARY_OP
+from JackIR import *
+
+
+class IRBuilder:
+    """Gets input from a JackTokenizer and builds the typed intermediate
+    representation of its class, consuming the tokens exactly like the
+    CompilationEngine does. Equal constants and plain variables of a class
+    share a single node, so nodes must not be modified after they are built.
+    """
+
+    def __init__(self, jack_tokenizer) -> None:
+        """
+        Creates a new builder with the given input. The next routine called
+        must be build_class()
+        :param jack_tokenizer: The tokenizer of the class.
+        """
+        self.tokenizer = jack_tokenizer
+        self.leaves = {}
+
+    def get_cur_token(self, advance=False):
+        cur_token = self.tokenizer.cur_token
+        if advance:
+            self.tokenizer.advance()
+        return cur_token
+
+    def build_class(self) -> ClassNode:
+        """Builds a complete class."""
+        self.tokenizer.advance()  # "class" # skip
+        class_name = self.get_cur_token(True)
+        self.tokenizer.advance()  # { # skip
+        class_vars = []
+        while self.get_cur_token() in {FIELD, STATIC}:
+            class_vars += self.build_class_var_dec()
+        subroutines = []
+        while self.get_cur_token() in {CONSTRUCTOR, METHOD, FUNCTION}:
+            subroutines.append(self.build_subroutine())
+        self.tokenizer.advance()  # } # skip
+        return ClassNode(class_name, tuple(class_vars), tuple(subroutines))
+
+    def build_class_var_dec(self) -> list:
+        """Builds a static declaration or a field declaration."""
+        field_kind = self.get_cur_token(True)  # kind
+        field_type = self.get_cur_token(True)  # type
+        class_vars = [(field_kind, field_type, self.get_cur_token(True))]
+        while self.get_cur_token() != ';':
+            self.tokenizer.advance()  # , sym skip
+            class_vars.append(
+                (field_kind, field_type, self.get_cur_token(True)))
+        self.tokenizer.advance()  # ;
+        return class_vars
+
+    def build_subroutine(self) -> SubroutineNode:
+        """Builds a complete method, function, or constructor."""
+        function_type = self.get_cur_token(True)
+        return_type = self.get_cur_token(True)
+        function_name = self.get_cur_token(True)
+        self.tokenizer.advance()  # ( # skip
+        parameters = self.build_parameter_list()
+        self.tokenizer.advance()  # ) # skip
+        self.tokenizer.advance()  # { # skip
+        local_vars = []
+        while self.get_cur_token() == "var":
+            local_vars += self.build_var_dec()
+        statements = self.build_statements()
+        self.tokenizer.advance()  # } skip
+        return SubroutineNode(function_type, return_type, function_name,
+                              parameters, tuple(local_vars), statements)
+
+    def build_parameter_list(self) -> tuple:
+        """Builds a (possibly empty) parameter list, not including the
+        enclosing "()".
+        """
+        parameters = []
+        if self.get_cur_token() != CLOSE_BRACKET:
+            param_type = self.get_cur_token(True)  # type
+            parameters.append((param_type, self.get_cur_token(True)))
+            while self.get_cur_token() == ',':
+                self.tokenizer.advance()  # ,
+                param_type = self.get_cur_token(True)  # type
+                parameters.append((param_type, self.get_cur_token(True)))
+        return tuple(parameters)
+
+    def build_var_dec(self) -> list:
+        """Builds a var declaration."""
+        self.tokenizer.advance()  # always var
+        var_type = self.get_cur_token(True)  # type
+        local_vars = [(var_type, self.get_cur_token(True))]
+        while self.get_cur_token() != ';':
+            self.tokenizer.advance()  # , sym skip
+            local_vars.append((var_type, self.get_cur_token(True)))
+        self.tokenizer.advance()  # ;
+        return local_vars
+
+    def build_statements(self) -> tuple:
+        """Builds a sequence of statements, not including the enclosing
+        "{}".
+        """
+        statements = []
+        while self.get_cur_token() in STATEMENTS:
+            if self.get_cur_token() == "let":
+                statements.append(self.build_let())
+            elif self.get_cur_token() == "if":
+                statements.append(self.build_if())
+            elif self.get_cur_token() == "while":
+                statements.append(self.build_while())
+            elif self.get_cur_token() == "do":
+                statements.append(self.build_do())
+            elif self.get_cur_token() == "return":
+                statements.append(self.build_return())
+        return tuple(statements)
+
+    def build_let(self) -> LetNode:
+        """Builds a let statement."""
+        self.tokenizer.advance()  # (LET)
+        var_name = self.get_cur_token(True)  # varName
+        index = None
+        if self.get_cur_token() == "[":  # arrays
+            self.tokenizer.advance()  # "["
+            index = self.build_expression()
+            self.tokenizer.advance()  # "]"
+        self.tokenizer.advance()  # skip (=)
+        value = self.build_expression()
+        self.tokenizer.advance()  # skip (;)
+        return LetNode(var_name, index, value)
+
+    def build_if(self) -> IfNode:
+        """Builds an if statement, possibly with a trailing else clause."""
+        self.tokenizer.advance()  # if
+        self.tokenizer.advance()  # (
+        condition = self.build_expression()
+        self.tokenizer.advance()  # )
+        self.tokenizer.advance()  # {
+        statements = self.build_statements()
+        self.tokenizer.advance()  # }
+        else_statements = None
+        if self.get_cur_token() == "else":
+            self.tokenizer.advance()  # "else"
+            self.tokenizer.advance()  # {
+            else_statements = self.build_statements()
+            self.tokenizer.advance()  # }
+        return IfNode(condition, statements, else_statements)
+
+    def build_while(self) -> WhileNode:
+        """Builds a while statement."""
+        self.tokenizer.advance()  # "while"
+        self.tokenizer.advance()  # (
+        condition = self.build_expression()
+        self.tokenizer.advance()  # )
+        self.tokenizer.advance()  # {
+        statements = self.build_statements()
+        self.tokenizer.advance()  # }
+        return WhileNode(condition, statements)
+
+    def build_do(self) -> DoNode:
+        """Builds a do statement."""
+        self.tokenizer.advance()  # do
+        call = self.build_subroutine_call()
+        self.tokenizer.advance()  # ;
+        return DoNode(call)
+
+    def build_return(self) -> ReturnNode:
+        """Builds a return statement."""
+        self.tokenizer.advance()  # "return"
+        value = None
+        if self.get_cur_token() != ';':  # not void
+            value = self.build_expression()
+        self.tokenizer.advance()  # ;
+        return ReturnNode(value)
+
+    def build_subroutine_call(self, curr_name=None) -> CallNode:
+        """
+        Builds a subroutine call, curr_name is the first name of the call
+        if it was already consumed by build_term.
+        """
+        receiver = None
+        func_name = curr_name or self.get_cur_token(True)
+        if self.get_cur_token() == ".":
+            self.tokenizer.advance()  # .
+            receiver = func_name
+            func_name = self.get_cur_token(True)  # subroutineName
+        self.tokenizer.advance()  # skip (
+        arguments = self.build_expression_list()
+        self.tokenizer.advance()  # skip )
+        return CallNode(receiver, func_name, arguments)
+
+    def build_expression(self):
+        """Builds an expression."""
+        expression = self.build_term()
+        while self.get_cur_token() in OP:
+            operator = self.get_cur_token(True)
+            expression = BinaryNode(operator, expression, self.build_term())
+        return expression
+
+    def build_term(self):
+        """Builds a term, using the token after an identifier to tell a
+        variable, an array entry and a subroutine call apart.
+        """
+        token_type = self.tokenizer.token_type()
+        if token_type in {"INT_CONST", "KEYWORD", "STR_CONST"}:
+            value = self.get_cur_token(True)
+            if token_type == "STR_CONST":
+                value = value[1:-1]
+            leaf = self.leaves.get((token_type, value))
+            if leaf is None:
+                leaf = self.leaves[token_type, value] = ConstantNode(
+                    token_type, value)
+            return leaf
+        elif token_type == "IDENTIFIER":
+            name = self.get_cur_token(True)
+            if self.get_cur_token() in {".", OPEN_BRACKET}:
+                return self.build_subroutine_call(name)
+            elif self.get_cur_token() == "[":
+                self.tokenizer.advance()  # "["
+                index = self.build_expression()
+                self.tokenizer.advance()  # "]"
+                return VariableNode(name, index)
+            leaf = self.leaves.get(name)
+            if leaf is None:
+                leaf = self.leaves[name] = VariableNode(name)
+            return leaf
+        elif self.get_cur_token() == OPEN_BRACKET:
+            self.tokenizer.advance()  # (
+            expression = self.build_expression()
+            self.tokenizer.advance()  # )
+            return expression
+        elif self.get_cur_token() in UNARY_OP:
+            operator = self.get_cur_token(True)
+            return UnaryNode(operator, self.build_term())
+
+    def build_expression_list(self) -> tuple:
+        """Builds a (possibly empty) comma-separated list of expressions."""
+        expressions = []
+        if self.get_cur_token() != CLOSE_BRACKET:
+            expressions.append(self.build_expression())
+            while self.get_cur_token() == ',':
+                self.tokenizer.advance()  # ,
+                expressions.append(self.build_expression())
+        return tuple(expressions)
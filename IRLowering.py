@@ -0,0 +1,276 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+from CompilationEngine import *
+from JackIR import *
+from LoopOptimizer import LoopOptimizer, expression_key, key_names, \
+    key_reads_memory, statement_expressions, walk_expression, \
+    walk_statements
+
+
+class IRLowering(CompilationEngine):
+    """Emits the VM code of a class from its intermediate representation.
+    The code is the same the CompilationEngine emits while parsing, as both
+    share the symbol table, the VMWriter and its optimizers, and the label
+    numbering. With -O, the whole tree allows two more optimizations: the
+    LoopOptimizer hoists the invariant values out of loops, and the address
+    of the last array element accessed is kept in "pointer 1" for as long
+    as it stays valid, so accessing the element again only takes "that 0".
+    """
+
+    def __init__(self, output_stream, options=None) -> None:
+        """
+        Creates a new lowering step writing to the given output.
+        :param output_stream: The output stream.
+        :param options: The CompileOptions to compile with.
+        """
+        super().__init__(None, output_stream, options)
+        self.loop_optimizer = LoopOptimizer()
+        # the expression_key of the element "pointer 1" points to, if known
+        self.that_element = None
+        self.that_reused = 0
+        self.statement_lowerings = {
+            LetNode: self.lower_let, IfNode: self.lower_if,
+            WhileNode: self.lower_while, DoNode: self.lower_do,
+            ReturnNode: self.lower_return}
+        self.expression_lowerings = {
+            ConstantNode: self.lower_constant,
+            VariableNode: self.lower_variable, CallNode: self.lower_call,
+            BinaryNode: self.lower_binary, UnaryNode: self.lower_unary}
+
+    def lower_class(self, class_node: ClassNode) -> None:
+        """Emits a complete class."""
+        self.class_name = class_node.name
+        if self.options.optimize:
+            class_node = self.loop_optimizer.optimize_class(class_node)
+        if self.options.pool_strings:
+            self.repeated_strings = repeated_strings(
+                '"' + node.value + '"'
+                for subroutine in class_node.subroutines
+                for statement in walk_statements(subroutine.statements)
+                for expression in statement_expressions(statement)
+                for node in walk_expression(expression)
+                if type(node) is ConstantNode and node.kind == "STR_CONST")
+        for kind, var_type, name in class_node.class_vars:
+            self.symbol_table.define(name, var_type, kind)
+        for subroutine in class_node.subroutines:
+            self.lower_subroutine(subroutine)
+        if self.string_pool:
+            self.compile_string_pool()
+        self.writer.flush()
+
+    def lower_subroutine(self, subroutine: SubroutineNode) -> None:
+        """Emits a complete method, function, or constructor."""
+        self.symbol_table.start_subroutine()
+        self.label_counter = 0
+        self.subroutine_kind = subroutine.kind
+        if subroutine.kind == METHOD:
+            self.symbol_table.define("this", self.class_name, ARG)
+        for param_type, param_name in subroutine.parameters:
+            self.symbol_table.define(param_name, param_type, ARG)
+        for var_type, var_name in subroutine.local_vars:
+            self.symbol_table.define(var_name, var_type, VAR)
+        self.function_name = self.class_name + "." + subroutine.name
+        self.writer.write_function(self.function_name,
+                                   self.symbol_table.count_var)
+        if subroutine.kind == CONSTRUCTOR:
+            self.alloc_constructor()
+        elif subroutine.kind == METHOD:
+            self.alloc_method()
+        self.that_element = None
+        self.lower_statements(subroutine.statements)
+
+    def lower_statements(self, statements: tuple) -> None:
+        """Emits a sequence of statements."""
+        for statement in statements:
+            self.statement_lowerings[type(statement)](statement)
+
+    def lower_let(self, statement: LetNode) -> None:
+        """Emits a let statement."""
+        segment, ind = self.get_var_from_table(statement.name)
+        if statement.index is not None and self.options.optimize:
+            self.lower_element_store(statement)
+        elif statement.index is not None:  # arrays
+            self.lower_expression(statement.index)
+            self.writer.write_push(segment, ind)
+            self.writer.write_arithmetic("add")
+            self.lower_expression(statement.value)
+            self.writer.write_pop("temp", 0)
+            self.writer.write_pop(POINTER, 1)
+            self.writer.write_push("temp", 0)
+            self.writer.write_pop("that", 0)
+        else:
+            self.lower_expression(statement.value)
+            self.writer.write_pop(segment, ind)
+            if self.that_element is not None and \
+                    statement.name in key_names(self.that_element):
+                self.that_element = None
+
+    def lower_element_store(self, statement: LetNode) -> None:
+        """Emits the assignment of an array element, with -O. A value that
+        calls nothing is pushed before the address of the element is
+        computed, and needs no detour through temp 0; an element whose
+        address is already in "pointer 1" needs no address at all.
+        """
+        element = VariableNode(statement.name, statement.index)
+        key = expression_key(element)
+        if key is not None and expression_key(statement.value) is not None:
+            self.lower_expression(statement.value)
+            if self.that_element == key:
+                self.that_reused += 1
+            else:
+                self.lower_element_address(element)
+        else:
+            segment, ind = self.get_var_from_table(statement.name)
+            self.lower_expression(statement.index)
+            self.writer.write_push(segment, ind)
+            self.writer.write_arithmetic("add")
+            self.lower_expression(statement.value)
+            self.writer.write_pop("temp", 0)
+            self.writer.write_pop(POINTER, 1)
+            self.writer.write_push("temp", 0)
+            # the value may have called a subroutine, which can only have
+            # changed the address if it reads more than locals and arguments
+            if key is not None and not key_reads_memory(key[2]) and all(
+                    self.symbol_table.kind_of(name) in {VAR, ARG}
+                    for name in key_names(key)):
+                self.that_element = key
+            else:
+                self.that_element = None
+        self.writer.write_pop("that", 0)
+        if key is not None and key_reads_memory(key[2]):
+            self.that_element = None  # the store may have changed the index
+
+    def lower_element_address(self, element: VariableNode) -> None:
+        """Points "pointer 1" to an array element."""
+        self.lower_expression(element.index)
+        segment, ind = self.get_var_from_table(element.name)
+        self.writer.write_push(segment, ind)
+        self.writer.write_arithmetic("add")
+        self.writer.write_pop("pointer", 1)
+        self.that_element = expression_key(element)
+
+    def lower_if(self, statement: IfNode) -> None:
+        """Emits an if statement, possibly with a trailing else clause."""
+        self.label_counter += 1
+        self.that_element = None
+        self.lower_expression(statement.condition)
+        self.writer.write_arithmetic("not")
+        false_label = "IF_FALSE" + str(self.label_counter)
+        end_label = "IF_END" + str(self.label_counter)
+        self.writer.write_if(false_label)  # go to else block
+        self.lower_statements(statement.statements)
+        self.writer.write_goto(end_label)  # end true block
+        self.writer.write_label(false_label)
+        self.that_element = None
+        if statement.else_statements is not None:
+            self.lower_statements(statement.else_statements)
+        self.writer.write_label(end_label)
+        self.that_element = None
+
+    def lower_while(self, statement: WhileNode) -> None:
+        """Emits a while statement."""
+        label_loop = WHILE_START_LABEL + str(self.label_counter)
+        label_break = WHILE_END_LABEL + str(self.label_counter)
+        self.label_counter += 1
+        self.writer.write_label(label_loop)
+        self.that_element = None
+        self.loop_depth += 1
+        self.lower_expression(statement.condition)
+        self.writer.write_arithmetic("not")
+        self.writer.write_if(label_break)
+        self.lower_statements(statement.statements)
+        self.loop_depth -= 1
+        self.writer.write_goto(label_loop)
+        self.writer.write_label(label_break)
+        self.that_element = None
+
+    def lower_do(self, statement: DoNode) -> None:
+        """Emits a do statement."""
+        self.lower_call(statement.call)
+        self.writer.write_pop("temp", 0)
+
+    def lower_return(self, statement: ReturnNode) -> None:
+        """Emits a return statement."""
+        if statement.value is not None:
+            self.lower_expression(statement.value)
+        else:
+            self.writer.write_push("constant", 0)
+        self.write_return()
+
+    def lower_expression(self, expression) -> None:
+        """Emits an expression."""
+        self.expression_lowerings[type(expression)](expression)
+
+    def lower_constant(self, constant: ConstantNode) -> None:
+        """Emits an integer, string or keyword constant."""
+        if constant.kind == "INT_CONST":
+            self.writer.write_push("constant", constant.value)
+        elif constant.kind == "STR_CONST":
+            self.that_element = None
+            string = '"' + constant.value + '"'
+            if self.pools_string(string):
+                self.compile_pooled_string(string)
+            else:
+                self.writer.write_string(string)
+        else:
+            self.writer.write_constant(constant.value)
+
+    def lower_variable(self, variable: VariableNode) -> None:
+        """Emits a variable or an array entry."""
+        if variable.index is not None and self.options.optimize:
+            key = expression_key(variable)
+            if key is not None and key == self.that_element:
+                self.that_reused += 1
+            else:
+                self.lower_element_address(variable)
+            self.writer.write_push("that", 0)
+        elif variable.index is not None:
+            self.lower_expression(variable.index)
+            segment, ind = self.get_var_from_table(variable.name)
+            self.writer.write_push(segment, ind)
+            self.writer.write_arithmetic("add")
+            self.writer.write_pop("pointer", 1)
+            self.writer.write_push("that", 0)
+        else:
+            segment, ind = self.get_var_from_table(variable.name)
+            self.writer.write_push(segment, ind)
+
+    def lower_call(self, call: CallNode) -> None:
+        """Emits a subroutine call."""
+        method_args = 0
+        if call.receiver is None:
+            func_name = self.class_name + "." + call.name
+            if self.calls_method(func_name):
+                self.writer.write_push(POINTER, 0)  # push this as first arg
+                method_args += 1
+        elif self.symbol_table.does_exist(call.receiver):  # b.foo()
+            segment, ind = self.get_var_from_table(call.receiver)
+            self.writer.write_push(segment, ind)  # push object as first arg
+            func_name = self.symbol_table.type_of(call.receiver) + "." + \
+                call.name
+            method_args += 1
+        else:
+            func_name = call.receiver + "." + call.name
+        for argument in call.arguments:
+            self.lower_expression(argument)
+        self.check_call(func_name, len(call.arguments) + method_args,
+                        method_args)
+        self.writer.write_call(func_name, len(call.arguments) + method_args)
+        self.that_element = None
+
+    def lower_binary(self, expression: BinaryNode) -> None:
+        """Emits a binary operation."""
+        self.lower_expression(expression.left)
+        self.lower_expression(expression.right)
+        self.writer.write_arithmetic(OP[expression.operator])
+        if expression.operator in "*/":
+            self.that_element = None  # Math.multiply and Math.divide
+
+    def lower_unary(self, expression: UnaryNode) -> None:
+        """Emits a unary operation."""
+        self.lower_expression(expression.operand)
+        self.writer.write_arithmetic(UNARY_OP[expression.operator])
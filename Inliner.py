@@ -0,0 +1,179 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from DeadCodeEliminator import split_functions
+
+# subroutines with longer bodies are not inlined
+MAX_INLINE_LINES = 8
+# the temp registers holding the arguments of an inlined subroutine; temps
+# 0 to 2 are used by the CompilationEngine and the ExpressionOptimizer
+FIRST_ARGUMENT_TEMP = 3
+MAX_INLINE_ARGUMENTS = 5
+METHOD_PROLOGUE = ["push argument 0\n", "pop pointer 0\n"]
+RETURN = "return\n"
+# the commands an inlined body may contain besides pushes and pops
+ARITHMETIC = {"add\n", "sub\n", "neg\n", "eq\n", "gt\n", "lt\n", "and\n",
+              "or\n", "not\n"}
+DISCARD = "pop temp 0\n"
+PUSH_VOID = "push constant 0\n"
+
+
+class Inliner:
+    """Replaces the calls of a whole program to trivial subroutines, like
+    getters and setters, with their bodies. An inlined method accesses the
+    fields of its object through "that" instead of "this", so the caller's
+    "this" is kept, and the arguments are kept in temp registers instead of
+    the "argument" segment.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new inliner."""
+        self.inlined = {}
+
+    def counters(self, program_name) -> dict:
+        """
+        Returns:
+            dict: the number of calls inlined into the given file.
+        """
+        return {"inlined_calls": self.inlined.get(program_name, 0)}
+
+    def inline(self, programs: dict) -> dict:
+        """Inlines the calls to trivial subroutines in every file of a
+        program. The inlined subroutines are left in place; they can be
+        removed by the DeadCodeEliminator once they are no longer called.
+
+        Args:
+            programs (dict): the lines of every .vm file of the program, by
+            file name.
+
+        Returns:
+            dict: the lines of every file with the calls inlined.
+        """
+        bodies = {}
+        for name, lines in programs.items():
+            for function_name, block in split_functions(lines):
+                body = self.inlinable_body(block)
+                if body is not None:
+                    bodies[function_name] = name, body
+        inlined_programs = {}
+        for name, lines in programs.items():
+            inlined_lines = inlined_programs[name] = []
+            inlined_void = False
+            for line in lines:
+                if inlined_void and line == DISCARD:
+                    inlined_lines.pop()  # the result of a void subroutine
+                    inlined_void = False
+                    continue
+                inlined_void = False
+                if line.startswith("call "):
+                    _, function_name, n_args = line.split()
+                    body = self.callee_body(bodies, function_name,
+                                            int(n_args), name)
+                    if body is not None:
+                        inline_call(inlined_lines, body, int(n_args))
+                        self.inlined[name] = self.inlined.get(name, 0) + 1
+                        inlined_void = inlined_lines[-1:] == [PUSH_VOID]
+                        continue
+                inlined_lines.append(line)
+        return inlined_programs
+
+    @staticmethod
+    def callee_body(bodies: dict, function_name: str, n_args: int,
+                    caller_file: str) -> typing.Optional[list]:
+        """
+        Returns:
+            typing.Optional[list]: the body to inline for a call from the
+            given file, or None if the call cannot be inlined.
+        """
+        if function_name not in bodies or n_args > MAX_INLINE_ARGUMENTS:
+            return None
+        file_name, body = bodies[function_name]
+        if n_args <= max_argument(body):
+            return None  # reads an argument it was not given
+        # statics belong to the file that declares them
+        if file_name != caller_file and any(
+                " static " in line for line in body):
+            return None
+        return body
+
+    @staticmethod
+    def inlinable_body(block: typing.List[str]) -> typing.Optional[list]:
+        """Finds the body of a trivial subroutine: a single basic block of
+        pushes, pops and arithmetic, without locals, calls or array accesses.
+
+        Args:
+            block (typing.List[str]): the lines of a function.
+
+        Returns:
+            typing.Optional[list]: the lines between the function command,
+            or the method prologue, and the return, with the fields of a
+            method accessed through "that". None if it is not trivial.
+        """
+        if not block[0].endswith(" 0\n") or block[-1] != RETURN:
+            return None  # has locals, or does not end with its return
+        body = block[1:-1]
+        method = body[:2] == METHOD_PROLOGUE
+        if method:
+            body = body[2:]
+        if len(body) > MAX_INLINE_LINES:
+            return None
+        inlined_body = []
+        for line in body:
+            command = line.split()
+            if line in ARITHMETIC:
+                inlined_body.append(line)
+            elif command[0] not in {"push", "pop"}:
+                return None
+            elif command[1] == "this" and method:
+                inlined_body.append("{} that {}\n".format(command[0],
+                                                          command[2]))
+            elif command[1] in {"argument", "constant", "static"}:
+                inlined_body.append(line)
+            else:
+                return None
+        if method:
+            inlined_body[:0] = [METHOD_PROLOGUE[0], "pop pointer 1\n"]
+        if max_argument(inlined_body) >= MAX_INLINE_ARGUMENTS:
+            return None
+        return inlined_body
+
+
+def max_argument(body: typing.List[str]) -> int:
+    """
+    Returns:
+        int: the highest argument index the body reads or writes, or -1.
+    """
+    return max((int(line.split()[2]) for line in body
+                if line.startswith(("push argument ", "pop argument "))),
+               default=-1)
+
+
+def inline_call(lines: typing.List[str], body: typing.List[str],
+                n_args: int) -> None:
+    """Appends an inlined call to lines: the arguments on the stack are
+    popped into temp registers, and the body reads them from there.
+    """
+    temps = ["temp {}".format(FIRST_ARGUMENT_TEMP + index)
+             for index in range(n_args)]
+    inlined = ["pop {}\n".format(temp) for temp in reversed(temps)]
+    for line in body:
+        command = line.split()
+        if command[1:2] == ["argument"]:
+            line = "{} {}\n".format(command[0], temps[int(command[2])])
+        inlined.append(line)
+    # an argument popped and pushed right back, and never read again,
+    # can stay on the stack
+    index = 0
+    while index < len(inlined) - 1:
+        pop, push = inlined[index:index + 2]
+        if pop.startswith("pop temp ") and push == "push" + pop[3:] and \
+                inlined.count(push) == 1:
+            del inlined[index:index + 2]
+            index = max(index - 1, 0)
+        else:
+            index += 1
+    lines += inlined
@@ -7,18 +7,22 @@ Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 import os
 import sys
 import typing
+from BuildCache import TokenCache, token_cache_directory
 from CompilationEngine import CompilationEngine
 from JackTokenizer import JackTokenizer
 
 def analyze_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        token_cache: typing.Optional[TokenCache] = None) -> None:
     """Analyzes a single file.
 
     Args:
         input_file (typing.TextIO): the file to analyze.
         output_file (typing.TextIO): writes all output to this file.
+        token_cache (TokenCache): the cache of tokens shared with the
+        compiler, or None to tokenize the file from scratch.
     """
-    tokenizer = JackTokenizer(input_file)
+    tokenizer = JackTokenizer(input_file, token_cache=token_cache)
     compiler = CompilationEngine(tokenizer, output_file)
     compiler.compile_class()
 
@@ -37,6 +41,7 @@ if "__main__" == __name__:
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
+    token_cache = TokenCache(token_cache_directory())
     for input_path in files_to_assemble:
         filename, extension = os.path.splitext(input_path)
         if extension.lower() != ".jack":
@@ -44,4 +49,5 @@ if "__main__" == __name__:
         output_path = filename + ".xml"
         with open(input_path, 'r') as input_file, \
                 open(output_path, 'w') as output_file:
-            analyze_file(input_file, output_file)
+            analyze_file(input_file, output_file, token_cache)
+    token_cache.trim()
@@ -4,47 +4,676 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import concurrent.futures
+import functools
+import io
+import json
 import os
 import sys
+import time
 import typing
+from BuildCache import BuildCache, SubroutineCache, TokenCache, \
+    compiler_fingerprint, subroutine_cache_path, token_cache_directory
 from CompilationEngine import CompilationEngine
+from CompileOptions import CompileOptions
+from CompileStats import TimingTokenizer, file_stats, total_stats
+from DeadCodeEliminator import DeadCodeEliminator
+from HackTranslator import HackTranslator, asm_path_of
+from IRBuilder import IRBuilder
+from Inliner import Inliner
+from IRLowering import IRLowering
+from SignatureIndex import index_files
+from SourceMap import MAP_SUFFIX
 from JackTokenizer import JackTokenizer
 from SymbolTable import SymbolTable
 from VMWriter import VMWriter
 
+# seconds between two checks of the watched files for changes
+WATCH_INTERVAL = 0.05
+# classes compile_many sends to a process at a time
+BATCH_CHUNK_SIZE = 64
+
 
 def compile_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        options: typing.Optional[CompileOptions] = None,
+        subroutine_cache: typing.Optional[SubroutineCache] = None,
+        map_file: typing.Optional[typing.TextIO] = None,
+        token_cache: typing.Optional[TokenCache] = None) -> dict:
     """Compiles a single file.
 
     Args:
         input_file (typing.TextIO): the file to compile.
         output_file (typing.TextIO): writes all output to this file.
+        options (CompileOptions): the options to compile with.
+        subroutine_cache (SubroutineCache): the cache of the file's
+        subroutines, which is used unless the options rule it out.
+        map_file (typing.TextIO): writes the source map of the output to
+        this file, if the options keep source lines and the file is not
+        compiled through the IR.
+        token_cache (TokenCache): the cache of tokens, which is used unless
+        the options rule it out.
+
+    Returns:
+        dict: counters describing the compilation, by name.
     """
-    tokenizer = JackTokenizer(input_file)
-    compiler = CompilationEngine(tokenizer, output_file)
-    compiler.compile_class()
+    options = options or CompileOptions()
+    phase_times = {}
+    start = time.perf_counter()
+    if options.stats:
+        tokenizer = TimingTokenizer(phase_times, input_file, options.lazy)
+    else:
+        tokenizer = JackTokenizer(input_file, options.lazy, token_cache)
+    phase_times["tokenize"] = time.perf_counter() - start
+    tokens = None if options.lazy else len(tokenizer.all_tokens)
+    tokens_cached = tokenizer.cached
+    if options.ir:
+        start = time.perf_counter()
+        class_node = IRBuilder(tokenizer).build_class()
+        phase_times["parse"] = time.perf_counter() - start
+        del tokenizer  # the tokens are not needed past this point
+        compiler = IRLowering(output_file, options)
+        start = time.perf_counter()
+        compiler.lower_class(class_node)
+        phase_times["lower"] = time.perf_counter() - start
+    else:
+        if options.lazy or options.stats:
+            subroutine_cache = None
+        compiler = CompilationEngine(tokenizer, output_file, options,
+                                     subroutine_cache)
+        start = time.perf_counter()
+        compiler.compile_class()
+        phase_times["compile"] = time.perf_counter() - start
+    if map_file is not None and options.source_map and not options.ir:
+        map_file.write(compiler.writer.source_map(
+            os.path.basename(getattr(input_file, "name", ""))))
+    counters = {}
+    for optimizer in compiler.optimizers:
+        counters.update(optimizer.counters())
+    if options.optimize:
+        counters["tail_calls"] = compiler.tail_calls
+    if options.optimize and options.ir:
+        counters["invariants_hoisted"] = compiler.loop_optimizer.hoisted
+        counters["that_reused"] = compiler.that_reused
+    if not options.ir and subroutine_cache is not None:
+        counters["subroutines_reused"] = subroutine_cache.hits
+    counters["tokens_cached"] = tokens_cached
+    if options.stats:
+        counters["stats"] = file_stats(phase_times, tokens, compiler)
+    return counters
 
-if "__main__" == __name__:
-    # Parses the input path and calls compile_file on each input file.
-    # This opens both the input and the output files!
-    # Both are closed automatically when the code finishes running.
-    # If the output file does not exist, it is created automatically in the
-    # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: JackCompiler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+
+def open_subroutine_cache(input_path: str,
+                          options: typing.Optional[CompileOptions] = None
+                          ) -> typing.Optional[SubroutineCache]:
+    """
+    Returns:
+        typing.Optional[SubroutineCache]: the subroutine cache of the given
+        .jack file if the options compile incrementally, None otherwise.
+    """
+    if options is None or not options.incremental or options.ir or \
+            options.lazy or options.stats or options.source_map:
+        return None
+    return SubroutineCache(subroutine_cache_path(input_path),
+                           compiler_fingerprint(options.fingerprint()))
+
+
+def open_token_cache(options: typing.Optional[CompileOptions] = None
+                     ) -> typing.Optional[TokenCache]:
+    """
+    Returns:
+        typing.Optional[TokenCache]: the shared token cache if the options
+        compile incrementally, None otherwise.
+    """
+    if options is None or not options.incremental or options.lazy or \
+            options.stats:
+        return None
+    return TokenCache(token_cache_directory())
+
+
+def list_jack_files(argument_path: str) -> list:
+    """Lists the .jack files to compile, in a stable order.
+
+    Args:
+        argument_path (str): a .jack file or a directory of .jack files.
+
+    Returns:
+        list: the paths of the .jack files.
+    """
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".jack":
-            continue
-        output_path = filename + ".vm"
+    return [input_path for input_path in files_to_assemble
+            if os.path.splitext(input_path)[1].lower() == ".jack"]
+
+
+def output_path_of(input_path: str) -> str:
+    """
+    Returns:
+        str: the path of the .vm file compiled from the given .jack file.
+    """
+    return os.path.splitext(input_path)[0] + ".vm"
+
+
+def compile_path(input_path: str,
+                 options: typing.Optional[CompileOptions] = None) -> tuple:
+    """Compiles a single .jack file into a .vm file next to it.
+
+    Args:
+        input_path (str): the path of the file to compile.
+        options (CompileOptions): the options to compile with.
+
+    Returns:
+        tuple: an error message if the compilation failed or None, and the
+        counters returned by compile_file.
+    """
+    output_path = output_path_of(input_path)
+    try:
+        subroutine_cache = open_subroutine_cache(input_path, options)
+        token_cache = open_token_cache(options)
         with open(input_path, 'r') as input_file, \
                 open(output_path, 'w') as output_file:
-            compile_file(input_file, output_file)
+            if options is not None and options.source_map:
+                with open(output_path + MAP_SUFFIX, 'w') as map_file:
+                    counters = compile_file(input_file, output_file,
+                                            options, subroutine_cache,
+                                            map_file, token_cache)
+            else:
+                counters = compile_file(input_file, output_file, options,
+                                        subroutine_cache,
+                                        token_cache=token_cache)
+        if subroutine_cache is not None:
+            subroutine_cache.save()
+    except Exception as error:
+        return "{}: {}: {}".format(
+            input_path, type(error).__name__, error), {}
+    return None, counters
+
+
+def compile_source(source: str,
+                   options: typing.Optional[CompileOptions] = None) -> str:
+    """Compiles the source of a single class in memory.
+
+    Args:
+        source (str): the Jack source of the class.
+        options (CompileOptions): the options to compile with.
+
+    Returns:
+        str: the VM code of the class.
+    """
+    output_file = io.StringIO()
+    compile_file(io.StringIO(source), output_file, options)
+    return output_file.getvalue()
+
+
+def compile_named_source(named_source: tuple,
+                         options: typing.Optional[CompileOptions] = None
+                         ) -> tuple:
+    """Compiles a (name, source) pair, as compile_many does.
+
+    Returns:
+        tuple: the name, an error message if the compilation failed or None,
+        and the VM code.
+    """
+    name, source = named_source
+    try:
+        return name, None, compile_source(source, options)
+    except Exception as error:
+        return name, "{}: {}: {}".format(
+            name, type(error).__name__, error), ""
+
+
+def compile_many(sources: typing.Iterable[tuple], jobs: int = 1,
+                 options: typing.Optional[CompileOptions] = None
+                 ) -> typing.Iterator[tuple]:
+    """Compiles many classes in memory, without touching the filesystem.
+    A failing class does not stop the others.
+
+    Args:
+        sources (typing.Iterable[tuple]): (name, source) pairs, where the
+        name only identifies the class in the results.
+        jobs (int): the number of processes to spread the classes over.
+        options (CompileOptions): the options to compile with.
+
+    Returns:
+        typing.Iterator[tuple]: a (name, error message or None, VM code)
+        triplet for every class, in the given order.
+    """
+    compile_one = functools.partial(compile_named_source, options=options)
+    if jobs == 1:
+        yield from map(compile_one, sources)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        yield from executor.map(compile_one, sources,
+                                chunksize=BATCH_CHUNK_SIZE)
+
+
+def compile_to_lines(input_path: str,
+                     options: typing.Optional[CompileOptions] = None) -> tuple:
+    """Compiles a single .jack file in memory.
+
+    Returns:
+        tuple: an error message if the compilation failed or None, the
+        counters returned by compile_file, and the lines of the VM code.
+    """
+    output_file = io.StringIO()
+    try:
+        subroutine_cache = open_subroutine_cache(input_path, options)
+        with open(input_path, 'r') as input_file:
+            counters = compile_file(input_file, output_file, options,
+                                    subroutine_cache,
+                                    token_cache=open_token_cache(options))
+        if subroutine_cache is not None:
+            subroutine_cache.save()
+    except Exception as error:
+        return "{}: {}: {}".format(
+            input_path, type(error).__name__, error), {}, []
+    return None, counters, output_file.getvalue().splitlines(True)
+
+
+def compile_paths(input_paths: list, jobs: int = 1,
+                  options: typing.Optional[CompileOptions] = None,
+                  compiler: typing.Callable = compile_path) -> list:
+    """Compiles the given files, spreading them over jobs processes.
+    Each file is compiled on its own, so the output does not depend on jobs.
+    The token cache is trimmed once all of them are compiled.
+
+    Args:
+        compiler (typing.Callable): compiles a single file, either
+        compile_path or compile_to_lines.
+
+    Returns:
+        list: the result of the compiler for each of the given files.
+    """
+    compile_one = functools.partial(compiler, options=options)
+    if jobs == 1 or len(input_paths) < 2:
+        results = list(map(compile_one, input_paths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(compile_one, input_paths))
+    token_cache = open_token_cache(options)
+    if token_cache is not None and input_paths:
+        token_cache.trim()
+    return results
+
+
+def build(input_paths: list, jobs: int = 1,
+          options: typing.Optional[CompileOptions] = None,
+          cache: typing.Optional[BuildCache] = None,
+          whole_program: bool = False) -> list:
+    """Compiles the given files, skipping those the cache holds as unchanged.
+
+    Args:
+        whole_program (bool): compile the files as a single program, leaving
+        out the functions it never calls.
+
+    Returns:
+        list: an (input path, error message or None, counters) triplet for
+        every file that was compiled.
+    """
+    if whole_program:
+        return build_program(input_paths, jobs, options, cache)
+    if cache is not None:
+        input_paths = [
+            input_path for input_path in input_paths
+            if not cache.is_fresh(input_path, output_path_of(input_path))]
+    results = []
+    for input_path, (error, counters) in zip(
+            input_paths, compile_paths(input_paths, jobs, options)):
+        results.append((input_path, error, counters))
+        if cache is None:
+            continue
+        if error is None:
+            cache.record(input_path)
+        else:
+            cache.forget(input_path)
+    if cache is not None:
+        cache.save()
+    return results
+
+
+def build_program(input_paths: list, jobs: int = 1,
+                  options: typing.Optional[CompileOptions] = None,
+                  cache: typing.Optional[BuildCache] = None,
+                  compiled: typing.Optional[dict] = None) -> list:
+    """Compiles the given files as a single program, and writes them without
+    the functions that cannot be reached from its entry points, after
+    inlining the calls to trivial subroutines if the options say so.
+    Whether a function is reachable depends on every file, so either all the
+    files are unchanged and skipped, or all of them are compiled. Nothing is
+    written if any of them fails to compile.
+
+    Args:
+        compiled (dict): the results of compile_to_lines from earlier builds,
+        by path. The files it holds are not compiled again, and it is
+        updated with the results of this build.
+
+    Returns:
+        list: an (input path, error message or None, counters) triplet for
+        every file that was compiled.
+    """
+    if cache is not None:
+        fresh = [cache.is_fresh(input_path, output_path_of(input_path))
+                 for input_path in input_paths]
+        if all(fresh):
+            cache.save()
+            return []
+    compiled = {} if compiled is None else compiled
+    new_paths = [input_path for input_path in input_paths
+                 if input_path not in compiled]
+    compiled.update(zip(new_paths, compile_paths(
+        new_paths, jobs, options, compile_to_lines)))
+    results = [(input_path,) + compiled[input_path][:2]
+               for input_path in input_paths]
+    if any(error is not None for _, error, _ in results):
+        for input_path, error, _ in results:
+            if error is not None:
+                del compiled[input_path]  # compiled again by the next build
+            if cache is not None:
+                cache.forget(input_path)
+    else:
+        programs = {input_path: compiled[input_path][2]
+                    for input_path in input_paths}
+        inliner = Inliner()
+        if options is not None and options.inline:
+            programs = inliner.inline(programs)
+        eliminator = DeadCodeEliminator()
+        programs = eliminator.eliminate(programs)
+        for input_path, _, counters in results:
+            with open(output_path_of(input_path), 'w') as output_file:
+                output_file.writelines(programs[input_path])
+            counters.update(inliner.counters(input_path))
+            counters.update(eliminator.counters(input_path))
+            if cache is not None:
+                cache.record(input_path)
+    if cache is not None:
+        cache.save()
+    return results
+
+
+def build_fingerprint(options: CompileOptions,
+                      whole_program: bool = False) -> str:
+    """
+    Returns:
+        str: the fingerprint of the compiler building with the given options.
+    """
+    return compiler_fingerprint(
+        options.fingerprint() + (("whole_program", whole_program),))
+
+
+def file_states(input_paths: list) -> dict:
+    """
+    Returns:
+        dict: the modification time and size of every existing file, by path.
+    """
+    states = {}
+    for input_path in input_paths:
+        try:
+            status = os.stat(input_path)
+        except OSError:  # deleted since it was listed
+            continue
+        states[input_path] = status.st_mtime_ns, status.st_size
+    return states
+
+
+def watch(argument_path: str, report: typing.Callable, jobs: int = 1,
+          options: typing.Optional[CompileOptions] = None,
+          cache: typing.Optional[BuildCache] = None,
+          whole_program: bool = False,
+          interval: float = WATCH_INTERVAL) -> None:
+    """Builds the .jack files of argument_path, and then polls them and
+    builds them again whenever they change, until interrupted. Only the
+    changed files are compiled; with whole_program, the VM code of the
+    others is kept in memory between builds.
+
+    Args:
+        argument_path (str): a .jack file or a directory of .jack files.
+        report (typing.Callable): called after every build with its results
+        and the seconds it took.
+        interval (float): the seconds between two polls.
+    """
+    states = {}
+    compiled = {}
+    while True:
+        new_states = file_states(list_jack_files(argument_path))
+        changed = [input_path for input_path, state in new_states.items()
+                   if states.get(input_path) != state]
+        if changed or new_states.keys() != states.keys():
+            start = time.perf_counter()
+            if options is not None and options.signatures is not None:
+                signatures = index_files(list(new_states), argument_path)
+                if signatures.digest() != options.signatures.digest():
+                    options.signatures = signatures
+                    changed = list(new_states)
+                    compiled.clear()
+                    if cache is not None:
+                        cache.reset(build_fingerprint(options, whole_program))
+            if whole_program:
+                for input_path in changed + list(
+                        compiled.keys() - new_states.keys()):
+                    compiled.pop(input_path, None)
+                results = build_program(list(new_states), jobs, options,
+                                        cache, compiled)
+            else:
+                results = build(changed, jobs, options, cache)
+            report(results, time.perf_counter() - start)
+        states = new_states
+        time.sleep(interval)
+
+
+def write_asm(jack_paths: list, argument_path: str) -> str:
+    """Translates the .vm files compiled from the given .jack files into a
+    single Hack assembly program.
+
+    Args:
+        jack_paths (list): the .jack files of the program, already compiled.
+        argument_path (str): the .jack file or the directory compiled, which
+        the .asm file is named after.
+
+    Returns:
+        str: the path of the .asm file.
+    """
+    files = {}
+    for jack_path in jack_paths:
+        with open(output_path_of(jack_path), 'r') as vm_file:
+            files[os.path.basename(output_path_of(jack_path))] = \
+                vm_file.readlines()
+    asm_path = asm_path_of(argument_path)
+    with open(asm_path, 'w') as asm_file:
+        asm_file.write("".join(HackTranslator().translate(files)))
+    return asm_path
+
+
+def report_results(build_results: list,
+                   options: typing.Optional[CompileOptions] = None,
+                   whole_program: bool = False) -> bool:
+    """Prints the errors of a build, and what -O and whole_program removed.
+
+    Returns:
+        bool: True if any of the files failed to compile.
+    """
+    options = options or CompileOptions()
+    failed = False
+    for jack_path, message, file_counters in build_results:
+        if message is not None:
+            print(message, file=sys.stderr)
+            failed = True
+            continue
+        if options.optimize:
+            print("{}: folded {} constant operations, reduced {} "
+                  "multiplications, peephole removed {} VM instructions"
+                  .format(jack_path, file_counters["constants_folded"],
+                          file_counters["multiplications_reduced"],
+                          file_counters["peephole_removed"]))
+            if file_counters.get("invariants_hoisted") or \
+                    file_counters.get("that_reused"):
+                print("{}: hoisted {} loop invariants, reused {} array "
+                      "element addresses".format(
+                          jack_path, file_counters["invariants_hoisted"],
+                          file_counters["that_reused"]))
+            if file_counters["tail_calls"]:
+                print("{}: turned {} tail calls into jumps".format(
+                    jack_path, file_counters["tail_calls"]))
+            if file_counters["local_slots_saved"]:
+                print("{}: packed locals into {} fewer slots{}".format(
+                    jack_path, file_counters["local_slots_saved"],
+                    "".join("\n  {}: saved {}".format(function_name, saved)
+                            for function_name, saved in
+                            file_counters["packed_functions"].items())))
+        if file_counters.get("subroutines_reused"):
+            print("{}: reused {} unchanged subroutines".format(
+                jack_path, file_counters["subroutines_reused"]))
+        if whole_program and file_counters["inlined_calls"]:
+            print("{}: inlined {} calls".format(
+                jack_path, file_counters["inlined_calls"]))
+        if whole_program and file_counters["removed_functions"]:
+            print("{}: removed {} unreachable subroutines, saving {} VM "
+                  "lines{}".format(
+                      jack_path, len(file_counters["removed_functions"]),
+                      file_counters["dead_lines"],
+                      "".join("\n  " + function_name for function_name in
+                              file_counters["removed_functions"])))
+    return failed
+
+
+def main(argv: typing.Optional[list] = None) -> int:
+    """Runs the compiler as from the command line.
+
+    Args:
+        argv (list): the command line arguments, without the program name;
+        those of the process by default.
+
+    Returns:
+        int: the exit status.
+    """
+    # Parses the input path and calls compile_file on each input file.
+    # This opens both the input and the output files!
+    # Both are closed automatically when the code finishes running.
+    # If the output file does not exist, it is created automatically in the
+    # correct path, using the correct filename.
+    parser = argparse.ArgumentParser(prog="JackCompiler")
+    parser.add_argument("input_path")
+    parser.add_argument("--stream", action="store_true",
+                        help="tokenize lazily, keeping memory bounded")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of files compiled in parallel "
+                             "(0 uses every core)")
+    parser.add_argument("--force", action="store_true",
+                        help="recompile every file and subroutine, even if "
+                             "unchanged")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="report build cache hits and misses")
+    parser.add_argument("--ir", action="store_true",
+                        help="compile through the intermediate "
+                             "representation; with -O, this also hoists "
+                             "loop invariants and reuses array addresses")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="optimize the generated VM code")
+    parser.add_argument("--no-string-pool", action="store_true",
+                        help="with -O, build string literals on every use, "
+                             "for programs that mutate their literals")
+    parser.add_argument("--whole-program", action="store_true",
+                        help="leave out the subroutines that the program in "
+                             "the input directory never calls")
+    parser.add_argument("--inline", action="store_true",
+                        help="with --whole-program, inline the calls to "
+                             "trivial subroutines like getters and setters")
+    parser.add_argument("--stats", action="store_true",
+                        help="time the phases of every compiled file and "
+                             "count its tokens, VM commands and symbol "
+                             "lookups, and print them as JSON")
+    parser.add_argument("--stats-file", metavar="FILE",
+                        help="write the --stats JSON to FILE instead of "
+                             "printing it; implies --stats")
+    parser.add_argument("--asm", action="store_true",
+                        help="also translate the program into a single "
+                             "Hack .asm file, with no VM translator")
+    parser.add_argument("--source-map", action="store_true",
+                        help="write a .vm.map file next to every .vm file, "
+                             "mapping its lines to Jack source lines")
+    parser.add_argument("--watch", action="store_true",
+                        help="stay running, and compile the files again "
+                             "whenever they change")
+    args = parser.parse_args(argv)
+    args.stats = args.stats or args.stats_file is not None
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.whole_program and not os.path.isdir(args.input_path):
+        parser.error("--whole-program needs a directory")
+    if args.inline and not args.whole_program:
+        parser.error("--inline needs --whole-program")
+    if args.watch and args.stats:
+        parser.error("--stats cannot be combined with --watch")
+    if args.watch and args.asm:
+        parser.error("--asm cannot be combined with --watch")
+    if args.source_map and (args.ir or args.whole_program or
+                            args.stats):
+        parser.error("--source-map cannot be combined with --ir, "
+                     "--whole-program or --stats")
+    argument_path = os.path.abspath(args.input_path)
+    jack_paths = list_jack_files(argument_path)
+    signature_index = None
+    if os.path.isdir(argument_path):
+        signature_index = index_files(jack_paths, argument_path)
+    compile_options = CompileOptions(args.stream, args.optimize,
+                                     not args.no_string_pool, args.ir,
+                                     args.stats, signature_index,
+                                     args.inline, not args.force,
+                                     args.source_map)
+    build_cache = None
+    if jack_paths:
+        build_cache = BuildCache(
+            os.path.dirname(jack_paths[0]),
+            build_fingerprint(compile_options, args.whole_program),
+            args.force)
+    if args.watch:
+        def report_build(results: list, seconds: float) -> None:
+            report_results(results, compile_options, args.whole_program)
+            print("compiled {} files in {:.1f} ms".format(
+                len(results), seconds * 1000), flush=True)
+        try:
+            watch(argument_path, report_build, args.jobs or os.cpu_count(),
+                  compile_options, build_cache, args.whole_program)
+        except KeyboardInterrupt:
+            return 0
+    build_start = time.perf_counter()
+    build_results = build(jack_paths, args.jobs or os.cpu_count(),
+                          compile_options, build_cache, args.whole_program)
+    build_time = time.perf_counter() - build_start
+    if args.cache_stats and build_cache is not None:
+        print("build cache: {} hits, {} misses".format(
+            build_cache.hits, build_cache.misses))
+    if args.cache_stats and compile_options.incremental:
+        tokens_cached = sum(file_counters.get("tokens_cached", False)
+                            for _, _, file_counters in build_results)
+        print("token cache: {} hits, {} misses".format(
+            tokens_cached, len(build_results) - tokens_cached))
+    failed = report_results(build_results, compile_options,
+                            args.whole_program)
+    if args.stats:
+        files_stats = {jack_path: file_counters["stats"]
+                       for jack_path, message, file_counters in build_results
+                       if message is None}
+        stats_json = json.dumps({
+            "wall_ms": round(build_time * 1000, 3),
+            "skipped_files": build_cache.hits if build_cache else 0,
+            "total": total_stats(files_stats),
+            "files": files_stats}, indent=1)
+        if args.stats_file is None:
+            print(stats_json)
+        else:
+            with open(args.stats_file, 'w') as stats_file:
+                stats_file.write(stats_json + "\n")
+    if failed:
+        return 1
+    if args.asm and jack_paths:
+        write_asm(jack_paths, argument_path)
+    return 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Generates synthetic Jack classes, far larger than the sample programs, to
+measure how the compiler scales. Every class compiles, and the same
+parameters always generate the same source.
+"""
+import argparse
+import os
+
+# one line statements that long_method cycles through, formatted with the
+# number of the statement
+STATEMENT_TEMPLATES = [
+    "let a = a + (b * {0}) - c;",
+    "if (a > b) {{ let c = c + {0}; }} else {{ let b = b - 1; }}",
+    "while (i < {0}) {{ let i = i + 1; }}",
+    "do Output.printInt(a & {0});",
+    "let arr[i] = arr[i + {0}] + a;",
+    "let b = Main.helper(a, b / {0}, -c);",
+    "let c = ~(a = {0}) | (b < c);",
+]
+LOCALS = "        var int a, b, c, i;\n        var Array arr;\n"
+HELPER = ("    function int helper(int x, int y, int z) {\n"
+          "        return x + y + z;\n"
+          "    }\n")
+
+
+def long_method(statements: int) -> str:
+    """
+    Returns:
+        str: a class with a single function of the given number of one line
+        statements.
+    """
+    body = "".join(
+        "        " + STATEMENT_TEMPLATES[index % len(STATEMENT_TEMPLATES)]
+        .format(index % 100 + 1) + "\n" for index in range(statements))
+    return ("class Main {\n    function void main() {\n" + LOCALS + body +
+            "        return;\n    }\n" + HELPER + "}\n")
+
+
+def wide_class(subroutines: int, fields: int = 64) -> str:
+    """
+    Returns:
+        str: a class with the given number of fields and of small methods,
+        each reading and writing a few of the fields.
+    """
+    declarations = "".join("    field int f{};\n".format(index)
+                           for index in range(fields))
+    methods = "".join(
+        "    method int m{0}(int x) {{\n"
+        "        var int y;\n"
+        "        let y = f{1} + x;\n"
+        "        let f{2} = y - f{1};\n"
+        "        if (y > {0}) {{ let y = m{3}(y - 1); }}\n"
+        "        return y;\n"
+        "    }}\n".format(index, index % fields, (index * 7) % fields,
+                         max(index - 1, 0))
+        for index in range(subroutines))
+    return ("class Wide {\n" + declarations +
+            "    constructor Wide new() {\n        return this;\n    }\n" +
+            methods + "}\n")
+
+
+def deep_expressions(depth: int, expressions: int) -> str:
+    """
+    Returns:
+        str: a class whose function assigns the given number of expressions,
+        each nesting its parentheses depth levels deep.
+    """
+    operators = "+-*&|"
+    lines = []
+    for index in range(expressions):
+        expression = "a"
+        for level in range(depth):
+            expression = "({} {} {})".format(
+                level % 9 + 1, operators[(index + level) % len(operators)],
+                expression)
+        lines.append("        let a = {};\n".format(expression))
+    return ("class Main {\n    function void main() {\n" + LOCALS +
+            "".join(lines) + "        return;\n    }\n}\n")
+
+
+def string_literals(literals: int, length: int = 40) -> str:
+    """
+    Returns:
+        str: a class printing the given number of string literals of the
+        given length, a quarter of them repeated.
+    """
+    alphabet = "abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ" \
+        "0123456789"
+    lines = []
+    for index in range(literals):
+        seed = index if index % 4 else 0
+        text = "".join(alphabet[(seed * 31 + offset * 7) % len(alphabet)]
+                       for offset in range(length))
+        lines.append('        do Output.printString("{}");\n'.format(text))
+    return ("class Main {\n    function void main() {\n" + "".join(lines) +
+            "        return;\n    }\n}\n")
+
+
+def tail_recursion(depth: int) -> str:
+    """
+    Returns:
+        str: a class printing the sum of n & 7 for n from 1 to depth, added
+        up by a function that calls itself depth times, in tail position.
+    """
+    return ("class Main {\n"
+            "    function int sum(int n, int acc) {\n"
+            "        if (n = 0) { return acc; }\n"
+            "        return Main.sum(n - 1, acc + (n & 7));\n"
+            "    }\n"
+            "    function void main() {\n"
+            "        do Output.printInt(Main.sum(" + str(depth) + ", 0));\n"
+            "        return;\n    }\n}\n")
+
+
+def loop_kernels(length: int) -> str:
+    """
+    Returns:
+        str: a class running loops over an array of the given length, with
+        bounds and factors that do not change inside the loops, and array
+        elements read and written by the same statement.
+    """
+    return ("class Main {\n"
+            "    function int scale(Array a, int n, int factor, int bias) {\n"
+            "        var int i, sum;\n"
+            "        while (i < (n - 1)) {\n"
+            "            let a[i] = a[i] + (factor * bias);\n"
+            "            let sum = sum + (a[i] & (bias + 7));\n"
+            "            let i = i + 1;\n"
+            "        }\n"
+            "        return sum;\n"
+            "    }\n"
+            "    function int rows(Array a, int n, int width) {\n"
+            "        var int row, column, sum;\n"
+            "        while (row < (n / width)) {\n"
+            "            let column = 0;\n"
+            "            while (column < width) {\n"
+            "                let sum = sum + a[(row * width) + column];\n"
+            "                let column = column + 1;\n"
+            "            }\n"
+            "            let row = row + 1;\n"
+            "        }\n"
+            "        return sum;\n"
+            "    }\n"
+            "    function void main() {\n"
+            "        var Array a;\n"
+            "        let a = Array.new(" + str(length) + ");\n"
+            "        do Output.printInt(Main.scale(a, " + str(length) +
+            ", 3, 5));\n"
+            "        do Output.printInt(Main.rows(a, " + str(length) +
+            ", 8));\n"
+            "        return;\n    }\n}\n")
+
+
+# the generated shapes, scaled to about 20k lines at scale 1, except for
+# deep-expressions, which is about 200 lines of 100 nested expressions each
+CORPORA = {
+    "long-method": lambda scale: long_method(int(20000 * scale)),
+    "wide-class": lambda scale: wide_class(int(2800 * scale)),
+    "deep-expressions": lambda scale: deep_expressions(
+        100, int(200 * scale)),
+    "string-literals": lambda scale: string_literals(int(20000 * scale)),
+}
+
+
+def generate(shape: str, scale: float = 1.0) -> str:
+    """
+    Args:
+        shape (str): the name of one of the CORPORA.
+        scale (float): the size of the class, relative to about 20k lines.
+
+    Returns:
+        str: the source of the generated class.
+    """
+    return CORPORA[shape](scale)
+
+
+if "__main__" == __name__:
+    # Writes every shape into its own directory, ready for JackCompiler.
+    parser = argparse.ArgumentParser(prog="JackCorpus")
+    parser.add_argument("output_path")
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args()
+    for corpus_shape in sorted(CORPORA):
+        source = generate(corpus_shape, args.scale)
+        directory = os.path.join(args.output_path, corpus_shape)
+        os.makedirs(directory, exist_ok=True)
+        class_name = source.split()[1]
+        with open(os.path.join(directory, class_name + ".jack"),
+                  'w') as output_file:
+            output_file.write(source)
@@ -0,0 +1,149 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+The typed intermediate representation of a Jack class, as built by the
+IRBuilder and lowered to VM code by the IRLowering. All nodes use __slots__
+and hold their children in tuples, so a class costs a few small objects per
+statement and expression.
+"""
+
+
+class ClassNode:
+    """A class: its name, its variables and its subroutines."""
+    __slots__ = ("name", "class_vars", "subroutines")
+
+    def __init__(self, name: str, class_vars: tuple,
+                 subroutines: tuple) -> None:
+        """
+        Args:
+            name (str): the name of the class.
+            class_vars (tuple): (kind, type, name) triplets of the class's
+            "static" and "field" variables, in declaration order.
+            subroutines (tuple): the SubroutineNodes of the class.
+        """
+        self.name = name
+        self.class_vars = class_vars
+        self.subroutines = subroutines
+
+
+class SubroutineNode:
+    """A constructor, function or method."""
+    __slots__ = ("kind", "return_type", "name", "parameters", "local_vars",
+                 "statements")
+
+    def __init__(self, kind: str, return_type: str, name: str,
+                 parameters: tuple, local_vars: tuple,
+                 statements: tuple) -> None:
+        """
+        Args:
+            kind (str): "constructor", "function" or "method".
+            return_type (str): the declared return type.
+            name (str): the name of the subroutine, without its class.
+            parameters (tuple): (type, name) pairs of the parameters.
+            local_vars (tuple): (type, name) pairs of the local variables.
+            statements (tuple): the statement nodes of the body.
+        """
+        self.kind = kind
+        self.return_type = return_type
+        self.name = name
+        self.parameters = parameters
+        self.local_vars = local_vars
+        self.statements = statements
+
+
+class LetNode:
+    """let name = value; or let name[index] = value;"""
+    __slots__ = ("name", "index", "value")
+
+    def __init__(self, name: str, index, value) -> None:
+        self.name = name
+        self.index = index  # None unless an array element is assigned
+        self.value = value
+
+
+class IfNode:
+    """An if statement, with else_statements None if there is no else."""
+    __slots__ = ("condition", "statements", "else_statements")
+
+    def __init__(self, condition, statements: tuple,
+                 else_statements: tuple) -> None:
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+
+
+class WhileNode:
+    """A while statement."""
+    __slots__ = ("condition", "statements")
+
+    def __init__(self, condition, statements: tuple) -> None:
+        self.condition = condition
+        self.statements = statements
+
+
+class DoNode:
+    """A do statement, holding its CallNode."""
+    __slots__ = ("call",)
+
+    def __init__(self, call) -> None:
+        self.call = call
+
+
+class ReturnNode:
+    """A return statement, with value None in void subroutines."""
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+class ConstantNode:
+    """An integer, string or keyword constant.
+    The value is the constant's token, without the quotes of strings.
+    """
+    __slots__ = ("kind", "value")
+
+    def __init__(self, kind: str, value: str) -> None:
+        self.kind = kind  # "INT_CONST", "STR_CONST" or "KEYWORD"
+        self.value = value
+
+
+class VariableNode:
+    """A variable, or an element of an array variable."""
+    __slots__ = ("name", "index")
+
+    def __init__(self, name: str, index=None) -> None:
+        self.name = name
+        self.index = index  # None unless an array element is accessed
+
+
+class CallNode:
+    """A subroutine call: foo(...), Class.foo(...) or variable.foo(...)."""
+    __slots__ = ("receiver", "name", "arguments")
+
+    def __init__(self, receiver, name: str, arguments: tuple) -> None:
+        self.receiver = receiver  # None for calls on "this"
+        self.name = name
+        self.arguments = arguments
+
+
+class BinaryNode:
+    """A binary operation; Jack applies these from left to right."""
+    __slots__ = ("operator", "left", "right")
+
+    def __init__(self, operator: str, left, right) -> None:
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+class UnaryNode:
+    """A unary operation."""
+    __slots__ = ("operator", "operand")
+
+    def __init__(self, operator: str, operand) -> None:
+        self.operator = operator
+        self.operand = operand
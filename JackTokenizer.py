@@ -11,51 +11,177 @@ KEYWORDS = ['class', 'constructor', 'function', 'method', 'field',
 SYMBOLS = ['{', '}', '(', ')', '[', ']', '.', ',', ';', '+', '-', '*', '/',
            '&', '|', '<', '>', '=', '~', '#', '^']
 
+# number of characters read from the input stream at a time in lazy mode
+CHUNK_SIZE = 1 << 16
+# maximal number of tokens held ahead of the current one in lazy mode
+LOOKAHEAD_SIZE = 2
+
+# token kinds, as stored in the compact kinds array
+KEYWORD, SYMBOL, INT_CONST, STR_CONST, IDENTIFIER = range(5)
+TOKEN_TYPES = ("KEYWORD", "SYMBOL", "INT_CONST", "STR_CONST", "IDENTIFIER")
+
+import array
+import collections
+import sys
 import typing
 import re
 
+# a single pattern decides both the extent and the kind of every token;
+# the alternatives are tried in the order of the token kinds above
+TOKEN_PATTERN = re.compile(
+    '(?P<KEYWORD>(?:' + '|'.join(KEYWORDS) + r')(?!\w))|'
+    '(?P<SYMBOL>[' + re.escape(''.join(SYMBOLS)) + '])|'
+    r'(?P<INT_CONST>\d+)|'
+    r'(?P<STR_CONST>"[^"\n]*")|'
+    r'(?P<IDENTIFIER>\w+)')
+KIND_OF_GROUP = {name: kind for kind, name in enumerate(TOKEN_TYPES)}
+KEYWORD_NAMES = {keyword: keyword.upper() for keyword in KEYWORDS}
+
 
 class JackTokenizer:
     """Removes all comments from the input stream and breaks it
     into Jack language tokens, as specified by the Jack grammar.
     """
 
-    def __init__(self, input_stream: typing.TextIO) -> None:
+    def __init__(self, input_stream: typing.TextIO, lazy: bool = False,
+                 token_cache=None) -> None:
         """Opens the input stream and gets ready to tokenize it.
 
         Args:
             input_stream (typing.TextIO): input stream.
+            lazy (bool): if True, the input is read in chunks and tokens are
+            produced on demand, so memory stays bounded by the chunk size and
+            the lookahead buffer instead of growing with the input.
+            token_cache (TokenCache): the cache to take the tokens from if
+            the input was tokenized before, and to put them in otherwise.
+            Not used in lazy mode.
         """
         self.all_tokens = []
-        self.input_lines = input_stream.read().splitlines()
-        # get all tokens (broken down into atoms)
-        symReg = '[' + re.escape('|'.join(SYMBOLS)) + ']'
-        keyReg = '(?!\w)|'.join(KEYWORDS) + '(?!\w)'
-        intReg = r'\d+'
-        idReg = r'[\w]+'
-        strReg = r'"[^"\n]*"'
-        self.pattern = re.compile(
-            keyReg + '|' + symReg + '|' + intReg + '|' + strReg + '|' + idReg)
-        self.all_tokens = self.tokenize()
+        self.kinds = array.array('B')
+        # the source line, counted from 1, of every token
+        self.token_lines = array.array('I')
+        self.pattern = TOKEN_PATTERN
+        self.in_comment = False
+        self.lazy = lazy
         self.cur_ind = 0
+        self.cur_token = self.cur_kind = None
+        self.cur_line = 0  # only kept up to date in lazy mode
+        self.cached = False  # whether the tokens came from the token cache
+        if lazy:
+            self.all_tokens = self.kinds = self.token_lines = None
+            self.lookahead = collections.deque()
+            self.token_stream = self.generate_tokens(
+                self.read_lines(input_stream))
+            self.fill_lookahead(1)
+            if self.lookahead:
+                self.cur_kind, self.cur_token, self.cur_line = \
+                    self.lookahead.popleft()
+            return
+        source = input_stream.read()
+        cached = token_cache and token_cache.get(source)
+        if cached:
+            self.all_tokens, self.kinds, self.token_lines = cached
+            self.cached = True
+        else:
+            self.input_lines = source.splitlines()
+            self.all_tokens = self.tokenize()
+            if token_cache is not None:
+                token_cache.put(source, self.all_tokens, self.kinds,
+                                self.token_lines)
         if len(self.all_tokens) != 0:
             self.cur_token = self.all_tokens[0]
+            self.cur_kind = self.kinds[0]
 
     def tokenize(self):
         """
         A method that enables getting all relevant tokens per line,
-        and returns all the tokens needed.
+        and returns all the tokens needed. The kind of every token is stored
+        alongside it in the kinds array.
+        """
+        add_kind = self.kinds.append
+        add_token = self.all_tokens.append
+        add_lines = self.token_lines.extend
+        for number, tokens in self.generate_line_tokens(self.input_lines):
+            for kind, token in tokens:
+                add_kind(kind)
+                add_token(token)
+            add_lines([number] * len(tokens))
+        return self.all_tokens
+
+    def generate_line_tokens(self, lines):
+        """
+        Yields the number of every line holding tokens, counted from 1,
+        with the list of its (kind, token) pairs. The comment state is
+        kept on the tokenizer, so a block comment may span several lines or
+        chunks of the input.
         """
-        in_comment = False
-        for line in self.input_lines:
+        for number, line in enumerate(lines, 1):
             # avoiding empty lines and comments
             line = line.strip()
-            line, in_comment = self.ignore_comments(line, in_comment)
+            line, self.in_comment = self.ignore_comments(line, self.in_comment)
             if not line:
                 continue
-            # append all atomized tokens
-            self.all_tokens += self.tokenize_line(line)
-        return self.all_tokens
+            # yield all atomized tokens
+            yield number, self.tokenize_line(line)
+
+    def generate_tokens(self, lines):
+        """
+        Yields the (kind, token, line number) triplets of the given lines
+        one by one.
+        """
+        for number, tokens in self.generate_line_tokens(lines):
+            for kind, token in tokens:
+                yield kind, token, number
+
+    def read_lines(self, input_stream):
+        """
+        Reads the input stream CHUNK_SIZE characters at a time and yields its
+        lines, carrying a partial last line over to the next chunk.
+        """
+        remainder = ""
+        while True:
+            chunk = input_stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (remainder + chunk).splitlines(True)
+            remainder = ""
+            if lines[-1].splitlines()[0] == lines[-1]:  # no line break
+                remainder = lines.pop()
+            yield from lines
+        if remainder:
+            yield remainder
+
+    def fill_lookahead(self, size):
+        """
+        Makes sure that at least size tokens (but no more than LOOKAHEAD_SIZE)
+        are held in the lookahead buffer, unless the input is exhausted.
+        """
+        size = min(size, LOOKAHEAD_SIZE)
+        while len(self.lookahead) < size:
+            token = next(self.token_stream, None)
+            if token is None:
+                break
+            self.lookahead.append(token)
+
+    def peek(self, distance: int = 1):
+        """
+        Returns:
+            str: the token distance places after the current one without
+            advancing, or None if there is no such token. In lazy mode, a
+            ValueError is raised if distance exceeds LOOKAHEAD_SIZE.
+        """
+        if self.lazy:
+            if distance > LOOKAHEAD_SIZE:
+                raise ValueError("cannot peek {} tokens ahead, only {} are "
+                                 "held in lazy mode".format(distance,
+                                                            LOOKAHEAD_SIZE))
+            self.fill_lookahead(distance)
+            if len(self.lookahead) < distance:
+                return None
+            return self.lookahead[distance - 1][1]
+        if self.cur_ind + distance < len(self.all_tokens):
+            return self.all_tokens[self.cur_ind + distance]
+        return None
 
     def has_more_tokens(self) -> bool:
         """Do we have more tokens in the input?
@@ -63,37 +189,18 @@ class JackTokenizer:
         Returns:
             bool: True if there are more tokens, False otherwise.
         """
+        if self.lazy:
+            self.fill_lookahead(1)
+            return len(self.lookahead) != 0
         return self.cur_ind + 1 < len(self.all_tokens)
 
     def tokenize_line(self, line):
         """
-        This method allows parsing the current line into chunks
-        divided by space char, and later to be broken down into basic atoms
-        thanks to the split_expression() method.
-        """
-        tokenized_line = []
-        parsed_line = self.split_line(line)
-        for chunk in parsed_line:
-            if self.check_chunk(chunk) == "STR_CONST":
-                tokenized_line.append(chunk)
-                continue
-            tokenized_line += self.split_to_atoms(chunk)
-        return tokenized_line
-
-    def split_to_atoms(self, cur_string):
-        """
-        This method allows breaking each chunk into identified atoms.
+        This method allows breaking the current line into (kind, token)
+        pairs, deciding the kind of each token in the same regex pass.
         """
-        token_atoms = []
-        j = 0
-        for i in range(len(cur_string)):
-            if cur_string[i] in SYMBOLS:
-                if i != j: token_atoms.append(cur_string[j:i])
-                token_atoms.append(cur_string[i])
-                if i < len(cur_string): j = i + 1
-        if cur_string[j:] != "":
-            token_atoms.append(cur_string[j:])
-        return token_atoms
+        return [(KIND_OF_GROUP[match.lastgroup], sys.intern(match.group()))
+                for match in self.pattern.finditer(line)]
 
     def advance(self) -> None:
         """Gets the next token from the input and makes it the current token.
@@ -103,8 +210,29 @@ class JackTokenizer:
         # Your code goes here!
         if self.has_more_tokens():
             self.cur_ind += 1
-            self.cur_token = self.all_tokens[self.cur_ind]
-            self.token_type()
+            if self.lazy:
+                self.cur_kind, self.cur_token, self.cur_line = \
+                    self.lookahead.popleft()
+            else:
+                self.cur_token = self.all_tokens[self.cur_ind]
+                self.cur_kind = self.kinds[self.cur_ind]
+
+    def seek(self, index: int) -> None:
+        """Makes the token at the given index the current token, skipping
+        over the tokens in between. Only valid when not tokenizing lazily.
+        """
+        self.cur_ind = index
+        self.cur_token = self.all_tokens[index]
+        self.cur_kind = self.kinds[index]
+
+    def line_number(self) -> int:
+        """
+        Returns:
+            int: the source line of the current token, counted from 1.
+        """
+        if self.lazy:
+            return self.cur_line
+        return self.token_lines[self.cur_ind]
 
     def token_type(self) -> str:
         """
@@ -112,25 +240,7 @@ class JackTokenizer:
             str: the type of the current token, can be
             "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST"
         """
-        if self.cur_token in KEYWORDS:
-            return "KEYWORD"
-        elif self.cur_token in SYMBOLS:
-            return "SYMBOL"
-        else:
-            return self.check_chunk(self.cur_token)
-
-    def check_chunk(self, chunk):
-        # returns INT_CONST, STR_CONST, IDENTIFIER
-        # check if the chunk is an integer constant:
-        if chunk.isdigit():
-            return "INT_CONST"
-        # check if the chunk is a string
-        q = re.match('(".+")', chunk)
-        if q:
-            return "STR_CONST"
-        id = re.match('(\D\w*)', chunk)
-        if id:
-            return "IDENTIFIER"
+        return TOKEN_TYPES[self.cur_kind]
 
     def keyword(self) -> str:
         """
@@ -141,7 +251,7 @@ class JackTokenizer:
             "BOOLEAN", "CHAR", "VOID", "VAR", "STATIC", "FIELD", "LET", "DO", 
             "IF", "ELSE", "WHILE", "RETURN", "TRUE", "FALSE", "NULL", "THIS"
         """
-        return self.cur_token.upper()
+        return KEYWORD_NAMES[self.cur_token]
 
     def symbol(self) -> str:
         """
@@ -163,10 +273,10 @@ class JackTokenizer:
     def int_val(self) -> int:
         """
         Returns:
-            str: the integer value of the current token.
+            int: the integer value of the current token.
             Should be called only when token_type() is "INT_CONST".
         """
-        return self.cur_token
+        return int(self.cur_token)
 
     def string_val(self) -> str:
         """
@@ -176,12 +286,6 @@ class JackTokenizer:
         """
         return self.cur_token
 
-    def split_line(self, line):
-        """
-        Gets the line from the given pattern.
-        """
-        return self.pattern.findall(line)
-
     def ignore_comments(self, line, in_comment):
         if not line or line.startswith('//'):  # empty line or inline comment
             return None, in_comment
@@ -0,0 +1,170 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from PeepholeOptimizer import is_single_push
+
+PUSH_LOCAL = "push local "
+POP_LOCAL = "pop local "
+
+
+def successors(lines: typing.List[str]) -> typing.List[tuple]:
+    """
+    Returns:
+        typing.List[tuple]: the indices of the commands that may run right
+        after every command of a function.
+    """
+    labels = {line[len("label "):-1]: index
+              for index, line in enumerate(lines) if line.startswith("label ")}
+    following = []
+    for index, line in enumerate(lines):
+        if line.startswith("goto "):
+            following.append((labels[line[len("goto "):-1]],))
+        elif line.startswith("if-goto "):
+            following.append((index + 1, labels[line[len("if-goto "):-1]]))
+        elif line == "return\n" or index + 1 == len(lines):
+            following.append(())
+        else:
+            following.append((index + 1,))
+    return following
+
+
+def live_locals(lines: typing.List[str], uses: typing.List[int],
+                defs: typing.List[int]) -> typing.List[int]:
+    """Runs a backward liveness analysis over the locals of a function.
+
+    Args:
+        lines (typing.List[str]): the lines of the function.
+        uses (typing.List[int]): a bit mask of the locals every command reads.
+        defs (typing.List[int]): a bit mask of the locals every command
+        writes.
+
+    Returns:
+        typing.List[int]: a bit mask of the locals live right after every
+        command, that is, read later before being written again.
+    """
+    following = successors(lines)
+    live_in = [0] * len(lines)
+    live_out = [0] * len(lines)
+    changed = True
+    while changed:
+        changed = False
+        for index in range(len(lines) - 1, -1, -1):
+            out = 0
+            for successor in following[index]:
+                out |= live_in[successor]
+            live_out[index] = out
+            new_in = uses[index] | (out & ~defs[index])
+            if new_in != live_in[index]:
+                live_in[index] = new_in
+                changed = True
+    return live_out
+
+
+def bits(mask: int) -> typing.Iterator[int]:
+    """
+    Returns:
+        typing.Iterator[int]: the indices of the set bits of mask.
+    """
+    index = 0
+    while mask:
+        if mask & 1:
+            yield index
+        mask >>= 1
+        index += 1
+
+
+class LocalSlotPacker:
+    """Shrinks the frames of functions by giving locals whose values are
+    never needed at the same time a shared slot, and by dropping locals that
+    are never used. Locals read before they are written rely on the zeros
+    the "function" command pushes, so these are all kept apart. Constants
+    stored into locals that are never read again, like the zeros a self
+    tail call resets its locals to, are dropped as well.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new optimizer."""
+        self.saved = {}
+        self.dead_stores = 0
+
+    def counters(self) -> dict:
+        """
+        Returns:
+            dict: the total number of local slots saved, and the slots saved
+            in every function that got smaller, by function name.
+        """
+        return {"local_slots_saved": sum(self.saved.values()),
+                "packed_functions": dict(self.saved),
+                "dead_stores_removed": self.dead_stores}
+
+    def optimize(self, lines: typing.List[str]) -> typing.List[str]:
+        """Packs the locals of a function into as few slots as possible.
+
+        Args:
+            lines (typing.List[str]): the rendered lines of the function,
+            starting with its "function" command.
+
+        Returns:
+            typing.List[str]: the lines, with every local renumbered to its
+            slot and the "function" command allocating only those slots.
+        """
+        _, function_name, n_locals = lines[0].split()
+        if n_locals == "0":
+            return lines
+        uses = [0] * len(lines)
+        defs = [0] * len(lines)
+        for index, line in enumerate(lines):
+            if line.startswith(PUSH_LOCAL):
+                uses[index] = 1 << int(line[len(PUSH_LOCAL):])
+            elif line.startswith(POP_LOCAL):
+                defs[index] = 1 << int(line[len(POP_LOCAL):])
+        live_out = live_locals(lines, uses, defs)
+        dead = {index for index in range(1, len(lines))
+                if defs[index] & ~live_out[index]
+                and lines[index - 1].startswith("push constant ")
+                and is_single_push(lines[index - 1])}
+        interference = {}
+        used = 0
+        for index in range(len(lines)):
+            if index in dead:
+                continue
+            used |= uses[index] | defs[index]
+            if defs[index]:
+                written = defs[index].bit_length() - 1
+                for other in bits(live_out[index] & ~defs[index]):
+                    interference.setdefault(written, set()).add(other)
+                    interference.setdefault(other, set()).add(written)
+        # the locals live on entry are all written by the function command
+        entry_live = list(bits(live_out[0]))
+        for local in entry_live:
+            interference.setdefault(local, set()).update(
+                other for other in entry_live if other != local)
+        slots = {}
+        for local in bits(used):
+            taken = {slots[other] for other in interference.get(local, ())
+                     if other in slots}
+            slots[local] = next(slot for slot in range(len(taken) + 1)
+                                if slot not in taken)
+        n_slots = max(slots.values(), default=-1) + 1
+        if n_slots == int(n_locals) and not dead:
+            return lines
+        if n_slots < int(n_locals):
+            self.saved[function_name] = int(n_locals) - n_slots
+        self.dead_stores += len(dead)
+        packed = ["function {} {}\n".format(function_name, n_slots)]
+        for index, line in enumerate(lines[1:], 1):
+            if index in dead:
+                packed.pop()  # the constant
+                continue
+            if line.startswith(PUSH_LOCAL):
+                line = "{}{}\n".format(
+                    PUSH_LOCAL, slots[int(line[len(PUSH_LOCAL):])])
+            elif line.startswith(POP_LOCAL):
+                line = "{}{}\n".format(
+                    POP_LOCAL, slots[int(line[len(POP_LOCAL):])])
+            packed.append(line)
+        return packed
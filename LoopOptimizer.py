@@ -0,0 +1,283 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from JackIR import *
+
+# the prefix of the hidden locals holding hoisted values; Jack identifiers
+# cannot contain "$", so these never clash with the program's variables
+HIDDEN_PREFIX = "$loop"
+HIDDEN_TYPE = "int"
+# Math.divide fails on zero, which a loop that never runs must not do
+UNSAFE_OPERATORS = {"/"}
+
+
+def expression_key(expression) -> typing.Optional[tuple]:
+    """
+    Returns:
+        typing.Optional[tuple]: a hashable form of an expression, equal for
+        expressions that always evaluate to the same value, or None if the
+        expression calls a subroutine or allocates a string.
+    """
+    kind = type(expression)
+    if kind is ConstantNode:
+        if expression.kind == "STR_CONST":
+            return None
+        return "constant", expression.value
+    if kind is VariableNode:
+        if expression.index is None:
+            return "variable", expression.name
+        index = expression_key(expression.index)
+        return None if index is None else ("element", expression.name,
+                                           index)
+    if kind is BinaryNode:
+        left = expression_key(expression.left)
+        right = expression_key(expression.right)
+        if left is None or right is None:
+            return None
+        return "binary", expression.operator, left, right
+    if kind is UnaryNode:
+        operand = expression_key(expression.operand)
+        return None if operand is None else ("unary", expression.operator,
+                                             operand)
+    return None  # a call
+
+
+def key_names(key: tuple) -> typing.Set[str]:
+    """
+    Returns:
+        typing.Set[str]: the names of the variables an expression_key reads,
+        including the arrays whose elements it reads.
+    """
+    if key[0] == "variable":
+        return {key[1]}
+    if key[0] == "element":
+        return {key[1]} | key_names(key[2])
+    names = set()
+    for child in key[2:]:
+        names |= key_names(child)
+    return names
+
+
+def key_reads_memory(key: tuple) -> bool:
+    """
+    Returns:
+        bool: True if an expression_key reads an array element.
+    """
+    if key[0] == "element":
+        return True
+    return key[0] in {"binary", "unary"} and any(
+        key_reads_memory(child) for child in key[2:])
+
+
+def walk_expression(expression) -> typing.Iterator:
+    """
+    Returns:
+        typing.Iterator: the nodes of an expression, itself included.
+    """
+    yield expression
+    kind = type(expression)
+    if kind is VariableNode and expression.index is not None:
+        yield from walk_expression(expression.index)
+    elif kind is BinaryNode:
+        yield from walk_expression(expression.left)
+        yield from walk_expression(expression.right)
+    elif kind is UnaryNode:
+        yield from walk_expression(expression.operand)
+    elif kind is CallNode:
+        for argument in expression.arguments:
+            yield from walk_expression(argument)
+
+
+def walk_statements(statements: tuple) -> typing.Iterator:
+    """
+    Returns:
+        typing.Iterator: the statements, and every statement nested in them.
+    """
+    for statement in statements:
+        yield statement
+        if type(statement) is IfNode:
+            yield from walk_statements(statement.statements)
+            if statement.else_statements is not None:
+                yield from walk_statements(statement.else_statements)
+        elif type(statement) is WhileNode:
+            yield from walk_statements(statement.statements)
+
+
+def statement_expressions(statement) -> list:
+    """
+    Returns:
+        list: the expressions a statement evaluates itself, not counting
+        those of the statements nested in it.
+    """
+    kind = type(statement)
+    if kind is LetNode:
+        return [expression for expression in (statement.index,
+                                              statement.value)
+                if expression is not None]
+    if kind is DoNode:
+        return [statement.call]
+    if kind is ReturnNode:
+        return [] if statement.value is None else [statement.value]
+    return [statement.condition]
+
+
+class LoopOptimizer:
+    """Hoists the subexpressions of while loops whose values do not change
+    while the loop runs into hidden locals, assigned right before the loop.
+    Locals and arguments are invariant if the loop does not assign them;
+    fields, statics and array elements only if, in addition, the loop
+    neither calls subroutines nor stores into arrays, which could change
+    them behind its back.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new optimizer."""
+        self.hoisted = 0
+        self.locals = set()
+        self.hidden = []
+
+    def optimize_class(self, class_node: ClassNode) -> ClassNode:
+        """
+        Returns:
+            ClassNode: the class, with the loops of every subroutine
+            optimized.
+        """
+        return ClassNode(class_node.name, class_node.class_vars, tuple(
+            self.optimize_subroutine(subroutine)
+            for subroutine in class_node.subroutines))
+
+    def optimize_subroutine(self,
+                            subroutine: SubroutineNode) -> SubroutineNode:
+        """
+        Returns:
+            SubroutineNode: the subroutine, with the hidden locals of its
+            hoisted values declared after its own locals.
+        """
+        self.locals = {name for _, name in subroutine.parameters}
+        self.locals |= {name for _, name in subroutine.local_vars}
+        self.hidden = []
+        statements = self.optimize_statements(subroutine.statements)
+        if not self.hidden:
+            return subroutine
+        return SubroutineNode(
+            subroutine.kind, subroutine.return_type, subroutine.name,
+            subroutine.parameters, subroutine.local_vars + tuple(
+                (HIDDEN_TYPE, name) for name in self.hidden), statements)
+
+    def optimize_statements(self, statements: tuple) -> tuple:
+        """Optimizes the loops of a sequence of statements, innermost
+        loops first.
+        """
+        optimized = []
+        for statement in statements:
+            if type(statement) is IfNode:
+                statement = IfNode(
+                    statement.condition,
+                    self.optimize_statements(statement.statements),
+                    None if statement.else_statements is None else
+                    self.optimize_statements(statement.else_statements))
+            elif type(statement) is WhileNode:
+                optimized += self.hoist(WhileNode(
+                    statement.condition,
+                    self.optimize_statements(statement.statements)))
+                continue
+            optimized.append(statement)
+        return tuple(optimized)
+
+    def hoist(self, loop: WhileNode) -> list:
+        """
+        Returns:
+            list: the assignments of the invariant values of a loop to
+            hidden locals, followed by the loop reading those instead.
+        """
+        assigned = set()
+        touches_memory = False
+        for statement in walk_statements((loop,)):
+            if type(statement) is LetNode:
+                if statement.index is None:
+                    assigned.add(statement.name)
+                else:
+                    touches_memory = True
+            for expression in statement_expressions(statement):
+                touches_memory = touches_memory or any(
+                    expression_key(node) is None
+                    for node in walk_expression(expression))
+
+        def invariant(key: tuple) -> bool:
+            if key[0] == "constant":
+                return True
+            if key[0] == "variable":
+                return key[1] not in assigned and (
+                    key[1] in self.locals or not touches_memory)
+            if key[0] == "element":
+                return not touches_memory and key[1] not in assigned and \
+                    invariant(key[2])
+            if key[0] == "binary" and key[1] in UNSAFE_OPERATORS:
+                return False
+            return all(invariant(child) for child in key[2:])
+
+        hoisted = {}
+        assignments = []
+
+        def rewrite(expression):
+            key = expression_key(expression)
+            if key is not None and key[0] != "constant" and \
+                    key[0] != "variable" and key_names(key) and \
+                    invariant(key):
+                if key not in hoisted:
+                    hoisted[key] = HIDDEN_PREFIX + str(len(self.hidden))
+                    self.hidden.append(hoisted[key])
+                    self.locals.add(hoisted[key])
+                    assignments.append(LetNode(hoisted[key], None,
+                                               expression))
+                return VariableNode(hoisted[key])
+            kind = type(expression)
+            if kind is VariableNode and expression.index is not None:
+                return VariableNode(expression.name,
+                                    rewrite(expression.index))
+            if kind is BinaryNode:
+                return BinaryNode(expression.operator,
+                                  rewrite(expression.left),
+                                  rewrite(expression.right))
+            if kind is UnaryNode:
+                return UnaryNode(expression.operator,
+                                 rewrite(expression.operand))
+            if kind is CallNode:
+                return CallNode(expression.receiver, expression.name, tuple(
+                    rewrite(argument) for argument in expression.arguments))
+            return expression
+
+        def rewrite_statements(statements: tuple) -> tuple:
+            rewritten = []
+            for statement in statements:
+                kind = type(statement)
+                if kind is LetNode:
+                    statement = LetNode(
+                        statement.name, None if statement.index is None
+                        else rewrite(statement.index),
+                        rewrite(statement.value))
+                elif kind is DoNode:
+                    statement = DoNode(rewrite(statement.call))
+                elif kind is ReturnNode and statement.value is not None:
+                    statement = ReturnNode(rewrite(statement.value))
+                elif kind is IfNode:
+                    statement = IfNode(
+                        rewrite(statement.condition),
+                        rewrite_statements(statement.statements),
+                        None if statement.else_statements is None else
+                        rewrite_statements(statement.else_statements))
+                elif kind is WhileNode:
+                    statement = WhileNode(
+                        rewrite(statement.condition),
+                        rewrite_statements(statement.statements))
+                rewritten.append(statement)
+            return tuple(rewritten)
+
+        loop = WhileNode(rewrite(loop.condition),
+                         rewrite_statements(loop.statements))
+        self.hoisted += len(assignments)
+        return assignments + [loop]
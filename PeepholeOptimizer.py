@@ -0,0 +1,182 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+# rendered VM command lines, as buffered by the VMWriter
+NOT = "not\n"
+NEG = "neg\n"
+PUSH_FALSE = "push constant 0\n"
+PUSH_ONE = "push constant 1\n"
+POP_THAT = "pop that 0\n"
+POP_THAT_POINTER = "pop pointer 1\n"
+# what compile_let emits after the value of an array element assignment
+ARRAY_STORE = ["pop temp 0\n", POP_THAT_POINTER, "push temp 0\n", POP_THAT]
+# values that would change if they were pushed after "pop pointer 1"
+THAT_DEPENDENT = ("push that ", "push pointer 1\n")
+# the commands that push nothing but true (-1) or false (0)
+COMPARISONS = ("eq\n", "gt\n", "lt\n")
+# the prefix of the labels the swapped branches fall through to
+NOT_LABEL_PREFIX = "NOT_"
+
+
+def is_single_push(line: str) -> bool:
+    """
+    Returns:
+        bool: True if the buffered line is a single push command, and no
+        other command follows it in the same entry.
+    """
+    return line.startswith("push ") and line.find("\n") == len(line) - 1
+
+
+class PeepholeOptimizer:
+    """Rewrites wasteful patterns in the VM code of a single function over a
+    sliding window, and removes code and labels that can never be reached.
+    """
+
+    def __init__(self) -> None:
+        """Creates a new optimizer."""
+        self.removed = 0
+
+    def counters(self) -> dict:
+        """
+        Returns:
+            dict: the number of VM commands removed so far.
+        """
+        return {"peephole_removed": self.removed}
+
+    def optimize(self, lines: typing.List[str]) -> typing.List[str]:
+        """Optimizes the VM code of a function until no pattern applies.
+
+        Args:
+            lines (typing.List[str]): the rendered lines of the function,
+            starting with its "function" command.
+
+        Returns:
+            typing.List[str]: the optimized lines.
+        """
+        size = len(lines)
+        while True:
+            old_lines = lines
+            lines = self.remove_unused_labels(
+                self.remove_dead_code(self.rewrite(lines)))
+            if lines == old_lines:
+                break
+        self.removed += size - len(lines)
+        return lines
+
+    def rewrite(self, lines: typing.List[str]) -> typing.List[str]:
+        """Moves a window over the lines, rewriting the patterns that end
+        at the window's last line.
+        """
+        optimized = []
+        for line in lines:
+            optimized.append(line)
+            while self.reduce_tail(optimized):
+                pass
+        return optimized
+
+    def reduce_tail(self, lines: typing.List[str]) -> bool:
+        """Rewrites a single pattern at the end of the given lines.
+
+        Returns:
+            bool: True if a pattern was rewritten, False otherwise.
+        """
+        last = lines[-1] if lines else ""
+        if last == NOT and lines[-2:-1] == [NOT]:
+            del lines[-2:]  # double negation
+        elif last.startswith("if-goto "):
+            goto = "goto " + last[len("if-goto "):]
+            if lines[-4:-1] == [PUSH_ONE, NEG, NOT]:
+                del lines[-4:]  # "true" negated, never jumps
+            elif lines[-3:-1] == [PUSH_ONE, NEG] or \
+                    lines[-3:-1] == [PUSH_FALSE, NOT]:
+                lines[-3:] = [goto]  # "true", always jumps
+            elif lines[-2:-1] == [PUSH_FALSE]:
+                del lines[-2:]  # "false", never jumps
+            elif len(lines) > 1 and \
+                    lines[-2].startswith("push constant "):
+                lines[-2:] = [goto]  # non zero constant, always jumps
+            elif lines[-2:-1] == [NOT] and lines[-3:-2] and \
+                    lines[-3] in COMPARISONS:
+                return self.swap_branch(lines)
+            else:
+                return False
+        elif last.startswith("label "):
+            jump = self.find_jump_over_labels(lines)
+            if jump is None:
+                return False
+            del lines[jump]  # a jump to the very next command
+        elif last == POP_THAT and lines[-4:] == ARRAY_STORE and \
+                len(lines) > 4 and is_single_push(lines[-5]) and \
+                not lines[-5].startswith(THAT_DEPENDENT):
+            # a simple value needs no detour through temp 0
+            lines[-5:] = [POP_THAT_POINTER, lines[-5], POP_THAT]
+        elif last.startswith("pop ") and \
+                lines[-2:-1] == ["push " + last[len("pop "):]]:
+            del lines[-2:]  # a value popped right back where it was
+        else:
+            return False
+        return True
+
+    def swap_branch(self, lines: typing.List[str]) -> bool:
+        """Swaps the targets of the negated comparison and if-goto ending
+        the given lines, as every if and while emits them, so that the
+        comparison is tested directly and the code following it is reached
+        by falling through. Only a comparison may be tested this way, as a
+        "not" and "if-goto" jump on any value but true, and an "if-goto"
+        alone on any value but false.
+
+        Returns:
+            bool: True if the branch was swapped, False if the label it
+            falls through to is already taken.
+        """
+        false_label = lines[-1][len("if-goto "):]
+        true_label = NOT_LABEL_PREFIX + false_label
+        if "label " + true_label in lines:
+            return False
+        lines[-2:] = ["if-goto " + true_label, "goto " + false_label,
+                      "label " + true_label]
+        return True
+
+    def find_jump_over_labels(
+            self, lines: typing.List[str]) -> typing.Optional[int]:
+        """Looks for a goto to the label ending the given lines, separated
+        from it by nothing but other labels.
+
+        Returns:
+            typing.Optional[int]: the index of the goto, or None.
+        """
+        goto = "goto " + lines[-1][len("label "):]
+        index = len(lines) - 2
+        while index >= 0 and lines[index].startswith("label "):
+            index -= 1
+        if index >= 0 and lines[index] == goto:
+            return index
+        return None
+
+    def remove_dead_code(self, lines: typing.List[str]) -> typing.List[str]:
+        """Removes the commands between an unconditional jump or a return
+        and the next label, which can never be executed.
+        """
+        optimized = []
+        reachable = True
+        for line in lines:
+            if line.startswith("label "):
+                reachable = True
+            if reachable:
+                optimized.append(line)
+            if line.startswith("goto ") or line == "return\n":
+                reachable = False
+        return optimized
+
+    def remove_unused_labels(
+            self, lines: typing.List[str]) -> typing.List[str]:
+        """Removes the labels that no goto or if-goto command refers to."""
+        targets = {line[line.index(" ") + 1:] for line in lines
+                   if line.startswith(("goto ", "if-goto "))}
+        return [line for line in lines if not line.startswith("label ") or
+                line[len("label "):] in targets]
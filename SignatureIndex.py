@@ -0,0 +1,212 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import io
+import json
+import os
+import typing
+from BuildCache import hash_file
+from JackTokenizer import JackTokenizer
+
+SIGNATURES_NAME = ".jacksignatures.json"
+# bumped whenever scan_signatures changes, to drop cached signatures
+SIGNATURES_VERSION = 1
+# signature indices
+SIGNATURE_KIND = 0
+SIGNATURE_PARAMS = 1
+SIGNATURE_RETURN_TYPE = 2
+SUBROUTINE_KINDS = {"constructor", "function", "method"}
+# the (kind, number of parameters, return type) of every Jack OS subroutine
+OS_SIGNATURES = {
+    "Math.init": ("function", 0, "void"),
+    "Math.abs": ("function", 1, "int"),
+    "Math.multiply": ("function", 2, "int"),
+    "Math.divide": ("function", 2, "int"),
+    "Math.min": ("function", 2, "int"),
+    "Math.max": ("function", 2, "int"),
+    "Math.sqrt": ("function", 1, "int"),
+    "String.new": ("constructor", 1, "String"),
+    "String.dispose": ("method", 0, "void"),
+    "String.length": ("method", 0, "int"),
+    "String.charAt": ("method", 1, "char"),
+    "String.setCharAt": ("method", 2, "void"),
+    "String.appendChar": ("method", 1, "String"),
+    "String.eraseLastChar": ("method", 0, "void"),
+    "String.intValue": ("method", 0, "int"),
+    "String.setInt": ("method", 1, "void"),
+    "String.backSpace": ("function", 0, "char"),
+    "String.doubleQuote": ("function", 0, "char"),
+    "String.newLine": ("function", 0, "char"),
+    "Array.new": ("function", 1, "Array"),
+    "Array.dispose": ("method", 0, "void"),
+    "Output.init": ("function", 0, "void"),
+    "Output.moveCursor": ("function", 2, "void"),
+    "Output.printChar": ("function", 1, "void"),
+    "Output.printString": ("function", 1, "void"),
+    "Output.printInt": ("function", 1, "void"),
+    "Output.println": ("function", 0, "void"),
+    "Output.backSpace": ("function", 0, "void"),
+    "Screen.init": ("function", 0, "void"),
+    "Screen.clearScreen": ("function", 0, "void"),
+    "Screen.setColor": ("function", 1, "void"),
+    "Screen.drawPixel": ("function", 2, "void"),
+    "Screen.drawLine": ("function", 4, "void"),
+    "Screen.drawRectangle": ("function", 4, "void"),
+    "Screen.drawCircle": ("function", 3, "void"),
+    "Keyboard.init": ("function", 0, "void"),
+    "Keyboard.keyPressed": ("function", 0, "char"),
+    "Keyboard.readChar": ("function", 0, "char"),
+    "Keyboard.readLine": ("function", 1, "String"),
+    "Keyboard.readInt": ("function", 1, "int"),
+    "Memory.init": ("function", 0, "void"),
+    "Memory.peek": ("function", 1, "int"),
+    "Memory.poke": ("function", 2, "void"),
+    "Memory.alloc": ("function", 1, "Array"),
+    "Memory.deAlloc": ("function", 1, "void"),
+    "Sys.init": ("function", 0, "void"),
+    "Sys.halt": ("function", 0, "void"),
+    "Sys.error": ("function", 1, "void"),
+    "Sys.wait": ("function", 1, "void"),
+}
+
+
+class SignatureError(Exception):
+    """Raised for calls that do not match the signature they call."""
+
+
+def scan_signatures(source: str) -> dict:
+    """Finds the subroutine declarations of a class without compiling it.
+
+    Args:
+        source (str): the Jack source of a class.
+
+    Returns:
+        dict: the (kind, number of parameters, return type) of every
+        subroutine of the class, by its full name.
+    """
+    tokens = JackTokenizer(io.StringIO(source)).all_tokens
+    class_name = tokens[1]
+    signatures = {}
+    depth = 0
+    for index, token in enumerate(tokens):
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+        elif depth == 1 and token in SUBROUTINE_KINDS:
+            # kind, return type, name, "(", then the parameters
+            end = tokens.index(")", index + 4)
+            parameters = tokens[index + 4:end]
+            n_params = parameters.count(",") + 1 if parameters else 0
+            signatures[class_name + "." + tokens[index + 2]] = (
+                token, n_params, tokens[index + 1])
+    return signatures
+
+
+class SignatureIndex:
+    """The signatures of every subroutine a program may call: those of its
+    own classes and those of the Jack OS classes it does not replace.
+    """
+
+    def __init__(self, class_signatures: typing.Iterable[dict] = ()) -> None:
+        """Creates a new index.
+
+        Args:
+            class_signatures (typing.Iterable[dict]): the signatures of every
+            class of the program, as returned by scan_signatures.
+        """
+        self.program_signatures = {}
+        for signatures in class_signatures:
+            self.program_signatures.update(signatures)
+        self.classes = {name.split(".")[0] for name in OS_SIGNATURES}
+        replaced = {name.split(".")[0] for name in self.program_signatures}
+        self.classes |= replaced
+        self.signatures = {
+            name: signature for name, signature in OS_SIGNATURES.items()
+            if name.split(".")[0] not in replaced}
+        self.signatures.update(self.program_signatures)
+
+    def get(self, func_name: str) -> typing.Optional[tuple]:
+        """
+        Args:
+            func_name (str): the full name of a subroutine, Class.name.
+
+        Returns:
+            typing.Optional[tuple]: the signature of the subroutine, or None
+            if its class is not indexed.
+
+        Raises:
+            SignatureError: if the class is indexed, but has no such
+            subroutine.
+        """
+        signature = self.signatures.get(func_name)
+        if signature is None and func_name.split(".")[0] in self.classes:
+            raise SignatureError("{} is not defined".format(func_name))
+        return signature
+
+    def digest(self) -> str:
+        """
+        Returns:
+            str: a hex digest of the program's signatures, which changes
+            whenever the code compiled against them may change.
+        """
+        return hashlib.sha256(json.dumps(
+            sorted(self.program_signatures.items())).encode()).hexdigest()
+
+
+def index_files(input_paths: list,
+                cache_directory: typing.Optional[str] = None
+                ) -> SignatureIndex:
+    """Indexes the signatures of the given .jack files. The signatures of
+    every file are cached by content hash in the given directory, so only
+    the files that changed since the last build are scanned again.
+
+    Args:
+        input_paths (list): the .jack files of the program.
+        cache_directory (typing.Optional[str]): where to keep the cache, or
+        None to scan every file.
+
+    Returns:
+        SignatureIndex: the index of the files.
+    """
+    cached = {}
+    cache_path = None
+    if cache_directory is not None:
+        cache_path = os.path.join(cache_directory, SIGNATURES_NAME)
+        try:
+            with open(cache_path, 'r') as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("version") == SIGNATURES_VERSION:
+                cached = cache["files"]
+        except (OSError, ValueError, AttributeError, KeyError):
+            pass
+    files = {}
+    for input_path in input_paths:
+        name = os.path.basename(input_path)
+        source_hash = hash_file(input_path)
+        if name in cached and cached[name][0] == source_hash:
+            files[name] = cached[name]
+            continue
+        with open(input_path, 'r') as source_file:
+            source = source_file.read()
+        try:
+            signatures = scan_signatures(source)
+        except (IndexError, ValueError):  # reported when it is compiled
+            signatures = {}
+        files[name] = [source_hash, {func_name: list(signature)
+                                     for func_name, signature
+                                     in signatures.items()}]
+    if cache_path is not None and files != cached:
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temp_path, 'w') as cache_file:
+            json.dump({"version": SIGNATURES_VERSION, "files": files},
+                      cache_file, indent=1, sort_keys=True)
+        os.replace(temp_path, cache_path)
+    return SignatureIndex(
+        {func_name: tuple(signature)
+         for func_name, signature in signatures.items()}
+        for _, signatures in files.values())
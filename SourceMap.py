@@ -0,0 +1,192 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Source maps, linking every line of a .vm file to the Jack source line and
+subroutine it was compiled from. A map is a .vm.map file next to the .vm
+file: a header line naming the Jack file, then a line per VM function,
+holding its name and its source lines as runs. A run is the difference from
+the source line of the run before it, followed by "x" and the number of VM
+lines in the run if there is more than one, like "Main.main 3x2 1 -1x4".
+"""
+import typing
+from VMWriter import VMWriter, TAIL_CALL_LABEL
+
+MAP_SUFFIX = ".map"
+MAP_HEADER = "jack-vm-map 1"
+
+
+class SourceLine(str):
+    """A rendered VM command that remembers the source line it was compiled
+    from, while the optimizers treat it as any other line.
+    """
+
+    def __new__(cls, line: str, position: int) -> "SourceLine":
+        source_line = super().__new__(cls, line)
+        source_line.position = position
+        return source_line
+
+
+def encode(source_name: str, functions: typing.List[tuple]) -> str:
+    """
+    Args:
+        source_name (str): the name of the Jack file.
+        functions (typing.List[tuple]): a (name, runs) pair for every VM
+        function, in order, where every run is a (source line, number of VM
+        lines) pair.
+
+    Returns:
+        str: the text of the source map.
+    """
+    text = [MAP_HEADER + " " + source_name + "\n"]
+    previous = 0
+    for name, runs in functions:
+        encoded = [name]
+        for position, count in runs:
+            encoded.append(str(position - previous) if count == 1 else
+                           "{}x{}".format(position - previous, count))
+            previous = position
+        text.append(" ".join(encoded) + "\n")
+    return "".join(text)
+
+
+def decode(text: str) -> tuple:
+    """
+    Returns:
+        tuple: the name of the Jack file, and the (subroutine, source line)
+        pair of every line of the .vm file.
+    """
+    lines = text.splitlines()
+    if not lines or not lines[0].startswith(MAP_HEADER + " "):
+        raise ValueError("not a source map")
+    positions = []
+    previous = 0
+    for line in lines[1:]:
+        name, *runs = line.split()
+        for run in runs:
+            delta, _, count = run.partition("x")
+            previous += int(delta)
+            positions += [(name, previous)] * int(count or 1)
+    return lines[0][len(MAP_HEADER) + 1:], positions
+
+
+def read_source_map(path: str) -> tuple:
+    """
+    Args:
+        path (str): the path of the .vm.map file.
+
+    Returns:
+        tuple: the decoded source map, as decode returns it.
+    """
+    with open(path, 'r') as map_file:
+        return decode(map_file.read())
+
+
+def hotspots(line_counts: dict, maps: dict) -> typing.List[tuple]:
+    """Rolls a profile of the executed VM lines up into source lines.
+
+    Args:
+        line_counts (dict): the times every VM line was executed, by
+        (.vm file name, index of the line in the file) pair.
+        maps (dict): the decoded source map of every .vm file, by name.
+        Lines of files without a map are left out.
+
+    Returns:
+        typing.List[tuple]: a (count, Jack file, source line, subroutine)
+        quadruplet for every source line that ran, the hottest first.
+    """
+    counts = {}
+    for (file_name, vm_line), count in line_counts.items():
+        if file_name not in maps:
+            continue
+        source_name, positions = maps[file_name]
+        subroutine, line = positions[vm_line]
+        key = source_name, line, subroutine
+        counts[key] = counts.get(key, 0) + count
+    return sorted(((count,) + key for key, count in counts.items()),
+                  key=lambda hotspot: (-hotspot[0],) + hotspot[1:])
+
+
+class MappingWriter(VMWriter):
+    """A VMWriter that keeps the source line of every command it writes, for
+    the source map. The compilation engine marks the source line of the
+    commands it writes next. The lines of a function are tagged with their
+    positions before the optimizers see them: the commands the optimizers
+    keep carry their positions through, and the commands they create take
+    the position of the next command that kept its own. The function
+    command is marked on its own, with the line of the declaration.
+    """
+
+    def __init__(self, output_stream: typing.TextIO,
+                 optimizers: typing.Sequence = ()) -> None:
+        super().__init__(output_stream, optimizers)
+        self.position = 0
+        # (index in lines, source line) pairs of the current function
+        self.marks = []
+        # (name, runs) pairs of the functions written so far, as encode
+        # takes them
+        self.functions = []
+
+    def mark(self, position: int) -> None:
+        """Sets the source line of the commands written from now on."""
+        self.position = position
+        self.marks.append((len(self.lines), position))
+
+    def write_function(self, name: str, n_locals: int) -> None:
+        super().write_function(name, n_locals)
+        self.marks = [(len(self.lines) - 1, self.position),
+                      (len(self.lines), self.position)]
+
+    def write_tail_call(self, n_args: int, n_locals: int) -> None:
+        start = self.function_start + 1
+        inserted = self.lines[start] != "label " + TAIL_CALL_LABEL + "\n"
+        super().write_tail_call(n_args, n_locals)
+        if inserted:  # the commands after the label moved down by one
+            self.marks = [(index + (index >= start), position)
+                          for index, position in self.marks]
+
+    def end_function(self) -> typing.List[str]:
+        start = self.function_start
+        # only the first and the last command of every run of commands
+        # marked with the same line are tagged, which is cheaper than
+        # tagging every command and says the same
+        ends = [index for index, _ in self.marks[1:]] + [len(self.lines)]
+        for (begin, position), end in zip(self.marks, ends):
+            begin = max(begin, start)
+            if begin < end:
+                self.lines[begin] = SourceLine(self.lines[begin], position)
+                self.lines[end - 1] = SourceLine(self.lines[end - 1],
+                                                 position)
+        self.marks = []
+        declaration = getattr(self.lines[start], "position", None) \
+            if start < len(self.lines) else None
+        lines = super().end_function()
+        if lines:
+            positions = [getattr(line, "position", None) for line in lines]
+            # the function command may be rewritten, but stays first
+            positions[0] = declaration
+            position = None
+            for index in reversed(range(len(positions))):
+                if positions[index] is None:
+                    positions[index] = position
+                else:
+                    position = positions[index]
+            # the commands at the end of the function without a position of
+            # their own take the position of the command before them
+            runs = []
+            for position in positions:
+                if position is None or runs and runs[-1][0] == position:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([position, 1])
+            self.functions.append((lines[0].split()[1], runs))
+        return lines
+
+    def source_map(self, source_name: str) -> str:
+        """
+        Returns:
+            str: the source map of the functions written so far.
+        """
+        return encode(source_name, self.functions)
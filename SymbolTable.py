@@ -58,7 +58,7 @@ class SymbolTable:
                 self.count_var += 1
         elif kind in {"static", "field"}:
             self.class_table[name] = cur_sym
-            if kind == "STATIC":
+            if kind == "static":
                 self.count_static += 1
             else:
                 self.count_field += 1
@@ -0,0 +1,681 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import sys
+import typing
+from SourceMap import MAP_SUFFIX, hotspots, read_source_map
+
+RAM_SIZE = 32768
+STACK_BASE = 256
+STATIC_BASE = 16
+STATIC_END = 256
+HEAP_BASE = 2048
+HEAP_END = 16384
+KEYBOARD = 24576
+TEMP_BASE = 5
+# base registers of the segments whose address is held in RAM
+SEGMENT_REGISTERS = {"local": 1, "argument": 2, "this": 3, "that": 4}
+DEFAULT_LIMIT = 50000000
+# the keys and characters of the Hack character set
+NEW_LINE = 128
+BACKSPACE = 129
+DOUBLE_QUOTE = 34
+
+# the opcodes of the loaded program, in the order the interpreter tests them
+(PUSH_CONSTANT, PUSH_LOCAL, PUSH_ARGUMENT, PUSH_INDIRECT, PUSH_DIRECT,
+ POP_LOCAL, POP_ARGUMENT, POP_INDIRECT, POP_DIRECT, ADD, SUB, NEG, EQ, GT,
+ LT, AND, OR, NOT, GOTO, IF_GOTO, FUNCTION, CALL, CALL_NATIVE, RETURN,
+ HALT) = range(25)
+ARITHMETIC = {"add": ADD, "sub": SUB, "neg": NEG, "eq": EQ, "gt": GT,
+              "lt": LT, "and": AND, "or": OR, "not": NOT}
+
+
+class VMError(Exception):
+    """Raised for programs that cannot be loaded or that fail while running,
+    like the Sys.error of the Jack OS.
+    """
+
+
+class VMHalt(Exception):
+    """Raised by Sys.halt to stop the program."""
+
+
+def wrap(value: int) -> int:
+    """
+    Returns:
+        int: the value wrapped around to a signed 16 bit integer.
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+class JackOS:
+    """A minimal stand-in for the Jack OS, implemented natively on the RAM of
+    the emulator. Output is collected as text, the screen is not drawn, and
+    the keyboard replays a script.
+    """
+
+    def __init__(self, ram: list, keys: typing.Iterable[int] = (),
+                 typed: str = "") -> None:
+        """Creates a new OS.
+
+        Args:
+            ram (list): the RAM of the emulator.
+            keys (typing.Iterable[int]): the keys Keyboard.keyPressed
+            returns, one per call. It returns 0 once they run out.
+            typed (str): the text the Keyboard read functions read.
+        """
+        self.ram = ram
+        self.keys = iter(keys)
+        self.typed = iter(typed)
+        self.output = []
+        self.free_blocks = [(HEAP_BASE, HEAP_END - HEAP_BASE)]
+        self.block_sizes = {}
+
+    def functions(self) -> dict:
+        """
+        Returns:
+            dict: the native implementation of every OS subroutine, by name.
+        """
+        return {
+            "Math.init": self.init, "Math.abs": lambda x: wrap(abs(x)),
+            "Math.multiply": self.multiply, "Math.divide": self.divide,
+            "Math.min": min, "Math.max": max, "Math.sqrt": self.sqrt,
+            "Memory.init": self.init, "Memory.peek": self.peek,
+            "Memory.poke": self.poke, "Memory.alloc": self.alloc,
+            "Memory.deAlloc": self.de_alloc,
+            "Array.new": self.array_new, "Array.dispose": self.de_alloc,
+            "String.new": self.string_new, "String.dispose": self.de_alloc,
+            "String.length": self.string_length,
+            "String.charAt": self.char_at,
+            "String.setCharAt": self.set_char_at,
+            "String.appendChar": self.append_char,
+            "String.eraseLastChar": self.erase_last_char,
+            "String.intValue": self.int_value, "String.setInt": self.set_int,
+            "String.backSpace": lambda: BACKSPACE,
+            "String.doubleQuote": lambda: DOUBLE_QUOTE,
+            "String.newLine": lambda: NEW_LINE,
+            "Output.init": self.init, "Output.moveCursor": self.ignore,
+            "Output.printChar": self.print_char,
+            "Output.printString": self.print_string,
+            "Output.printInt": self.print_int, "Output.println": self.println,
+            "Output.backSpace": self.back_space,
+            "Screen.init": self.init, "Screen.clearScreen": self.ignore,
+            "Screen.setColor": self.ignore, "Screen.drawPixel": self.ignore,
+            "Screen.drawLine": self.ignore,
+            "Screen.drawRectangle": self.ignore,
+            "Screen.drawCircle": self.ignore,
+            "Keyboard.init": self.init,
+            "Keyboard.keyPressed": self.key_pressed,
+            "Keyboard.readChar": self.read_char,
+            "Keyboard.readLine": self.read_line,
+            "Keyboard.readInt": self.read_int,
+            "Sys.halt": self.halt, "Sys.error": self.error,
+            "Sys.wait": self.ignore}
+
+    def output_text(self) -> str:
+        """
+        Returns:
+            str: everything the program printed.
+        """
+        return "".join(self.output)
+
+    def init(self) -> None:
+        pass
+
+    def ignore(self, *arguments) -> None:
+        pass
+
+    def halt(self) -> None:
+        raise VMHalt()
+
+    def error(self, code: int) -> None:
+        raise VMError("Sys.error {}".format(code))
+
+    def multiply(self, x: int, y: int) -> int:
+        return wrap(x * y)
+
+    def divide(self, x: int, y: int) -> int:
+        if y == 0:
+            self.error(3)
+        quotient = abs(x) // abs(y)
+        return wrap(-quotient if (x < 0) != (y < 0) else quotient)
+
+    def sqrt(self, x: int) -> int:
+        if x < 0:
+            self.error(4)
+        root = int(x ** 0.5)
+        while root * root > x:
+            root -= 1
+        return root
+
+    def peek(self, address: int) -> int:
+        return self.ram[address]
+
+    def poke(self, address: int, value: int) -> None:
+        self.ram[address] = value
+
+    def alloc(self, size: int) -> int:
+        """Allocates a block with the first fit of the free blocks."""
+        if size <= 0:
+            self.error(5)
+        for index, (address, free_size) in enumerate(self.free_blocks):
+            if free_size >= size:
+                if free_size == size:
+                    del self.free_blocks[index]
+                else:
+                    self.free_blocks[index] = (address + size,
+                                               free_size - size)
+                self.block_sizes[address] = size
+                return address
+        self.error(6)
+
+    def de_alloc(self, address: int) -> None:
+        size = self.block_sizes.pop(address, None)
+        if size is not None:
+            self.free_blocks.append((address, size))
+
+    def array_new(self, size: int) -> int:
+        if size <= 0:
+            self.error(2)
+        return self.alloc(size)
+
+    # a string is a block holding its capacity, its length and its chars
+    def string_new(self, max_length: int) -> int:
+        if max_length < 0:
+            self.error(14)
+        address = self.alloc(max_length + 2)
+        self.ram[address] = max_length
+        self.ram[address + 1] = 0
+        return address
+
+    def string_length(self, string: int) -> int:
+        return self.ram[string + 1]
+
+    def char_at(self, string: int, index: int) -> int:
+        if not 0 <= index < self.ram[string + 1]:
+            self.error(15)
+        return self.ram[string + 2 + index]
+
+    def set_char_at(self, string: int, index: int, char: int) -> None:
+        if not 0 <= index < self.ram[string + 1]:
+            self.error(16)
+        self.ram[string + 2 + index] = char
+
+    def append_char(self, string: int, char: int) -> int:
+        length = self.ram[string + 1]
+        if length == self.ram[string]:
+            self.error(17)
+        self.ram[string + 2 + length] = char
+        self.ram[string + 1] = length + 1
+        return string
+
+    def erase_last_char(self, string: int) -> None:
+        if self.ram[string + 1] == 0:
+            self.error(18)
+        self.ram[string + 1] -= 1
+
+    def string_of(self, string: int) -> str:
+        length = self.ram[string + 1]
+        return "".join(map(chr, self.ram[string + 2:string + 2 + length]))
+
+    def int_value(self, string: int) -> int:
+        text = self.string_of(string)
+        digits = text[1:] if text.startswith("-") else text
+        value = 0
+        for char in digits:
+            if not char.isdigit():
+                break
+            value = value * 10 + int(char)
+        return wrap(-value if text.startswith("-") else value)
+
+    def set_int(self, string: int, value: int) -> None:
+        text = str(value)
+        if len(text) > self.ram[string]:
+            self.error(19)
+        self.ram[string + 2:string + 2 + len(text)] = map(ord, text)
+        self.ram[string + 1] = len(text)
+
+    def print_char(self, char: int) -> None:
+        if char == NEW_LINE:
+            self.output.append("\n")
+        elif char == BACKSPACE:
+            self.back_space()
+        else:
+            self.output.append(chr(char))
+
+    def print_string(self, string: int) -> None:
+        self.output.append(self.string_of(string))
+
+    def print_int(self, value: int) -> None:
+        self.output.append(str(value))
+
+    def println(self) -> None:
+        self.output.append("\n")
+
+    def back_space(self) -> None:
+        if self.output:
+            self.output[-1] = self.output[-1][:-1]
+
+    def key_pressed(self) -> int:
+        self.ram[KEYBOARD] = next(self.keys, 0)
+        return self.ram[KEYBOARD]
+
+    def read_char(self) -> int:
+        char = next(self.typed, None)
+        if char is None:
+            raise VMError("Keyboard read past the end of the typed input")
+        char = NEW_LINE if char == "\n" else ord(char)
+        self.print_char(char)
+        return char
+
+    def read_line(self, message: int) -> int:
+        self.print_string(message)
+        chars = []
+        char = self.read_char()
+        while char != NEW_LINE:
+            chars.append(char)
+            char = self.read_char()
+        line = self.string_new(max(len(chars), 1))
+        for char in chars:
+            self.append_char(line, char)
+        return line
+
+    def read_int(self, message: int) -> int:
+        line = self.read_line(message)
+        value = self.int_value(line)
+        self.de_alloc(line)
+        return value
+
+
+class VMEmulator:
+    """Runs a program of .vm files on the Hack VM, with the Jack OS replaced
+    by the JackOS stand-in wherever the program does not define it.
+    Counts the VM commands the program executes and the calls of every
+    function. Labels take no time, calls to the OS count as one command.
+    """
+
+    def __init__(self, files: dict, keys: typing.Iterable[int] = (),
+                 typed: str = "",
+                 memory: typing.Optional[dict] = None) -> None:
+        """Loads a program.
+
+        Args:
+            files (dict): the lines of every .vm file, by file name.
+            keys (typing.Iterable[int]): the keys Keyboard.keyPressed
+            returns, one per call.
+            typed (str): the text typed into Keyboard.readChar.
+            memory (dict): initial RAM values, by address.
+        """
+        self.ram = [0] * RAM_SIZE
+        for address, value in (memory or {}).items():
+            self.ram[address] = value
+        self.os = JackOS(self.ram, keys, typed)
+        self.function_names = []
+        self.program = []
+        # the (file name, line index) of every command of the program
+        self.origins = []
+        self.load(files)
+        self.calls = [0] * len(self.function_names)
+        self.exclusive = [0] * len(self.function_names)
+        # the times execution jumped to every command, and the times every
+        # if-goto jumped, from which line_profile counts every command
+        self.starts = [0] * len(self.program)
+        self.taken = [0] * len(self.program)
+        self.executed = 0
+        self.halted = False
+
+    def load(self, files: dict) -> None:
+        """Translates the commands of the files into tuples of an opcode and
+        its operands, with every label and function resolved to its index.
+        Execution starts in Sys.init, or in Main.main if there is no Sys.init.
+        """
+        commands = []  # (file, line index, function, command) quadruplets
+        entries = {}
+        labels = {}
+        static_base = STATIC_BASE
+        static_bases = {}
+        for file_name, lines in files.items():
+            static_bases[file_name] = static_base
+            static_count = 0
+            function_name = None
+            for index, line in enumerate(lines):
+                command = line.split("//")[0].split()
+                if not command:
+                    continue
+                if command[0] == "function":
+                    function_name = command[1]
+                    entries[function_name] = len(commands) + 2
+                elif command[0] == "label":
+                    labels[function_name, command[1]] = len(commands) + 2
+                    continue
+                elif command[1:2] == ["static"]:
+                    static_count = max(static_count, int(command[2]) + 1)
+                commands.append((file_name, index, function_name, command))
+            static_base += static_count
+        if static_base > STATIC_END:
+            raise VMError("too many static variables")
+        natives = self.os.functions()
+        function_ids = {}
+
+        def function_id(name: str) -> int:
+            if name not in function_ids:
+                function_ids[name] = len(self.function_names)
+                self.function_names.append(name)
+            return function_ids[name]
+
+        def call(name: str, arguments: int) -> tuple:
+            if name in entries:
+                return CALL, entries[name], arguments, function_id(name)
+            if name in natives:
+                return CALL_NATIVE, natives[name], arguments, function_id(name)
+            raise VMError("call to undefined function {}".format(name))
+
+        entry = "Sys.init" if "Sys.init" in entries else "Main.main"
+        self.program = [call(entry, 0), (HALT,)]
+        self.origins = [None, None]
+        for file_name, index, function_name, command in commands:
+            self.origins.append((file_name, index))
+            if command[0] in {"push", "pop"}:
+                self.program.append(self.translate_memory_access(
+                    command, static_bases[file_name]))
+            elif command[0] in ARITHMETIC:
+                self.program.append((ARITHMETIC[command[0]],))
+            elif command[0] in {"goto", "if-goto"}:
+                if (function_name, command[1]) not in labels:
+                    raise VMError("undefined label {} in {}".format(
+                        command[1], function_name))
+                self.program.append((GOTO if command[0] == "goto"
+                                     else IF_GOTO,
+                                     labels[function_name, command[1]]))
+            elif command[0] == "function":
+                self.program.append((FUNCTION, (0,) * int(command[2])))
+            elif command[0] == "call":
+                self.program.append(call(command[1], int(command[2])))
+            elif command[0] == "return":
+                self.program.append((RETURN,))
+            else:
+                raise VMError("unknown command " + " ".join(command))
+
+    @staticmethod
+    def translate_memory_access(command: list, static_base: int) -> tuple:
+        """
+        Returns:
+            tuple: the opcode and operands of a push or pop command.
+        """
+        push = command[0] == "push"
+        segment, index = command[1], int(command[2])
+        if segment == "constant":
+            return PUSH_CONSTANT, index
+        if segment == "local":
+            return (PUSH_LOCAL if push else POP_LOCAL), index
+        if segment == "argument":
+            return (PUSH_ARGUMENT if push else POP_ARGUMENT), index
+        if segment in SEGMENT_REGISTERS:
+            return (PUSH_INDIRECT if push else POP_INDIRECT), \
+                SEGMENT_REGISTERS[segment], index
+        if segment == "static":
+            address = static_base + index
+        elif segment == "temp":
+            address = TEMP_BASE + index
+        elif segment == "pointer":
+            address = 3 + index
+        else:
+            raise VMError("unknown segment " + segment)
+        return (PUSH_DIRECT if push else POP_DIRECT), address
+
+    def run(self, limit: int = DEFAULT_LIMIT) -> bool:
+        """Runs the program until it halts or has executed about limit
+        commands. The limit is only checked on jumps and calls.
+
+        Returns:
+            bool: True if the program halted, False if it hit the limit.
+        """
+        ram = self.ram
+        program = self.program
+        calls = self.calls
+        exclusive = self.exclusive
+        starts = self.starts
+        taken = self.taken
+        callers = []
+        sp, lcl, arg = STACK_BASE, 0, 0
+        pc = 0
+        executed = 0
+        mark = 0  # the executed count the current function was charged up to
+        current = program[0][3]
+        starts[pc] += 1
+        try:
+            while True:
+                instruction = program[pc]
+                op = instruction[0]
+                pc += 1
+                executed += 1
+                if op == PUSH_CONSTANT:
+                    ram[sp] = instruction[1]
+                    sp += 1
+                elif op == PUSH_LOCAL:
+                    ram[sp] = ram[lcl + instruction[1]]
+                    sp += 1
+                elif op == PUSH_ARGUMENT:
+                    ram[sp] = ram[arg + instruction[1]]
+                    sp += 1
+                elif op == PUSH_INDIRECT:
+                    ram[sp] = ram[ram[instruction[1]] + instruction[2]]
+                    sp += 1
+                elif op == PUSH_DIRECT:
+                    ram[sp] = ram[instruction[1]]
+                    sp += 1
+                elif op == POP_LOCAL:
+                    sp -= 1
+                    ram[lcl + instruction[1]] = ram[sp]
+                elif op == POP_ARGUMENT:
+                    sp -= 1
+                    ram[arg + instruction[1]] = ram[sp]
+                elif op == POP_INDIRECT:
+                    sp -= 1
+                    ram[ram[instruction[1]] + instruction[2]] = ram[sp]
+                elif op == POP_DIRECT:
+                    sp -= 1
+                    ram[instruction[1]] = ram[sp]
+                elif op == ADD:
+                    sp -= 1
+                    value = ram[sp - 1] + ram[sp]
+                    if not -32768 <= value <= 32767:
+                        value = wrap(value)
+                    ram[sp - 1] = value
+                elif op == SUB:
+                    sp -= 1
+                    value = ram[sp - 1] - ram[sp]
+                    if not -32768 <= value <= 32767:
+                        value = wrap(value)
+                    ram[sp - 1] = value
+                elif op == NEG:
+                    ram[sp - 1] = wrap(-ram[sp - 1])
+                elif op == EQ:
+                    sp -= 1
+                    ram[sp - 1] = -(ram[sp - 1] == ram[sp])
+                elif op == GT:
+                    sp -= 1
+                    ram[sp - 1] = -(ram[sp - 1] > ram[sp])
+                elif op == LT:
+                    sp -= 1
+                    ram[sp - 1] = -(ram[sp - 1] < ram[sp])
+                elif op == AND:
+                    sp -= 1
+                    ram[sp - 1] &= ram[sp]
+                elif op == OR:
+                    sp -= 1
+                    ram[sp - 1] |= ram[sp]
+                elif op == NOT:
+                    ram[sp - 1] = ~ram[sp - 1]
+                elif op == GOTO:
+                    pc = instruction[1]
+                    starts[pc] += 1
+                    if executed >= limit:
+                        return False
+                elif op == IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        taken[pc - 1] += 1
+                        pc = instruction[1]
+                        starts[pc] += 1
+                    if executed >= limit:
+                        return False
+                elif op == FUNCTION:
+                    zeros = instruction[1]
+                    ram[sp:sp + len(zeros)] = zeros
+                    sp += len(zeros)
+                elif op == CALL:
+                    callee = instruction[3]
+                    calls[callee] += 1
+                    exclusive[current] += executed - mark
+                    mark = executed
+                    callers.append(current)
+                    current = callee
+                    ram[sp] = pc
+                    ram[sp + 1] = lcl
+                    ram[sp + 2] = arg
+                    ram[sp + 3] = ram[3]
+                    ram[sp + 4] = ram[4]
+                    arg = sp - instruction[2]
+                    sp += 5
+                    lcl = sp
+                    pc = instruction[1]
+                    starts[pc] += 1
+                    if executed >= limit:
+                        return False
+                elif op == CALL_NATIVE:
+                    calls[instruction[3]] += 1
+                    sp -= instruction[2]
+                    value = instruction[1](*ram[sp:sp + instruction[2]])
+                    ram[sp] = value or 0
+                    sp += 1
+                elif op == RETURN:
+                    exclusive[current] += executed - mark
+                    mark = executed
+                    current = callers.pop()
+                    pc = ram[lcl - 5]
+                    starts[pc] += 1
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    ram[4] = ram[lcl - 1]
+                    ram[3] = ram[lcl - 2]
+                    arg = ram[lcl - 3]
+                    lcl = ram[lcl - 4]
+                else:  # HALT
+                    executed -= 1
+                    pc -= 1
+                    raise VMHalt()
+        except VMHalt:
+            self.halted = True
+            return True
+        except IndexError:
+            raise VMError("memory access out of range at command {}"
+                          .format(pc - 1))
+        finally:
+            starts[pc] -= 1  # the command that would have run next
+            exclusive[current] += executed - mark
+            self.executed += executed
+            ram[0], ram[1], ram[2] = sp, lcl, arg
+
+    def profile(self) -> dict:
+        """
+        Returns:
+            dict: the number of calls and of commands executed in the body of
+            every function that was called, by name.
+        """
+        return {name: {"calls": self.calls[index],
+                       "instructions": self.exclusive[index]}
+                for index, name in enumerate(self.function_names)
+                if self.calls[index]}
+
+    def line_profile(self) -> dict:
+        """
+        Returns:
+            dict: the number of times every command that ran was executed,
+            by the (file name, line index) pair of its line.
+        """
+        counts = {}
+        count = 0
+        for index, instruction in enumerate(self.program):
+            count += self.starts[index]
+            if count and self.origins[index] is not None:
+                counts[self.origins[index]] = count
+            if instruction[0] in {GOTO, CALL, RETURN, HALT}:
+                count = 0  # the next command only runs when jumped to
+            else:
+                count -= self.taken[index]
+        return counts
+
+
+def read_vm_files(argument_path: str) -> dict:
+    """
+    Args:
+        argument_path (str): a .vm file or a directory of .vm files.
+
+    Returns:
+        dict: the lines of every .vm file, by file name.
+    """
+    if os.path.isdir(argument_path):
+        paths = [os.path.join(argument_path, filename)
+                 for filename in sorted(os.listdir(argument_path))]
+    else:
+        paths = [argument_path]
+    files = {}
+    for path in paths:
+        if os.path.splitext(path)[1].lower() == ".vm":
+            with open(path, 'r') as vm_file:
+                files[os.path.basename(path)] = vm_file.readlines()
+    return files
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(prog="VMEmulator")
+    parser.add_argument("input_path")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help="stop after about this many VM commands")
+    parser.add_argument("--keys", type=int, nargs="*", default=[],
+                        help="the keys Keyboard.keyPressed returns")
+    parser.add_argument("--input", default="",
+                        help="the text typed into the Keyboard read "
+                             "functions")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the calls and commands of every function")
+    parser.add_argument("--hotspots", type=int, metavar="N",
+                        help="print the N Jack source lines that executed "
+                             "the most commands, from the .vm.map files")
+    args = parser.parse_args()
+    vm_files = read_vm_files(args.input_path)
+    emulator = VMEmulator(vm_files, args.keys,
+                          args.input.replace("\\n", "\n"))
+    try:
+        halted = emulator.run(args.limit)
+    except VMError as error:
+        print(emulator.os.output_text())
+        print("VMEmulator: {}".format(error), file=sys.stderr)
+        sys.exit(1)
+    print(emulator.os.output_text())
+    print("{} after {} VM commands".format(
+        "halted" if halted else "stopped", emulator.executed))
+    if args.profile:
+        for function_name, counts in sorted(
+                emulator.profile().items(),
+                key=lambda item: -item[1]["instructions"]):
+            print("{:<40}{:>12}{:>14}".format(
+                function_name, counts["calls"], counts["instructions"]))
+    if args.hotspots:
+        vm_directory = args.input_path if os.path.isdir(args.input_path) \
+            else os.path.dirname(args.input_path)
+        source_maps = {}
+        for vm_name in vm_files:
+            map_path = os.path.join(vm_directory, vm_name + MAP_SUFFIX)
+            if os.path.exists(map_path):
+                source_maps[vm_name] = read_source_map(map_path)
+        for count, source_name, line, subroutine in hotspots(
+                emulator.line_profile(), source_maps)[:args.hotspots]:
+            print("{:>12}  {}:{:<8}{}".format(count, source_name, line,
+                                              subroutine))
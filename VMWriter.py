@@ -6,15 +6,78 @@ Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
 
+# number of buffered lines that triggers a write to the output stream
+FLUSH_SIZE = 4096
+# the label write_tail_call jumps to, at the start of the function
+TAIL_CALL_LABEL = "FUNCTION_START"
+# segments and indices whose push and pop commands are rendered up front
+TEMPLATE_SEGMENTS = ["constant", "argument", "local", "static", "this",
+                     "that", "pointer", "temp"]
+TEMPLATE_INDICES = 16
+
+
+def render_templates(command: str) -> dict:
+    """
+    Returns:
+        dict: maps (segment, index) pairs to the rendered command line, for
+        both int and str indices, as the compilation engine uses both.
+    """
+    templates = {}
+    for segment in TEMPLATE_SEGMENTS:
+        for index in range(TEMPLATE_INDICES):
+            line = "{0} {1} {2}\n".format(command, segment, index)
+            templates[segment, index] = templates[segment, str(index)] = line
+    return templates
+
+
+PUSH_TEMPLATES = render_templates("push")
+POP_TEMPLATES = render_templates("pop")
+
 
 class VMWriter:
     """
     Writes VM commands into a file. Encapsulates the VM command syntax.
+    Commands are buffered as rendered lines and written in large blocks
+    (checked at subroutine boundaries), so flush() must be called once all
+    commands were written.
     """
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
-        """Creates a new file and prepares it for writing VM commands."""
+    def __init__(self, output_stream: typing.TextIO,
+                 optimizers: typing.Sequence = ()) -> None:
+        """Creates a new file and prepares it for writing VM commands.
+
+        Args:
+            output_stream (typing.TextIO): the stream to write to.
+            optimizers (typing.Sequence): objects whose optimize(lines)
+            methods rewrite the buffered lines of every function, in order,
+            before they are written.
+        """
         self.output_stream = output_stream
+        self.optimizers = optimizers
+        self.lines = []
+        self.function_start = 0
+
+    def end_function(self) -> typing.List[str]:
+        """Passes the lines of the last function through the optimizers.
+
+        Returns:
+            typing.List[str]: the final lines of the function.
+        """
+        lines = self.lines[self.function_start:]
+        if self.optimizers and lines:
+            for optimizer in self.optimizers:
+                lines = optimizer.optimize(lines)
+            self.lines[self.function_start:] = lines
+        self.function_start = len(self.lines)
+        return lines
+
+    def flush(self) -> None:
+        """Writes all the buffered commands to the output stream."""
+        self.end_function()
+        if self.lines:
+            self.output_stream.write("".join(self.lines))
+            self.lines = []
+            self.function_start = 0
 
     def write_push(self, segment: str, index: int) -> None:
         """Writes a VM push command.
@@ -24,7 +87,10 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP"
             index (int): the index to push to.
         """
-        self.output_stream.write("push {0} {1}\n".format(segment, index))
+        line = PUSH_TEMPLATES.get((segment, index))
+        if line is None:
+            line = "push {0} {1}\n".format(segment, index)
+        self.lines.append(line)
 
     def write_pop(self, segment: str, index: int) -> None:
         """Writes a VM pop command.
@@ -34,7 +100,10 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP".
             index (int): the index to pop from.
         """
-        self.output_stream.write("pop {0} {1}\n".format(segment, index))
+        line = POP_TEMPLATES.get((segment, index))
+        if line is None:
+            line = "pop {0} {1}\n".format(segment, index)
+        self.lines.append(line)
 
     def write_arithmetic(self, command: str) -> None:
         """Writes a VM arithmetic command.
@@ -43,7 +112,7 @@ F
             command (str): the command to write, can be "ADD", "SUB", "NEG", 
             "EQ", "GT", "LT", "AND", "OR", "NOT".
         """
-        self.output_stream.write(command+"\n")
+        self.lines.append(command + "\n")
 
     def write_label(self, label: str) -> None:
         """Writes a VM label command.
@@ -51,7 +120,7 @@ F
         Args:
             label (str): the label to write.
         """
-        self.output_stream.write("label {}\n".format(label))
+        self.lines.append("label " + label + "\n")
 
     def write_goto(self, label: str) -> None:
         """Writes a VM goto command.
@@ -59,7 +128,7 @@ F
         Args:
             label (str): the label to go to.
         """
-        self.output_stream.write("goto {}\n".format(label))
+        self.lines.append("goto " + label + "\n")
 
     def write_if(self, label: str) -> None:
         """Writes a VM if-goto command.
@@ -67,7 +136,7 @@ F
         Args:
             label (str): the label to go to.
         """
-        self.output_stream.write("if-goto {}\n".format(label))
+        self.lines.append("if-goto " + label + "\n")
 
     def write_call(self, name: str, n_args: int) -> None:
         """Writes a VM call command.
@@ -76,8 +145,7 @@ F
             name (str): the name of the function to call.
             n_args (int): the number of arguments the function receives.
         """
-        hierarchy = []  # TODO get all father routine
-        self.output_stream.write("call {0} {1}\n".format(name, n_args))
+        self.lines.append("call {0} {1}\n".format(name, n_args))
 
     def write_function(self, name: str, n_locals: int) -> None:
         """Writes a VM function command.
@@ -86,7 +154,24 @@ F
             name (str): the name of the function.
             n_locals (int): the number of local variables the function uses.
         """
-        self.output_stream.write("function {0} {1}\n".format(name, n_locals))
+        self.end_function()
+        if len(self.lines) >= FLUSH_SIZE:
+            self.flush()
+        self.lines.append("function {0} {1}\n".format(name, n_locals))
+
+    def write_lines(self, lines: typing.List[str]) -> None:
+        """Writes the final lines of a complete function, compiled earlier,
+        which the optimizers do not see again.
+
+        Args:
+            lines (typing.List[str]): the lines, starting with the
+            "function" command.
+        """
+        self.end_function()
+        if len(self.lines) >= FLUSH_SIZE:
+            self.flush()
+        self.lines += lines
+        self.function_start = len(self.lines)
 
     def write_constant(self, keyword) -> None:
         """Reviews which Jack constant is referenced and executes it. """
@@ -100,13 +185,33 @@ F
 
     def write_string(self, string):
         string = string[1:-1]  # remove parenthesis
-        str_len = len(string)
-        self.write_push("constant", str_len)
+        self.write_push("constant", len(string))
         self.write_call("String.new", 1)
-        for i in range(str_len):
-            self.write_push("constant", ord(string[i]))
+        for char in string:
+            self.write_push("constant", ord(char))
             self.write_call("String.appendChar", 2)
 
     def write_return(self) -> None:
         """Writes a VM return command."""
-        self.output_stream.write("return\n")
+        self.lines.append("return\n")
+
+    def write_tail_call(self, n_args: int, n_locals: int) -> None:
+        """Replaces the call that ends the current function, a call of the
+        function to itself, with a jump back to its start: the arguments of
+        the call become its arguments, and its locals are zeroed again, just
+        as the function command would.
+
+        Args:
+            n_args (int): the number of arguments the function receives.
+            n_locals (int): the number of local variables the function uses.
+        """
+        self.lines.pop()  # the call
+        start_label = "label " + TAIL_CALL_LABEL + "\n"
+        if self.lines[self.function_start + 1] != start_label:
+            self.lines.insert(self.function_start + 1, start_label)
+        for index in reversed(range(n_args)):
+            self.write_pop("argument", index)
+        for index in range(n_locals):
+            self.write_push("constant", 0)
+            self.write_pop("local", index)
+        self.write_goto(TAIL_CALL_LABEL)
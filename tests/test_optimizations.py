@@ -0,0 +1,139 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Compiles the Jack programs in tests/fixtures with every combination of the
+optimizing flags, runs them on the VMEmulator, and checks that they print
+what the unoptimized program prints.
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import JackCompiler
+from BuildCache import TOKEN_CACHE_VARIABLE
+from HackCPU import HackCPU
+from HackTranslator import asm_path_of
+from VMEmulator import VMEmulator, read_vm_files
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+PROGRAMS = sorted(os.listdir(FIXTURES))
+FLAG_COMBINATIONS = [
+    ["-O"],
+    ["-O", "--no-string-pool"],
+    ["-O", "--ir"],
+    ["-O", "--ir", "--no-string-pool"],
+    ["-O", "--stream"],
+    ["-O", "--source-map"],
+    ["-O", "--whole-program"],
+    ["-O", "--whole-program", "--inline"],
+    ["--ir"],
+    ["--stream"],
+]
+# far more cycles than any fixture takes, so that a miscompiled loop fails
+# quickly
+HACK_CYCLE_LIMIT = 1000000
+
+
+def compile_program(directory: str, flags: list) -> None:
+    """Runs the JackCompiler command line on a directory, quietly."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        status = JackCompiler.main([directory] + flags)
+    if status != 0:
+        raise AssertionError("JackCompiler {} failed".format(flags))
+
+
+def run_program(directory: str) -> str:
+    """Runs the .vm files of a directory to the end.
+
+    Returns:
+        str: what the program printed.
+    """
+    emulator = VMEmulator(read_vm_files(directory))
+    if not emulator.run():
+        raise AssertionError("the program did not halt")
+    return emulator.os.output_text()
+
+
+class OptimizationTest(unittest.TestCase):
+    """Every fixture prints the same under every combination of flags."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # incremental builds use the token cache, which must stay private
+        environment = mock.patch.dict(os.environ, {
+            TOKEN_CACHE_VARIABLE: os.path.join(self.directory, "tokens")})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def copy_fixture(self, program: str, name: str) -> str:
+        """
+        Returns:
+            str: the path of a fresh copy of the fixture.
+        """
+        return shutil.copytree(os.path.join(FIXTURES, program),
+                               os.path.join(self.directory, name))
+
+    def expected_output(self, program: str) -> str:
+        """
+        Returns:
+            str: what the fixture prints, compiled without any flag.
+        """
+        copy = self.copy_fixture(program, program + "-plain")
+        compile_program(copy, ["--force"])
+        return run_program(copy)
+
+    def test_flag_combinations(self) -> None:
+        for program in PROGRAMS:
+            expected = self.expected_output(program)
+            self.assertTrue(expected)
+            for flags in FLAG_COMBINATIONS:
+                with self.subTest(program=program, flags=flags):
+                    copy = self.copy_fixture(
+                        program, program + "".join(flags))
+                    compile_program(copy, ["--force"] + flags)
+                    self.assertEqual(run_program(copy), expected)
+
+    def test_incremental_builds(self) -> None:
+        """A build reusing the cached tokens and subroutines of an earlier
+        build prints the same as a fresh one.
+        """
+        for program in PROGRAMS:
+            expected = self.expected_output(program)
+            for flags in (["-O"], ["-O", "--ir"]):
+                with self.subTest(program=program, flags=flags):
+                    copy = self.copy_fixture(
+                        program, program + "-incremental" + "".join(flags))
+                    compile_program(copy, flags)
+                    os.remove(os.path.join(copy, ".jackbuild.json"))
+                    compile_program(copy, flags)
+                    self.assertEqual(run_program(copy), expected)
+
+    def test_hack_translation(self) -> None:
+        """The Hack assembly of an optimized program prints the same on the
+        HackCPU.
+        """
+        for program in PROGRAMS:
+            expected = self.expected_output(program)
+            with self.subTest(program=program):
+                copy = self.copy_fixture(program, program + "-asm")
+                compile_program(copy, ["--force", "-O", "--asm"])
+                with open(asm_path_of(copy), 'r') as asm_file:
+                    cpu = HackCPU(asm_file)
+                self.assertTrue(cpu.run(HACK_CYCLE_LIMIT))
+                self.assertEqual(cpu.os.output_text(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()